@@ -0,0 +1,38 @@
+import numpy as np
+import pyarrow as pa
+
+from clarity_metrics import SKETCH_SIZE, document_partials, rollup, sentence_metrics
+from corpus_store import SCHEMA
+from synthetic_corpus import corpus_table, synthetic_reports
+
+
+def store_table(texts, document_id='informe-trimestral_enero-marzo-2020', topic='inflation'):
+    return pa.Table.from_pylist([
+        {'document_id': document_id, 'year': 2020, 'quarter': 'Q1', 'topic': topic, 'subcategory': 'other',
+         'sentence_index': i, 'text': text} for i, text in enumerate(texts)
+    ], schema=SCHEMA)
+
+
+def test_sentence_metrics_count_distinct_tokens_exactly():
+    texts = ['la inflación  la inflación subyacente', '', 'precio precio precio', 'tasa']
+    metrics = sentence_metrics(store_table(texts))
+    assert metrics['sentence_index'].tolist() == [0, 1, 2, 3]
+    assert metrics['num_tokens'].tolist() == [len(text.split()) for text in texts]
+    assert metrics['distinct_tokens'].tolist() == [len(set(text.split())) for text in texts]
+    np.testing.assert_allclose(metrics['lexical_density'], [3 / 5, 0, 1 / 3, 1])
+
+
+def test_sentence_metrics_sum_to_document_partials():
+    table = corpus_table(synthetic_reports(2, seed=1, sentences_per_category=5))
+    metrics = sentence_metrics(table)
+    partials = document_partials(table)
+    totals = metrics.groupby(['document_id', 'topic'])['num_tokens'].sum()
+    assert totals.tolist() == partials.set_index(['document_id', 'topic'])['total_tokens'].loc[totals.index].tolist()
+
+
+def test_rollup_is_exact_below_the_sketch_size_and_close_above():
+    small = [' '.join(f'w{i}_{j}' for j in range(10)) for i in range(100)]
+    large = [' '.join(f'w{i}_{j}' for j in range(10)) for i in range(2 * SKETCH_SIZE // 10)]
+    for texts, tolerance in [(small, 0), (large, 0.05)]:
+        density = rollup(document_partials(store_table(texts)), 'year')['lexical_density'].iloc[0]
+        assert abs(density - 1.0) <= tolerance
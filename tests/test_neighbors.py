@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from neighbors import blocked_top_k
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).standard_normal((50, 8)).astype(np.float32)
+
+
+@pytest.mark.parametrize('k', [1, 5, 49])
+def test_blocked_top_k_matches_a_full_sort(vectors, k):
+    queries = vectors[:4]
+    indices, scores = blocked_top_k(queries, vectors, k, exclude=np.arange(4), block_size=7)
+    full = queries @ vectors.T
+    full[np.arange(4), np.arange(4)] = -np.inf
+    expected = np.argsort(-full, axis=1, kind='stable')[:, :k]
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_allclose(scores, np.take_along_axis(full, expected, axis=1), rtol=1e-6)
+
+
+def test_k_is_capped_at_the_rows_left_after_excluding_the_query(vectors):
+    indices, scores = blocked_top_k(vectors[:2], vectors, 500, exclude=[0, 1], block_size=16)
+    assert indices.shape == (2, len(vectors) - 1)
+    assert np.isfinite(scores).all()
+    assert blocked_top_k(vectors[:2], vectors, 500)[0].shape == (2, len(vectors))
+    assert blocked_top_k(vectors[:1], vectors[:1], 3, exclude=[0])[0].shape == (1, 0)
+
+
+@pytest.mark.parametrize('k', [0, -3])
+def test_non_positive_k_is_rejected(vectors, k):
+    with pytest.raises(ValueError):
+        blocked_top_k(vectors[:1], vectors, k)
@@ -0,0 +1,15 @@
+from pipeline import STAGES, select_stages, stage_dependencies
+
+
+def test_scrape_only_runs_when_named():
+    dependencies = stage_dependencies()
+    assert 'scrape' not in select_stages(dependencies)
+    assert 'scrape' not in select_stages(dependencies, until=['tfidf'])
+    assert select_stages(dependencies, only=['scrape']) == ['scrape']
+    assert 'scrape' in select_stages(dependencies, until=['scrape', 'tfidf'])
+
+
+def test_until_selects_upstream_stages():
+    dependencies = stage_dependencies()
+    assert select_stages(dependencies, until=['tfidf']) == ['extract', 'preprocess', 'annotate', 'corpus', 'tfidf']
+    assert select_stages(dependencies) == [name for name in STAGES if name != 'scrape']
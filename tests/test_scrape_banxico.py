@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scrape_banxico
+
+PDFS = {
+    'enero-marzo-2020.pdf': b'%PDF-1.4 primer trimestre ' + bytes(range(256)) * 40,
+    'abril-junio-2020.pdf': b'%PDF-1.4 segundo trimestre ' + bytes(range(256)) * 50,
+}
+LISTING = ''.join(
+    f'<a href="/pdf/{name}" aria-label="Texto completo de Informe trimestral, {name[:-9]} 2020">Texto completo</a>'
+    for name in PDFS
+) + '<a href="/pdf/viejo.pdf" aria-label="Texto completo de Informe trimestral, enero-marzo 1999">Texto completo</a>'
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the listing and the PDFs; `server.range_mode` is 'honour', 'ignore' or 'wrong-offset'."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Range')))
+        if self.path == '/listing.html':
+            return self._send(200, LISTING.encode('utf-8'))
+        body = PDFS.get(os.path.basename(self.path))
+        if body is None:
+            return self._send(404, b'')
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        if not match or self.server.range_mode == 'ignore':
+            return self._send(200, body)
+        start = int(match.group(1)) if self.server.range_mode == 'honour' else 0
+        if start >= len(body):
+            return self._send(416, b'')
+        return self._send(206, body[start:], {'Content-Range': f'bytes {start}-{len(body) - 1}/{len(body)}'})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    httpd.requests, httpd.range_mode = [], 'honour'
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_run_downloads_listed_reports_with_checksums(server, tmp_path):
+    failed = scrape_banxico.run(f'{server.url}/listing.html', str(tmp_path), workers=2)
+
+    assert failed == []
+    manifest = json.loads((tmp_path / scrape_banxico.MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert sorted(manifest) == sorted(f'informe-trimestral_{name}' for name in PDFS)
+    for name, body in PDFS.items():
+        fname = f'informe-trimestral_{name}'
+        assert (tmp_path / fname).read_bytes() == body
+        assert manifest[fname] == {'url': f'{server.url}/pdf/{name}', 'sha256': sha256(body), 'size': len(body)}
+    assert not list(tmp_path.glob('*.part'))
+
+    # A second run finds every file intact and downloads nothing
+    server.requests.clear()
+    assert scrape_banxico.run(f'{server.url}/listing.html', str(tmp_path), workers=2) == []
+    assert [path for path, _ in server.requests] == ['/listing.html']
+
+
+def test_download_resumes_partial_file_with_range(server, tmp_path):
+    name, body = 'enero-marzo-2020.pdf', PDFS['enero-marzo-2020.pdf']
+    path = tmp_path / name
+    (tmp_path / f'{name}.part').write_bytes(body[:1000])
+
+    with scrape_banxico.make_session() as session:
+        checksum, size = scrape_banxico.download_pdf(session, f'{server.url}/pdf/{name}', str(path))
+
+    assert server.requests == [(f'/pdf/{name}', 'bytes=1000-')]
+    assert path.read_bytes() == body
+    assert (checksum, size) == (sha256(body), len(body))
+
+
+@pytest.mark.parametrize('range_mode, expected_requests', [
+    # 206 from the wrong offset: the partial file is dropped and the request retried without a Range
+    ('wrong-offset', ['bytes=1000-', None]),
+    # Server without Range support: the full body replaces the partial file
+    ('ignore', ['bytes=1000-']),
+])
+def test_download_never_appends_content_from_another_offset(server, tmp_path, range_mode, expected_requests):
+    server.range_mode = range_mode
+    name, body = 'abril-junio-2020.pdf', PDFS['abril-junio-2020.pdf']
+    path = tmp_path / name
+    (tmp_path / f'{name}.part').write_bytes(body[:1000])
+
+    with scrape_banxico.make_session() as session:
+        checksum, _ = scrape_banxico.download_pdf(session, f'{server.url}/pdf/{name}', str(path))
+
+    assert [range_header for _, range_header in server.requests] == expected_requests
+    assert path.read_bytes() == body
+    assert checksum == sha256(body)
+
+
+def test_download_restarts_when_partial_file_is_complete_or_too_long(server, tmp_path):
+    name, body = 'enero-marzo-2020.pdf', PDFS['enero-marzo-2020.pdf']
+    path = tmp_path / name
+    (tmp_path / f'{name}.part').write_bytes(body + b'garbage')
+
+    with scrape_banxico.make_session() as session:
+        scrape_banxico.download_pdf(session, f'{server.url}/pdf/{name}', str(path))
+
+    assert [range_header for _, range_header in server.requests] == [f'bytes={len(body) + 7}-', None]
+    assert path.read_bytes() == body
+
+
+def test_corrupt_file_of_the_right_size_is_downloaded_again(server, tmp_path):
+    scrape_banxico.run(f'{server.url}/listing.html', str(tmp_path), workers=1)
+    fname = 'informe-trimestral_enero-marzo-2020.pdf'
+    body = PDFS['enero-marzo-2020.pdf']
+    (tmp_path / fname).write_bytes(b'X' * len(body))
+
+    server.requests.clear()
+    assert scrape_banxico.run(f'{server.url}/listing.html', str(tmp_path), workers=1) == []
+
+    assert [path for path, _ in server.requests] == ['/listing.html', '/pdf/enero-marzo-2020.pdf']
+    assert (tmp_path / fname).read_bytes() == body
+
+
+def test_write_error_fails_one_download_and_keeps_the_others(server, tmp_path, monkeypatch):
+    broken = 'informe-trimestral_abril-junio-2020.pdf'
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if os.path.basename(dst) == broken:
+            raise OSError(28, 'No space left on device')
+        return replace(src, dst)
+
+    monkeypatch.setattr(scrape_banxico.os, 'replace', failing_replace)
+    failed = scrape_banxico.run(f'{server.url}/listing.html', str(tmp_path), workers=2)
+
+    assert failed == [broken]
+    manifest = json.loads((tmp_path / scrape_banxico.MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert sorted(manifest) == ['informe-trimestral_enero-marzo-2020.pdf']
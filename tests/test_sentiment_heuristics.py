@@ -0,0 +1,29 @@
+import pyarrow as pa
+
+from corpus_store import SCHEMA
+from sentiment_heuristics import build_term_counts, default_lexicon, score_lexicons
+
+
+def store_table(rows):
+    return pa.Table.from_pylist([
+        {'document_id': document_id, 'year': year, 'quarter': None, 'topic': 'inflation', 'subcategory': 'other',
+         'sentence_index': i, 'text': text} for i, (document_id, year, text) in enumerate(rows)
+    ], schema=SCHEMA)
+
+
+def test_sentences_without_a_year_are_left_out():
+    table = store_table([('informe-2016', 2016, 'crecimiento sólido'), ('informe-sin-fecha', None, 'riesgo caída'),
+                         ('informe-2017', 2017, 'inflación riesgo')])
+    counts, vocabulary, rows = build_term_counts(table)
+    assert counts.shape == (2, len(vocabulary))
+    assert 'caída' not in vocabulary
+    scores = score_lexicons(counts, vocabulary, rows, default_lexicon(), 'year')
+    assert scores['year'].tolist() == ['2016', '2017']
+    assert scores['positive'].tolist() == [2, 0]
+    assert scores['negative'].tolist() == [0, 2]
+
+
+def test_empty_selection_gives_empty_scores():
+    counts, vocabulary, rows = build_term_counts(store_table([('informe-sin-fecha', None, 'riesgo')]))
+    assert counts.shape == (0, 0) and vocabulary == [] and rows.empty
+    assert score_lexicons(counts, vocabulary, rows, default_lexicon(), 'year').empty
@@ -0,0 +1,60 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from synthetic_corpus import corpus_table, synthetic_reports
+from tfidf import (
+    compute_tfidf, empty_state, load_tfidf_state, period_documents, save_tfidf_state, tfidf_from_state,
+    update_tfidf_state
+)
+
+
+@pytest.fixture(scope='module')
+def reports():
+    """Per-report corpus tables of six synthetic reports spanning two years."""
+    return {document_id: corpus_table({document_id: report})
+            for document_id, report in synthetic_reports(6, seed=3, sentences_per_category=4).items()}
+
+
+def full_refit(tables, level, max_features):
+    corpus = pa.concat_tables([tables[document_id] for document_id in sorted(tables)])
+    return compute_tfidf(*period_documents(corpus, level), max_features)
+
+
+def assert_same_tfidf(incremental, full):
+    (matrix, vocabulary, rows), (full_matrix, full_vocabulary, full_rows) = incremental, full
+    assert vocabulary == full_vocabulary
+    assert rows.astype(str).values.tolist() == full_rows.astype(str).values.tolist()
+    assert matrix.shape == full_matrix.shape
+    np.testing.assert_allclose(matrix.toarray(), full_matrix.toarray(), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('level', ['year', 'quarter'])
+@pytest.mark.parametrize('max_features', [None, 15])
+def test_incremental_updates_match_full_refit(reports, level, max_features):
+    state, current = empty_state(), {}
+    for document_id, table in reports.items():
+        current[document_id] = table
+        update_tfidf_state(state, table, level)
+        assert_same_tfidf(tfidf_from_state(state, max_features), full_refit(current, level, max_features))
+
+    # A revised report replaces its old counts, a deleted one takes them out of the IDF
+    last, first = list(reports)[-1], list(reports)[0]
+    current[last] = reports[last].slice(0, reports[last].num_rows // 2)
+    update_tfidf_state(state, current[last], level)
+    assert_same_tfidf(tfidf_from_state(state, max_features), full_refit(current, level, max_features))
+
+    del current[first]
+    update_tfidf_state(state, reports[first].slice(0, 0), level, removed_documents=[first])
+    assert_same_tfidf(tfidf_from_state(state, max_features), full_refit(current, level, max_features))
+
+
+def test_saved_state_resumes_updates(reports, tmp_path):
+    first, rest = list(reports)[:3], list(reports)[3:]
+    state = empty_state()
+    update_tfidf_state(state, pa.concat_tables([reports[document_id] for document_id in first]))
+    save_tfidf_state(state, tmp_path)
+
+    state = load_tfidf_state(tmp_path)
+    update_tfidf_state(state, pa.concat_tables([reports[document_id] for document_id in rest]))
+    assert_same_tfidf(tfidf_from_state(state, None), full_refit(reports, 'year', None))
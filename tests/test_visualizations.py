@@ -0,0 +1,45 @@
+import os
+
+from visualizations import render_figures
+
+
+def first_version():
+    def plot(output_path, label):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f'{label} v1')
+    return plot
+
+
+def second_version():
+    def plot(output_path, label):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f'{label} v2')
+    return plot
+
+
+def test_figures_are_redrawn_only_when_the_plot_function_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'input.csv').write_text('year,value\n2020,1\n')
+    output_path = os.path.join('figures', 'plot.png')
+
+    def render(plot):
+        render_figures([(plot, {'output_path': output_path, 'label': 'a'}, ['input.csv'])], processes=1)
+        with open(output_path, encoding='utf-8') as f:
+            return f.read(), os.path.getmtime(output_path)
+
+    text, drawn = render(first_version())
+    assert text == 'a v1'
+    assert render(first_version()) == (text, drawn)
+    assert render(second_version())[0] == 'a v2'
+
+
+def test_plot_hash_covers_the_project_helpers_a_plot_calls(monkeypatch):
+    import tfidf
+    import visualizations
+    from eda_analysis import visualize_topic_evolution
+
+    before = visualizations.plot_hash(visualize_topic_evolution)
+    source = visualizations.function_source
+    monkeypatch.setattr(visualizations, 'function_source',
+                        lambda function: b'edited' if function is tfidf.term_scores else source(function))
+    assert visualizations.plot_hash(visualize_topic_evolution) != before
@@ -0,0 +1,157 @@
+# Shared linguistic annotation stage: run tokenize/POS/lemma once per preprocessed sentence
+# and persist a compact annotated form reused by tfidf.py and metada.py
+
+import os
+import json
+import argparse
+from glob import glob
+from tqdm import tqdm
+
+from manifest import (
+    fingerprint, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
+from nlp_resources import get_pipeline
+from instrumentation import count, measure
+from preprocessing import CATEGORIES, load_preprocessed, preprocessed_files
+
+ANNOTATION_PROCESSORS = 'tokenize,mwt,pos,lemma'
+ANNOTATION_BATCH_SIZE = 256
+
+
+def get_nlp():
+    """The annotation pipeline is built on first use, so readers of the store never load Stanza."""
+    return get_pipeline(ANNOTATION_PROCESSORS, tokenize_no_ssplit=True)
+
+
+def extract_document_id(path):
+    filename = os.path.splitext(os.path.basename(path))[0]
+    return filename.replace('preprocessed_', '').replace('annotated_', '')
+
+
+def annotate_sentences(sentences, batch_size=ANNOTATION_BATCH_SIZE):
+    """Return (lemmas, upos) for each sentence, sending them to Stanza in batches."""
+    nlp = get_nlp()
+    annotations = []
+    for start in range(0, len(sentences), batch_size):
+        batch = sentences[start:start + batch_size]
+        with measure('pos', items=len(batch)):
+            count('stanza_calls')
+            docs = nlp.bulk_process(batch)
+        for doc in docs:
+            words = [word for sent in doc.sentences for word in sent.words]
+            lemmas = [(word.lemma or '').lower() for word in words]
+            upos = [word.upos for word in words]
+            annotations.append((lemmas, upos))
+    return annotations
+
+
+def iter_annotation_batches(text_data, batch_size=ANNOTATION_BATCH_SIZE):
+    """Annotate the unique sentences of a preprocessed document, yielding one batch of records at a time.
+
+    Each record keeps the lemmas and UPOS tags of one sentence plus `refs`, the
+    (category, index) entries it came from, so duplicates are parsed only once.
+    """
+    records = []
+    by_text = {}
+    for category in CATEGORIES:
+        for index, sentence in enumerate(text_data.get(category, [])):
+            if sentence not in by_text:
+                by_text[sentence] = {"sent_id": len(records), "refs": []}
+                records.append(sentence)
+            by_text[sentence]["refs"].append([category, index])
+
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        yield [
+            {**by_text[sentence], "lemmas": lemmas, "upos": upos}
+            for sentence, (lemmas, upos) in zip(batch, annotate_sentences(batch, batch_size))
+        ]
+
+
+def annotate_document(text_data, batch_size=ANNOTATION_BATCH_SIZE):
+    """All annotated records of a preprocessed document (see iter_annotation_batches)."""
+    return [record for batch in iter_annotation_batches(text_data, batch_size) for record in batch]
+
+
+def expand_refs(records, categories=None):
+    """Repeat each annotated sentence once per entry referencing it, optionally limited to `categories`."""
+    return [
+        record
+        for record in records
+        for category, _ in record["refs"]
+        if categories is None or category in categories
+    ]
+
+
+def filter_lemmas(records, allowed_pos, min_length=0):
+    """Lemmas of `records` whose UPOS tag is in `allowed_pos` and longer than `min_length`."""
+    return [
+        lemma
+        for record in records
+        for lemma, upos in zip(record["lemmas"], record["upos"])
+        if upos in allowed_pos and lemma and len(lemma) > min_length
+    ]
+
+
+def annotation_path(annotated_dir, document_id):
+    return os.path.join(annotated_dir, f'annotated_{document_id}.json')
+
+
+def load_annotations(annotated_dir, document_id):
+    """Load the annotated sentences of one document, or None if it was not annotated yet."""
+    path = annotation_path(annotated_dir, document_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)["sentences"]
+
+
+def iter_annotated_documents(annotated_dir):
+    for path in sorted(glob(os.path.join(annotated_dir, 'annotated_*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        yield data["document_id"], data["sentences"]
+
+
+def run_annotation(preprocessed_dir, annotated_dir, batch_size=ANNOTATION_BATCH_SIZE, force=False):
+    os.makedirs(annotated_dir, exist_ok=True)
+    input_files = {extract_document_id(path): path for path in preprocessed_files(preprocessed_dir)}
+
+    manifest = load_manifest('annotate')
+    fingerprints = {
+        document_id: fingerprint([path], {'processors': ANNOTATION_PROCESSORS})
+        for document_id, path in input_files.items()
+    }
+    stale, reused = partition_stale(
+        manifest, fingerprints, lambda document_id: [annotation_path(annotated_dir, document_id)], force
+    )
+    removed = prune_missing(manifest, input_files)
+
+    for document_id in tqdm(stale, desc='Annotating documents'):
+        text_data = load_preprocessed(input_files[document_id])
+
+        annotated = {
+            "document_id": document_id,
+            "processors": ANNOTATION_PROCESSORS,
+            "sentences": annotate_document(text_data, batch_size)
+        }
+        output_path = annotation_path(annotated_dir, document_id)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(annotated, f, ensure_ascii=False)
+        record_build(manifest, document_id, fingerprints[document_id], [output_path])
+        save_manifest('annotate', manifest)
+
+    save_manifest('annotate', manifest)
+    print_build_report('annotate', reused, stale, removed)
+
+
+if __name__ == "__main__":
+    PREPROCESSED_DIR = "data/preprocessed"
+    ANNOTATED_DIR = "data/annotated"
+
+    parser = argparse.ArgumentParser(description='Annotate preprocessed sentences with lemmas and UPOS tags.')
+    parser.add_argument('--batch-size', type=int, default=ANNOTATION_BATCH_SIZE)
+    parser.add_argument('--force', action='store_true', help='Re-annotate every document, ignoring the manifest')
+    args = parser.parse_args()
+    run_annotation(PREPROCESSED_DIR, ANNOTATED_DIR, batch_size=args.batch_size, force=args.force)
+    print(f"Annotations saved to {ANNOTATED_DIR}")
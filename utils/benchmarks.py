@@ -0,0 +1,762 @@
+# Micro-benchmarks for pipeline stages
+# Usage: python utils/benchmarks.py <benchmark> [options]
+
+import os
+import re
+import json
+import time
+import sys
+import argparse
+import subprocess
+from glob import glob
+
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Import-time budget (seconds, best of several cold interpreter runs) per utils module.
+# Importing a module must not download or load any model; heavy ones are bounded by pandas/sklearn/matplotlib.
+IMPORT_TIME_BUDGETS = {
+    'annotation': 0.5,
+    'benchmarks': 0.5,
+    'clarity_metrics': 1.0,
+    'corpus_store': 1.0,
+    'eda_analysis': 4.0,
+    'extract_corpus': 0.5,
+    'instrumentation': 0.1,
+    'language_filter': 0.5,
+    'manifest': 0.1,
+    'metada': 0.5,
+    'neighbors': 3.5,
+    'nlp_resources': 0.1,
+    'pdf_backends': 0.3,
+    'pipeline': 0.1,
+    'preprocessing': 0.5,
+    'scrape_banxico': 0.5,
+    'synthetic_corpus': 0.5,
+    'sentiment_heuristics': 1.5,
+    'temporal_word2vec': 3.5,
+    'tfidf': 4.0,
+    'visualizations': 5.0,
+    'word2vec': 3.5
+}
+
+
+def collect_entries(input_dir, categories, limit=None):
+    """Collect raw entries of the given categories from every JSON under `input_dir`."""
+    entries = []
+    for path in sorted(glob(os.path.join(input_dir, '**', '*.json'), recursive=True)):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for category in categories:
+            entries.extend(data.get(category, []))
+    return entries[:limit] if limit else entries
+
+
+def report_rate(label, items, seconds):
+    rate = items / seconds if seconds > 0 else float('inf')
+    print(f"{label:<24} {items:>8} items in {seconds:8.2f}s → {rate:10.1f} items/sec")
+    return rate
+
+
+def benchmark_lemmatization(input_dir, limit=2000, batch_size=None):
+    """Compare per-call and batched Stanza lemmatization on the same prepared sentences."""
+    from preprocessing import CATEGORIES, LEMMA_BATCH_SIZE, prepare_text, lemmatize, lemmatize_batch
+
+    batch_size = batch_size or LEMMA_BATCH_SIZE
+    entries = collect_entries(input_dir, CATEGORIES, limit)
+    texts = [' '.join(tokens) for tokens in map(prepare_text, entries) if tokens]
+
+    start = time.perf_counter()
+    per_call = [lemmatize(text.split()) for text in texts]
+    per_call_rate = report_rate('per-call', len(texts), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batched = lemmatize_batch(texts, batch_size)
+    batched_rate = report_rate(f'batched ({batch_size})', len(texts), time.perf_counter() - start)
+
+    mismatches = sum(a != b for a, b in zip(per_call, batched))
+    print(f"Speedup: {batched_rate / per_call_rate:.2f}x, mismatched outputs: {mismatches}")
+
+
+def benchmark_extraction(raw_dir, workers=None):
+    """Time serial vs process-pool PDF extraction and check both produce the same output."""
+    import extract_corpus
+
+    workers = workers or os.cpu_count()
+    paths = sorted(glob(os.path.join(raw_dir, '*.pdf')))
+
+    start = time.perf_counter()
+    serial = list(extract_corpus.process_pdfs(paths, workers=1))
+    serial_rate = report_rate('serial', len(paths), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    parallel = list(extract_corpus.process_pdfs(paths, workers=workers))
+    parallel_rate = report_rate(f'parallel ({workers} workers)', len(paths), time.perf_counter() - start)
+
+    mismatches = sum(a != b for a, b in zip(serial, parallel))
+    print(f"Speedup: {parallel_rate / serial_rate:.2f}x, mismatched PDFs: {mismatches}")
+
+
+def benchmark_extraction_backends(raw_dir, backends=('pdfplumber', 'pymupdf'), layout='auto', limit=None):
+    """Pages/sec of each PDF backend and agreement of its classified sentences with the first one.
+
+    Uses the raw PDFs, or synthetic single- and two-column reports when there are none. Also counts
+    the pages whose detected column layout differs from the old filename-year rule.
+    """
+    from extract_corpus import classify_sentences, tokenize
+    from pdf_backends import column_split, extract_pages, two_column_by_year
+
+    paths = sorted(glob(os.path.join(raw_dir, '*.pdf')))[:limit]
+    if not paths:
+        from synthetic_corpus import synthetic_reports
+        reports = synthetic_reports(20, SUITE_SEED)
+        paths = synthetic_pdfs(list(reports), reports)
+        print(f"No PDFs in {raw_dir}; using {len(paths)} synthetic reports")
+
+    outputs = {}
+    for backend in backends:
+        start = time.perf_counter()
+        pages = [extract_pages(path, backend, layout) for path in paths]
+        report_rate(f'{backend} ({layout})', sum(map(len, pages)), time.perf_counter() - start)
+        # Backends break lines differently, so sentences are compared with whitespace collapsed
+        outputs[backend] = [
+            {category: {' '.join(s.split()) for s in sentences}
+             for category, sentences in classify_sentences(tokenize('\n'.join(texts))).items()}
+            for texts in pages
+        ]
+
+    reference = backends[0]
+    for backend in backends[1:]:
+        shared = total = 0
+        differences = []
+        for path, a, b in zip(paths, outputs[reference], outputs[backend]):
+            for category in a:
+                shared += len(a[category] & b[category])
+                total += len(a[category] | b[category])
+                differences += [(os.path.basename(path), category, s) for s in a[category] ^ b[category]]
+        print(f"{backend} vs {reference}: {shared}/{total} sentences identical ({shared / max(total, 1):.2%})")
+        for name, category, sentence in differences[:5]:
+            print(f"  [{name} {category}] {sentence[:100]}")
+
+    import pymupdf
+    pages = disagreements = 0
+    for path in paths:
+        with pymupdf.open(path) as doc:
+            for page in doc:
+                detected = column_split([(w[0], w[2], w[1]) for w in page.get_text('words')], page.rect.width) is not None
+                pages += 1
+                disagreements += detected != two_column_by_year(path)
+    print(f"Detected layout differs from the year rule on {disagreements}/{pages} pages")
+
+
+def classify_sentences_per_keyword(sentences):
+    """Reference classifier: one re.findall per keyword and group, as process_pdf used to do."""
+    import re
+    from extract_corpus import (
+        score_sentence, filter_exclude, gdp_keywords, inflation_keywords, mexico_keywords, global_keywords,
+        MIN_SENTENCE_LENGTH, PRIORITY_SCORE_THRESHOLD
+    )
+
+    filtered = filter_exclude(sentences, global_keywords)
+    filtered = [s for s in filtered if len(s) >= MIN_SENTENCE_LENGTH]
+    filtered = [s for s in filtered if not re.match(r"(?i)^\s*grá?fica", s)]
+    buckets = {'gdp_prioritized': [], 'inflation_prioritized': [], 'gdp_other': [], 'inflation_other': []}
+    for s in filtered:
+        gdp_score = score_sentence(s, gdp_keywords)
+        inf_score = score_sentence(s, inflation_keywords)
+        mex_score = score_sentence(s, mexico_keywords)
+        if gdp_score > 0:
+            key = 'gdp_prioritized' if mex_score + gdp_score >= PRIORITY_SCORE_THRESHOLD else 'gdp_other'
+            buckets[key].append(s)
+        if inf_score > 0:
+            key = 'inflation_prioritized' if mex_score + inf_score >= PRIORITY_SCORE_THRESHOLD else 'inflation_other'
+            buckets[key].append(s)
+    return buckets
+
+
+def benchmark_keyword_scoring(raw_dir, repeat=3):
+    """Sentences/sec of per-keyword regex scoring vs the one-pass matcher, on sentences from raw PDFs."""
+    from extract_corpus import extract_text, tokenize, classify_sentences
+
+    sentences = []
+    for path in sorted(glob(os.path.join(raw_dir, '*.pdf'))):
+        sentences.extend(tokenize(extract_text(path)))
+    sentences = sentences * repeat
+
+    start = time.perf_counter()
+    before = classify_sentences_per_keyword(sentences)
+    before_rate = report_rate('per-keyword regex', len(sentences), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    after = classify_sentences(sentences)
+    after_rate = report_rate('one-pass matcher', len(sentences), time.perf_counter() - start)
+
+    print(f"Speedup: {after_rate / before_rate:.2f}x, identical classification: {before == after}")
+
+
+def benchmark_language_filter(input_dir, limit=5000):
+    """Speed of langdetect vs the built-in Spanish filter, plus their agreement on the extracted corpus."""
+    from collections import Counter
+    from langdetect import detect, DetectorFactory
+    from preprocessing import CATEGORIES, clean_text, has_valid_shape
+    from language_filter import is_spanish_batch
+
+    DetectorFactory.seed = 0
+    sentences = []
+    for entry in collect_entries(input_dir, CATEGORIES):
+        sentences.extend(s.strip() for s in re.split(r'[.!?]', clean_text(entry)))
+    sentences = [s for s in sentences if has_valid_shape(s)][:limit]
+
+    def langdetect_is_spanish(sentence):
+        try:
+            return detect(sentence) == 'es'
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    reference = [langdetect_is_spanish(s) for s in sentences]
+    reference_rate = report_rate('langdetect', len(sentences), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    builtin = is_spanish_batch(sentences).tolist()
+    builtin_rate = report_rate('built-in filter', len(sentences), time.perf_counter() - start)
+
+    confusion = Counter(zip(reference, builtin))
+    agreement = (confusion[(True, True)] + confusion[(False, False)]) / max(len(sentences), 1)
+    print(f"Speedup: {builtin_rate / reference_rate:.1f}x, agreement with langdetect: {agreement:.2%}")
+    print(f"  both Spanish: {confusion[(True, True)]}, both rejected: {confusion[(False, False)]}, "
+          f"only langdetect Spanish: {confusion[(True, False)]}, only built-in Spanish: {confusion[(False, True)]}")
+    disagreements = [(s, r) for s, r, b in zip(sentences, reference, builtin) if r != b]
+    for sentence, ref in disagreements[:10]:
+        print(f"  [langdetect={'es' if ref else 'other'}] {sentence[:100]}")
+
+
+def clean_text_regex(text):
+    """Reference cleaner: ftfy on every text and one regex pass per step, as preprocessing.py used to do."""
+    import ftfy
+
+    text = ftfy.fix_text(text)
+    text = text.replace('\n', ' ')
+    text = re.sub(r'\s+', ' ', text)
+    text = text.lower()
+    text = re.sub(r'(?:\b\w\b\s*){3,}', lambda m: m.group(0).replace(' ', ''), text)
+    text = re.sub(r'[^a-záéíóúñü\s]', '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def letter_spaced_inputs(size=2000):
+    """Adversarial cleaner inputs: letter-spaced headings as pdfplumber emits them, near-miss pairs
+    of single letters, mixed whitespace and mojibake."""
+    heading = ' '.join('PRODUCTO INTERNO BRUTO') + '\n'
+    return [
+        heading * (size // len(heading)),
+        ' '.join('inflación subyacente') * (size // 40),
+        'a b, ' * (size // 5),
+        'x \t\n y\xa0 z\u2003' * (size // 8),
+        'é ' * (size // 2) + 'fin',
+        ('a ' * 2 + 'bc ') * (size // 7),
+        'La inflaciÃ³n anual se ubicÃ³ en 3.5% â€” segÃºn el INEGI. ' * (size // 60),
+    ]
+
+
+def benchmark_clean_text(input_dir, limit=20000, repeat=3):
+    """Sentences/sec of the per-step regex cleaner vs preprocessing.clean_text, on the extracted
+    corpus (or a synthetic one) and on adversarial letter-spaced inputs. Returns the mismatches."""
+    from preprocessing import CATEGORIES, clean_text
+
+    entries = collect_entries(input_dir, CATEGORIES, limit)
+    if not entries:
+        from synthetic_corpus import extracted_json, synthetic_reports
+        entries = [sentence for report in synthetic_reports(50).values()
+                   for sentences in extracted_json(report).values() for sentence in sentences][:limit]
+
+    mismatches = 0
+    for label, texts in [('corpus', entries), ('letter-spaced', letter_spaced_inputs() * 10)]:
+        print(f"{label}: {len(texts)} texts, {sum(map(len, texts))} characters")
+        start = time.perf_counter()
+        for _ in range(repeat):
+            before = [clean_text_regex(text) for text in texts]
+        before_rate = report_rate('  regex passes + ftfy', len(texts) * repeat, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            after = [clean_text(text) for text in texts]
+        after_rate = report_rate('  clean_text', len(texts) * repeat, time.perf_counter() - start)
+
+        different = sum(a != b for a, b in zip(before, after))
+        mismatches += different
+        print(f"  Speedup: {after_rate / before_rate:.2f}x, mismatched outputs: {different}")
+    return mismatches
+
+
+def same_tfidf(a, b, tolerance=1e-12):
+    """Whether two (matrix, vocabulary, rows) TF-IDF results are equal up to float rounding."""
+    (matrix_a, vocabulary_a, rows_a), (matrix_b, vocabulary_b, rows_b) = a, b
+    return (
+        vocabulary_a == vocabulary_b
+        and rows_a.astype(str).values.tolist() == rows_b.astype(str).values.tolist()
+        and matrix_a.shape == matrix_b.shape
+        and (matrix_a.nnz == 0 or abs(matrix_a - matrix_b).max() <= tolerance)
+    )
+
+
+def benchmark_incremental_tfidf(store_path=None, level='year', max_features=1000):
+    """Consistency check and timing of incremental TF-IDF against full refits.
+
+    Reports are added to an incremental state one at a time, then the last one is replaced by a
+    shortened revision and the first one is removed; after every step the result must equal a
+    full refit on the same reports (tests/test_tfidf.py asserts this on a synthetic corpus).
+    Returns the number of mismatching steps.
+    """
+    import pyarrow as pa
+    from corpus_store import STORE_PATH, load_corpus
+    from tfidf import compute_tfidf, empty_state, period_documents, tfidf_from_state, update_tfidf_state
+
+    columns = ['document_id', 'topic', 'year', 'quarter', 'lemmas', 'upos']
+    table = load_corpus(store_path or STORE_PATH, columns=columns)
+    documents = sorted(set(table.column('document_id').to_pylist()))
+    by_document = {document_id: load_corpus(store_path or STORE_PATH, columns=columns, documents=[document_id])
+                   for document_id in documents}
+
+    steps = [(f'add {document_id}', by_document[document_id], []) for document_id in documents]
+    if documents:
+        last, first = by_document[documents[-1]], documents[0]
+        steps.append((f'revise {documents[-1]}', last.slice(0, last.num_rows // 2), []))
+        steps.append((f'remove {first}', last.slice(0, 0), [first]))
+
+    state, current, mismatches = empty_state(), {}, 0
+    update_seconds = refit_seconds = 0.0
+    for label, changed, removed in steps:
+        for document_id in set(changed.column('document_id').to_pylist()):
+            current[document_id] = changed
+        for document_id in removed:
+            current.pop(document_id, None)
+
+        start = time.perf_counter()
+        update_tfidf_state(state, changed, level, removed_documents=removed)
+        incremental = tfidf_from_state(state, max_features)
+        update_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        corpus = pa.concat_tables([current[document_id] for document_id in sorted(current)] or [table.slice(0, 0)])
+        full = compute_tfidf(*period_documents(corpus, level), max_features)
+        refit_seconds += time.perf_counter() - start
+
+        consistent = same_tfidf(incremental, full)
+        mismatches += not consistent
+        print(f"  {'ok' if consistent else 'MISMATCH'}  {label}: {full[0].shape[0]} periods × {len(full[1])} terms")
+
+    report_rate('full refit per step', len(steps), refit_seconds)
+    report_rate('incremental update', len(steps), update_seconds)
+    print(f"Consistent with full refit: {len(steps) - mismatches}/{len(steps)} steps")
+    return mismatches
+
+
+def compute_average_embeddings_loop(corpora, model):
+    """Reference averaging: one model.wv lookup per token and np.mean per sentence, as word2vec.py used to do."""
+    import numpy as np
+
+    embeddings = {}
+    for topic in corpora:
+        embeddings[topic] = {}
+        for year, sentences in corpora[topic].items():
+            vectors = []
+            for tokens in sentences:
+                word_vecs = [model.wv[token] for token in tokens if token in model.wv]
+                if word_vecs:
+                    vectors.append(np.mean(word_vecs, axis=0))
+            embeddings[topic][year] = np.mean(vectors, axis=0) if vectors else np.zeros(model.vector_size)
+    return embeddings
+
+
+def benchmark_embedding_averaging(model_path, store_path=None, repeat=1):
+    """Sentences/sec of the per-token embedding loop vs the vectorized path, and their largest difference."""
+    import numpy as np
+    from gensim.models import Word2Vec
+    from corpus_store import STORE_PATH, load_topic_corpus
+    from word2vec import tokenize_corpus, compute_average_embeddings
+
+    model = Word2Vec.load(model_path)
+    corpora = tokenize_corpus(load_topic_corpus(store_path or STORE_PATH))
+    corpora = {topic: {year: sentences * repeat for year, sentences in years.items()} for topic, years in corpora.items()}
+    num_sentences = sum(len(sentences) for years in corpora.values() for sentences in years.values())
+
+    start = time.perf_counter()
+    before = compute_average_embeddings_loop(corpora, model)
+    before_rate = report_rate('per-token loop', num_sentences, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    after = compute_average_embeddings(corpora, model)
+    after_rate = report_rate('vectorized', num_sentences, time.perf_counter() - start)
+
+    difference = max(
+        float(np.max(np.abs(before[topic][year] - after[topic][year]))) for topic in before for year in before[topic]
+    )
+    print(f"Speedup: {after_rate / before_rate:.2f}x, max abs difference: {difference:.2e}")
+
+
+class RepeatedSentences:
+    """Restartable iterable yielding `sentences` `repeat` times, to grow the workload without copying it."""
+
+    def __init__(self, sentences, repeat):
+        self.sentences, self.repeat = sentences, repeat
+
+    def __iter__(self):
+        for _ in range(self.repeat):
+            yield from self.sentences
+
+
+def benchmark_word2vec_training(store_path=None, repeat=1, workers=None):
+    """Sentences/sec and peak traced memory of training from an in-memory list, the streaming
+    store iterable and a corpus_file."""
+    import tempfile
+    import tracemalloc
+    from corpus_store import STORE_PATH, StoreSentences
+    from word2vec import WORKERS, train_word2vec_model, write_corpus_file
+
+    workers = workers or WORKERS
+    sentences = RepeatedSentences(StoreSentences(store_path or STORE_PATH), repeat)
+    num_sentences = sum(1 for _ in sentences)
+    corpus_path = os.path.join(tempfile.mkdtemp(), 'corpus.txt')
+    runs = [
+        ('in-memory list', lambda: train_word2vec_model(list(sentences), workers=workers)),
+        ('streaming', lambda: train_word2vec_model(sentences, workers=workers)),
+        ('corpus_file', lambda: train_word2vec_model(corpus_file=write_corpus_file(sentences, corpus_path),
+                                                     workers=workers))
+    ]
+    for label, train in runs:
+        tracemalloc.start()
+        start = time.perf_counter()
+        train()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report_rate(label, num_sentences, seconds)
+        print(f"{'':<24} peak traced memory {peak / 2 ** 20:8.1f} MiB")
+    os.remove(corpus_path)
+
+
+def benchmark_neighbor_queries(level='year', period=None, num_terms=500, k=20):
+    """Terms/sec of per-term gensim most_similar vs one batched blocked top-k, then repeated (cached)."""
+    from neighbors import available_periods, period_vectors, nearest_terms
+
+    period = period or available_periods(level)[-1]
+    keyed_vectors = period_vectors(period, level)
+    terms = keyed_vectors.index_to_key[:num_terms]
+
+    start = time.perf_counter()
+    before = {term: keyed_vectors.most_similar(term, topn=k) for term in terms}
+    report_rate('most_similar per term', len(terms), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    after = nearest_terms(terms, period, level, k)
+    report_rate('batched blocked top-k', len(terms), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    nearest_terms(terms, period, level, k)
+    report_rate('cached', len(terms), time.perf_counter() - start)
+
+    same = sum([w for w, _ in before[term]] == [w for w, _ in after[term]] for term in terms)
+    print(f"Identical neighbour lists: {same}/{len(terms)}")
+
+
+SUITE_STAGES = ['process_pdf', 'preprocess_text', 'tfidf', 'sentiment', 'clarity', 'embeddings']
+SUITE_SCALES = [1, 10, 100]
+SUITE_DOCUMENTS = 4
+SUITE_SEED = 0
+SUITE_MIN_SECONDS = 0.05  # timings below this are too noisy to flag as slowdowns
+SYNTHETIC_DIR = 'data/benchmarks/synthetic'
+BASELINE_PATH = 'data/benchmarks/baseline.json'
+
+
+def plain(value, digits=6):
+    """JSON-able copy of a stage result with floats rounded to `digits`, for digests."""
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+
+    if isinstance(value, pd.DataFrame):
+        return plain(value.astype(object).where(value.notna(), None).to_dict('split'), digits)
+    if sparse.issparse(value):
+        return plain(value.toarray(), digits)
+    if isinstance(value, np.ndarray):
+        return plain(value.tolist(), digits)
+    if isinstance(value, dict):
+        return {str(key): plain(item, digits) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item, digits) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return round(float(value), digits)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def synthetic_pdfs(document_ids, reports, pdf_dir=SYNTHETIC_DIR):
+    """Paths of the synthetic report PDFs, writing the ones not generated by an earlier run.
+
+    PDFs are cached under a hash of their text and layout (see synthetic_corpus.report_pdf_key),
+    so a change to the generator never reuses a stale file.
+    """
+    from synthetic_corpus import extracted_json, is_two_column, report_pdf_key, write_report_pdf
+    from preprocessing import CATEGORIES
+
+    paths = []
+    for document_id in document_ids:
+        extracted = extracted_json(reports[document_id])
+        sentences = [sentence for category in CATEGORIES for sentence in extracted[category]]
+        two_column = is_two_column(document_id)
+        # The file keeps the report's name: extraction reads the year from it
+        path = os.path.join(pdf_dir, report_pdf_key(sentences, two_column)[:16], f'{document_id}.pdf')
+        if not os.path.exists(path):
+            write_report_pdf(path, sentences, two_column)
+        paths.append(path)
+    return paths
+
+
+def synthetic_model(corpora, vector_size=100, seed=SUITE_SEED):
+    """Word2Vec model over the corpus vocabulary with seeded random vectors, so averages are reproducible
+    (trained vectors depend on thread scheduling and PYTHONHASHSEED)."""
+    import numpy as np
+    from gensim.models import Word2Vec
+
+    model = Word2Vec(vector_size=vector_size, min_count=1, workers=1, seed=seed)
+    model.build_vocab([tokens for years in corpora.values() for sentences in years.values() for tokens in sentences])
+    model.wv.vectors = np.random.default_rng(seed).standard_normal(model.wv.vectors.shape).astype(np.float32)
+    return model
+
+
+def run_suite_stage(stage, document_ids, reports):
+    """Run `stage` on the synthetic corpus; returns (items, seconds, result). Inputs are prepared
+    outside the timed region."""
+    from preprocessing import CATEGORIES
+    from synthetic_corpus import corpus_table, extracted_json
+
+    if stage == 'process_pdf':
+        from extract_corpus import process_pdf
+        paths = synthetic_pdfs(document_ids, reports)
+        start = time.perf_counter()
+        result = [process_pdf(path) for path in paths]
+        return len(paths), time.perf_counter() - start, result
+    if stage == 'preprocess_text':
+        from preprocessing import get_nlp, preprocess_text
+        from nlp_resources import get_stopwords
+        sentences = [sentence for report in reports.values()
+                     for category in CATEGORIES for sentence in extracted_json(report)[category]]
+        get_nlp(), get_stopwords()  # load the models before timing
+        start = time.perf_counter()
+        result = [preprocess_text(sentence) for sentence in sentences]
+        return len(sentences), time.perf_counter() - start, result
+
+    table = corpus_table(reports)
+    if stage == 'tfidf':
+        from tfidf import compute_tfidf, period_documents
+        start = time.perf_counter()
+        matrix, vocabulary, rows = compute_tfidf(*period_documents(table, 'year'))
+        seconds = time.perf_counter() - start
+        return table.num_rows, seconds, [matrix, vocabulary, rows]
+    if stage == 'sentiment':
+        from sentiment_heuristics import build_term_counts, default_lexicon, score_lexicons
+        start = time.perf_counter()
+        counts, vocabulary, rows = build_term_counts(table)
+        result = score_lexicons(counts, vocabulary, rows, default_lexicon(), 'year')
+        return table.num_rows, time.perf_counter() - start, result
+    if stage == 'clarity':
+        from clarity_metrics import document_partials, rollup
+        start = time.perf_counter()
+        result = rollup(document_partials(table), 'year')
+        return table.num_rows, time.perf_counter() - start, result
+    if stage == 'embeddings':
+        from corpus_store import group_by_topic_year
+        from word2vec import compute_average_embeddings, tokenize_corpus
+        corpora = tokenize_corpus(group_by_topic_year(table))
+        model = synthetic_model(corpora)
+        start = time.perf_counter()
+        result = compute_average_embeddings(corpora, model)
+        return table.num_rows, time.perf_counter() - start, result
+    raise ValueError(f"Unknown suite stage '{stage}'")
+
+
+def missing_suite_resources(stages):
+    """{stage: reason} for the stages that need resources this machine does not have cached."""
+    missing = {}
+    if 'preprocess_text' in stages:
+        from nlp_resources import available_offline
+        from preprocessing import PREPROCESS_PROCESSORS
+        # The suite never downloads: models must already be cached, as NLP_OFFLINE=1 would require
+        if not available_offline(PREPROCESS_PROCESSORS, tokenize_no_ssplit=True):
+            missing['preprocess_text'] = ('the Stanza Spanish models or NLTK stopwords are not cached locally; '
+                                          'run preprocessing.py once online to download them')
+    return missing
+
+
+def benchmark_suite(stages=SUITE_STAGES, scales=SUITE_SCALES, baseline_path=BASELINE_PATH, save_baseline=False,
+                    tolerance=0.25):
+    """Time every stage on the synthetic corpus at each scale and compare with the stored baseline.
+
+    A scale of n means n × SUITE_DOCUMENTS reports. A stage regresses when it is more than
+    `tolerance` slower than the baseline or its output digest changed; returns the regressions.
+    """
+    from manifest import hash_params
+    from synthetic_corpus import synthetic_reports
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    missing = missing_suite_resources(stages)
+    for stage, reason in missing.items():
+        print(f"Skipping {stage}: {reason}")
+    stages = [stage for stage in stages if stage not in missing]
+
+    results, regressions = {}, []
+    for scale in scales:
+        reports = synthetic_reports(scale * SUITE_DOCUMENTS, SUITE_SEED)
+        document_ids = list(reports)
+        for stage in stages:
+            key = f'{stage}@{scale}x'
+            items, seconds, output = run_suite_stage(stage, document_ids, reports)
+            results[key] = {'items': items, 'seconds': round(seconds, 6),
+                            'items_per_sec': round(items / seconds, 3) if seconds else None,
+                            'digest': hash_params(plain(output))}
+            status = ''
+            reference = baseline.get(key)
+            if reference:
+                ratio = seconds / reference['seconds'] if reference['seconds'] else 1.0
+                status = f"{ratio:5.2f}x baseline"
+                if ratio > 1 + tolerance and seconds >= SUITE_MIN_SECONDS:
+                    status += ' SLOWER'
+                    regressions.append(key)
+                if reference['digest'] != results[key]['digest']:
+                    status += ' OUTPUT CHANGED'
+                    regressions.append(key)
+            print(f"{key:<24} {items:>8} items in {seconds:8.3f}s → {items / seconds if seconds else 0:10.1f} items/sec  {status}")
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({**baseline, **results}, f, ensure_ascii=False, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    elif regressions:
+        print(f"Regressions against {baseline_path}: {', '.join(dict.fromkeys(regressions))}")
+    return list(dict.fromkeys(regressions))
+
+
+def measure_import_time(module, runs=3):
+    """Best-of-`runs` wall time to import `module` in a fresh, offline interpreter."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    env = {**os.environ, 'NLP_OFFLINE': '1'}
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], cwd=UTILS_DIR, env=env,
+                                capture_output=True, text=True, check=True)
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(timings)
+
+
+def benchmark_import_times(runs=3):
+    """Check every utils module against its import-time budget; returns the modules over budget."""
+    modules = sorted(os.path.splitext(os.path.basename(path))[0] for path in glob(os.path.join(UTILS_DIR, '*.py')))
+    over_budget = []
+    for module in modules:
+        budget = IMPORT_TIME_BUDGETS.get(module)
+        seconds = measure_import_time(module, runs)
+        status = 'no budget' if budget is None else ('ok' if seconds <= budget else 'OVER BUDGET')
+        print(f"{module:<24} {seconds:6.3f}s  (budget {budget if budget is not None else '-'}s) {status}")
+        if budget is None or seconds > budget:
+            over_budget.append(module)
+    return over_budget
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pipeline micro-benchmarks.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    lemma_parser = subparsers.add_parser('lemmatize', help='Per-call vs batched Stanza lemmatization')
+    lemma_parser.add_argument('--input-dir', default='data/extracted')
+    lemma_parser.add_argument('--limit', type=int, default=2000)
+    lemma_parser.add_argument('--batch-size', type=int, default=None)
+
+    extract_parser = subparsers.add_parser('extract', help='Serial vs parallel PDF extraction')
+    extract_parser.add_argument('--raw-dir', default='data/raw')
+    extract_parser.add_argument('--workers', type=int, default=None)
+
+    backend_parser = subparsers.add_parser('extract-backends', help='pdfplumber vs PyMuPDF: pages/sec and sentence parity')
+    backend_parser.add_argument('--raw-dir', default='data/raw')
+    backend_parser.add_argument('--backend', action='append', default=None,
+                                help='Backends to compare, the first one as reference (default: pdfplumber, pymupdf)')
+    backend_parser.add_argument('--layout', choices=['auto', 'year'], default='auto')
+    backend_parser.add_argument('--limit', type=int, default=None, help='Only the first N PDFs')
+
+    keyword_parser = subparsers.add_parser('keywords', help='Per-keyword regex vs one-pass keyword scoring')
+    keyword_parser.add_argument('--raw-dir', default='data/raw')
+    keyword_parser.add_argument('--repeat', type=int, default=3)
+
+    language_parser = subparsers.add_parser('language', help='langdetect vs built-in Spanish filter')
+    language_parser.add_argument('--input-dir', default='data/extracted')
+    language_parser.add_argument('--limit', type=int, default=5000)
+
+    clean_parser = subparsers.add_parser('clean-text', help='Per-step regex cleaner vs single-scan clean_text, with adversarial inputs')
+    clean_parser.add_argument('--input-dir', default='data/extracted')
+    clean_parser.add_argument('--limit', type=int, default=20000)
+    clean_parser.add_argument('--repeat', type=int, default=3)
+
+    tfidf_parser = subparsers.add_parser('tfidf-incremental', help='Incremental TF-IDF vs full refit, with consistency check')
+    tfidf_parser.add_argument('--store', default=None, help='Corpus store (default: data/corpus/corpus.arrow)')
+    tfidf_parser.add_argument('--level', choices=['year', 'quarter'], default='quarter')
+    tfidf_parser.add_argument('--max-features', type=int, default=1000)
+
+    embedding_parser = subparsers.add_parser('embeddings', help='Per-token loop vs vectorized embedding averaging')
+    embedding_parser.add_argument('--model', default='data/features/embeddings/word2vec.model')
+    embedding_parser.add_argument('--store', default=None, help='Corpus store (default: data/corpus/corpus.arrow)')
+    embedding_parser.add_argument('--repeat', type=int, default=1, help='Repeat the corpus to get a larger workload')
+
+    training_parser = subparsers.add_parser('word2vec-training', help='In-memory vs streaming vs corpus_file Word2Vec training')
+    training_parser.add_argument('--store', default=None, help='Corpus store (default: data/corpus/corpus.arrow)')
+    training_parser.add_argument('--repeat', type=int, default=1, help='Repeat the corpus to get a larger workload')
+    training_parser.add_argument('--workers', type=int, default=None)
+
+    neighbor_parser = subparsers.add_parser('neighbors', help='Per-term most_similar vs batched blocked top-k queries')
+    neighbor_parser.add_argument('--level', choices=['year', 'quarter'], default='year')
+    neighbor_parser.add_argument('--period', default=None, help='Period to query (default: the last one)')
+    neighbor_parser.add_argument('--num-terms', type=int, default=500)
+    neighbor_parser.add_argument('--k', type=int, default=20)
+
+    suite_parser = subparsers.add_parser('suite', help='Every stage on a synthetic corpus at 1x/10x/100x, vs a stored baseline')
+    suite_parser.add_argument('--stage', action='append', choices=SUITE_STAGES, default=None,
+                              help='Only benchmark this stage (repeatable)')
+    suite_parser.add_argument('--scales', type=int, nargs='+', default=SUITE_SCALES,
+                              help=f'Corpus sizes as multiples of {SUITE_DOCUMENTS} reports')
+    suite_parser.add_argument('--baseline', default=BASELINE_PATH)
+    suite_parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    suite_parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown against the baseline')
+
+    import_parser = subparsers.add_parser('imports', help='Import time of every utils module vs its budget')
+    import_parser.add_argument('--runs', type=int, default=3)
+
+    args = parser.parse_args()
+    if args.benchmark == 'lemmatize':
+        benchmark_lemmatization(args.input_dir, args.limit, args.batch_size)
+    elif args.benchmark == 'extract':
+        benchmark_extraction(args.raw_dir, args.workers)
+    elif args.benchmark == 'extract-backends':
+        benchmark_extraction_backends(args.raw_dir, args.backend or ('pdfplumber', 'pymupdf'), args.layout, args.limit)
+    elif args.benchmark == 'keywords':
+        benchmark_keyword_scoring(args.raw_dir, args.repeat)
+    elif args.benchmark == 'language':
+        benchmark_language_filter(args.input_dir, args.limit)
+    elif args.benchmark == 'clean-text':
+        sys.exit(1 if benchmark_clean_text(args.input_dir, args.limit, args.repeat) else 0)
+    elif args.benchmark == 'tfidf-incremental':
+        sys.exit(1 if benchmark_incremental_tfidf(args.store, args.level, args.max_features) else 0)
+    elif args.benchmark == 'embeddings':
+        benchmark_embedding_averaging(args.model, args.store, args.repeat)
+    elif args.benchmark == 'word2vec-training':
+        benchmark_word2vec_training(args.store, args.repeat, args.workers)
+    elif args.benchmark == 'neighbors':
+        benchmark_neighbor_queries(args.level, args.period, args.num_terms, args.k)
+    elif args.benchmark == 'suite':
+        sys.exit(1 if benchmark_suite(args.stage or SUITE_STAGES, args.scales, args.baseline, args.save_baseline,
+                                      args.tolerance) else 0)
+    elif args.benchmark == 'imports':
+        sys.exit(1 if benchmark_import_times(args.runs) else 0)
@@ -1,76 +1,239 @@
 # Estimate clarity metrics (length, tokens per sentence, lexical density) per topic and year
+# Each document is reduced once to mergeable partial aggregates (token counts, a sentence-length
+# histogram and a distinct-token sketch); year, quarter or any date window is a rollup of those.
+# Sentence-level metrics are computed exactly from the store text instead (see sentence_metrics).
 
 import os
-import json
-import re
-from glob import glob
-from collections import defaultdict
-from tqdm import tqdm
+import hashlib
+import argparse
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from corpus_store import STORE_PATH, as_date, document_fingerprints, load_corpus
+from instrumentation import measure
+from manifest import load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+
+# Distinct tokens are counted exactly while a rollup group has fewer than SKETCH_SIZE of them; above
+# that the KMV sketch estimates the count (~1.6% standard error), so lexical density is approximate
+SKETCH_SIZE = 4096
+# Sentence-length histogram bins; the last one holds every sentence of HISTOGRAM_BINS - 1+ tokens
+HISTOGRAM_BINS = 128
+
+LEVELS = {
+    'document': ['document_id'],
+    'quarter': ['year', 'quarter'],
+    'year': ['year']
+}
+PARTIAL_COLUMNS = ['document_id', 'topic', 'year', 'quarter', 'date', 'num_sentences', 'total_tokens',
+                   'length_histogram', 'sketch']
+
+
+def token_hashes(tokens):
+    """Stable 64-bit hash of each token (Python's hash() is salted per process)."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little') for token in tokens),
+        dtype=np.uint64, count=len(tokens)
+    )
+
+
+def merge_sketches(sketches, k=SKETCH_SIZE):
+    """KMV sketch of a union: the k smallest distinct hashes of the merged sketches."""
+    sketches = [np.asarray(sketch, dtype=np.uint64) for sketch in sketches]
+    return np.unique(np.concatenate(sketches))[:k] if sketches else np.zeros(0, dtype=np.uint64)
+
+
+def estimate_distinct(sketch, k=SKETCH_SIZE):
+    if len(sketch) < k:
+        return len(sketch)
+    return (k - 1) / ((float(sketch[-1]) + 1.0) / 2.0 ** 64)
+
+
+def histogram_median(histogram):
+    """Nearest-rank median sentence length of a length histogram."""
+    cumulative = np.cumsum(histogram)
+    if not cumulative.size or not cumulative[-1]:
+        return 0
+    return int(np.searchsorted(cumulative, max(int(np.ceil(cumulative[-1] / 2)), 1)))
+
+
+def sentence_tokens(table):
+    """Whitespace tokens of every row's text, flattened: (tokens, row index of each token, tokens per row)."""
+    tokens = pc.utf8_split_whitespace(table['text'].combine_chunks())
+    flat = pc.list_flatten(tokens)
+    parents = pc.list_parent_indices(tokens).to_numpy(zero_copy_only=False)
+    # Runs of whitespace leave empty tokens behind, which str.split() would not produce
+    nonempty = pc.not_equal(flat, '')
+    flat, parents = flat.filter(nonempty), parents[nonempty.to_numpy(zero_copy_only=False)]
+    return flat, parents, np.bincount(parents, minlength=table.num_rows)
+
+
+def sentence_metrics(table):
+    """Clarity metrics of every sentence of a corpus store table, with exact distinct-token counts."""
+    table = table.filter(pc.is_valid(table['year'])).combine_chunks()
+    flat, parents, lengths = sentence_tokens(table)
+    vocabulary = pc.dictionary_encode(flat)
+    term_ids = vocabulary.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+    num_terms = max(len(vocabulary.dictionary), 1)
+    # Each distinct (sentence, term) pair counts once towards its sentence
+    pairs = np.unique(parents.astype(np.int64) * num_terms + term_ids)
+    distinct = np.bincount(pairs // num_terms, minlength=table.num_rows)
+
+    info = table.select(['document_id', 'topic', 'year', 'quarter', 'sentence_index']).to_pydict()
+    density = np.divide(distinct, lengths, out=np.zeros(len(lengths)), where=lengths > 0)
+    return pd.DataFrame({
+        'topic': info['topic'],
+        'document_id': info['document_id'],
+        'year': [str(year) for year in info['year']],
+        'quarter': info['quarter'],
+        'sentence_index': info['sentence_index'],
+        'num_tokens': lengths,
+        'distinct_tokens': distinct,
+        'lexical_density': density
+    })
+
+
+def document_partials(table):
+    """Mergeable clarity aggregates per (document, topic) of a corpus store table.
+
+    Sentence and token counts come from array operations over the whole table; each
+    distinct token is hashed once for the per-group sketches.
+    """
+    table = table.filter(pc.is_valid(table['year'])).combine_chunks()
+    if not table.num_rows:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+
+    keys = pc.dictionary_encode(
+        pc.binary_join_element_wise(table['document_id'], table['topic'], '\x1f').combine_chunks()
+    )
+    codes = keys.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+    num_groups = len(keys.dictionary)
+
+    flat, parents, lengths = sentence_tokens(table)
+
+    num_sentences = np.bincount(codes, minlength=num_groups)
+    total_tokens = np.bincount(codes, weights=lengths, minlength=num_groups).astype(np.int64)
+    bins = np.minimum(lengths, HISTOGRAM_BINS - 1)
+    histograms = np.bincount(codes * HISTOGRAM_BINS + bins, minlength=num_groups * HISTOGRAM_BINS)
+    histograms = histograms.reshape(num_groups, HISTOGRAM_BINS)
+
+    # Keep the SKETCH_SIZE smallest distinct token hashes of each group
+    vocabulary = pc.dictionary_encode(flat)
+    hashes = token_hashes(vocabulary.dictionary.to_pylist())[vocabulary.indices.to_numpy(zero_copy_only=False)]
+    token_groups = codes[parents]
+    order = np.lexsort((hashes, token_groups))
+    token_groups, hashes = token_groups[order], hashes[order]
+    distinct = np.ones(len(hashes), dtype=bool)
+    distinct[1:] = (token_groups[1:] != token_groups[:-1]) | (hashes[1:] != hashes[:-1])
+    token_groups, hashes = token_groups[distinct], hashes[distinct]
+    starts = np.searchsorted(token_groups, np.arange(num_groups))
+    ends = np.minimum(np.searchsorted(token_groups, np.arange(num_groups), side='right'), starts + SKETCH_SIZE)
+
+    _, first_rows = np.unique(codes, return_index=True)
+    info = table.select(['document_id', 'topic', 'year', 'quarter', 'date']).take(pa.array(first_rows)).to_pydict()
+    return pd.DataFrame({
+        'document_id': info['document_id'],
+        'topic': info['topic'],
+        'year': [str(year) for year in info['year']],
+        'quarter': info['quarter'],
+        # Reports without a quarter in their name count as the start of their year
+        'date': [(d.isoformat() if d else f'{year}-01-01') for d, year in zip(info['date'], info['year'])],
+        'num_sentences': num_sentences,
+        'total_tokens': total_tokens,
+        'length_histogram': list(histograms),
+        'sketch': [hashes[start:end] for start, end in zip(starts, ends)]
+    })
+
+
+def rollup(partials, level='year', start=None, end=None):
+    """Clarity metrics per topic and `level` (document, quarter or year), merged from partials.
+
+    `start`/`end` (dates, ISO strings or years) restrict the rollup to a date window. Lexical
+    density is exact for groups with fewer than SKETCH_SIZE distinct tokens and a sketch estimate
+    above; use sentence_metrics for exact per-sentence values.
+    """
+    start, end = as_date(start), as_date(end, upper=True)
+    if start is not None:
+        partials = partials[partials['date'] >= start.isoformat()]
+    if end is not None:
+        partials = partials[partials['date'] <= end.isoformat()]
 
+    results = []
+    keys = LEVELS[level]
+    for values, group in partials.groupby(['topic'] + keys, sort=True, dropna=False):
+        num_sentences = int(group['num_sentences'].sum())
+        total_tokens = int(group['total_tokens'].sum())
+        histogram = np.sum(np.stack(group['length_histogram'].to_numpy()), axis=0)
+        distinct_tokens = estimate_distinct(merge_sketches(group['sketch']))
+
+        metrics = {
+            "topic": values[0],
+            **dict(zip(keys, values[1:])),
+            "num_sentences": num_sentences,
+            "total_tokens": total_tokens,
+            "avg_tokens_per_sentence": total_tokens / num_sentences,
+            "median_tokens_per_sentence": histogram_median(histogram),
+            "lexical_density": distinct_tokens / total_tokens if total_tokens else 0
+        }
+        results.append(metrics)
 
-def extract_year_from_filename(filename):
-    match = re.search(r'(\d{4})', filename)
-    return match.group(1) if match else None
-
-
-def load_clarity_data(preprocessed_dir):
-    data = defaultdict(lambda: defaultdict(list))  # data[topic][year] = list of sentences
-
-    for path in tqdm(glob(os.path.join(preprocessed_dir, 'preprocessed_*.json'))):
-        year = extract_year_from_filename(path)
-        if not year:
-            continue
-
-        with open(path, 'r', encoding='utf-8') as f:
-            doc = json.load(f)
-
-        for topic in ['gdp_prioritized', 'gdp_other']:
-            for sentence in doc.get(topic, []):
-                data['gdp'][year].append(sentence)
-
-        for topic in ['inflation_prioritized', 'inflation_other']:
-            for sentence in doc.get(topic, []):
-                data['inflation'][year].append(sentence)
+    return pd.DataFrame(results)
 
-    return data
 
+def load_partials(partials_path, documents=None):
+    if not os.path.exists(partials_path):
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+    partials = pd.read_parquet(partials_path)
+    return partials if documents is None else partials[partials['document_id'].isin(documents)]
 
-def compute_clarity_metrics(corpus):
-    """Compute average sentence length, lexical density, and total tokens."""
-    results = []
 
-    for topic in corpus:
-        for year in sorted(corpus[topic].keys()):
-            sentences = corpus[topic][year]
-            if not sentences:
-                continue
-
-            num_sentences = len(sentences)
-            tokens_per_sentence = [len(sentence.split()) for sentence in sentences]
-            all_tokens = [token for sentence in sentences for token in sentence.split()]
-            unique_tokens = set(all_tokens)
-
-            metrics = {
-                "topic": topic,
-                "year": year,
-                "num_sentences": num_sentences,
-                "total_tokens": len(all_tokens),
-                "avg_tokens_per_sentence": np.mean(tokens_per_sentence),
-                "lexical_density": len(unique_tokens) / len(all_tokens) if all_tokens else 0
-            }
-            results.append(metrics)
-
-    return pd.DataFrame(results)
+def save_partials(partials, partials_path):
+    os.makedirs(os.path.dirname(partials_path), exist_ok=True)
+    tmp_path = f'{partials_path}.tmp'
+    partials.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, partials_path)
 
 
 if __name__ == "__main__":
-    PREPROCESSED_DIR = "data/preprocessed"
+    PARTIALS_PATH = "data/features/clarity/clarity_partials.parquet"
     OUTPUT_PATH = "data/features/clarity/clarity_metrics.csv"
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    corpus = load_clarity_data(PREPROCESSED_DIR)
-    df = compute_clarity_metrics(corpus)
-    df.to_csv(OUTPUT_PATH, index=False)
-    print("Clarity metrics saved to clarity_metrics.csv")
+    parser = argparse.ArgumentParser(description='Compute clarity metrics per topic and year (or quarter, document).')
+    parser.add_argument('--force', action='store_true', help='Recompute every document, ignoring the manifest')
+    parser.add_argument('--level', choices=sorted(LEVELS) + ['sentence'], default='year',
+                        help='Rollup level (default: year); sentence reads the store text directly')
+    parser.add_argument('--start', default=None, help='First date (YYYY or YYYY-MM-DD) of the rollup window')
+    parser.add_argument('--end', default=None, help='Last date (YYYY or YYYY-MM-DD) of the rollup window')
+    args = parser.parse_args()
+
+    # Only recompute the partials of documents that changed in the corpus store
+    params = {'sketch_size': SKETCH_SIZE, 'histogram_bins': HISTOGRAM_BINS}
+    manifest = load_manifest('clarity')
+    fingerprints = document_fingerprints(params)
+    stale, reused = partition_stale(manifest, fingerprints, lambda document_id: [PARTIALS_PATH], args.force)
+    removed = prune_missing(manifest, fingerprints, delete_outputs=False)
+
+    if stale or removed:
+        table = load_corpus(STORE_PATH, documents=stale,
+                            columns=['document_id', 'topic', 'year', 'quarter', 'date', 'text'])
+        with measure('vectorize', items=table.num_rows):
+            new_partials = document_partials(table)
+        frames = [df for df in [load_partials(PARTIALS_PATH, reused), new_partials] if len(df)]
+        partials = pd.concat(frames) if frames else pd.DataFrame(columns=PARTIAL_COLUMNS)
+        save_partials(partials.sort_values(['document_id', 'topic'], kind='stable'), PARTIALS_PATH)
+        for document_id in stale:
+            record_build(manifest, document_id, fingerprints[document_id], [PARTIALS_PATH])
+        save_manifest('clarity', manifest)
+    print_build_report('clarity', reused, stale, removed)
+
+    output_path = OUTPUT_PATH if args.level == 'year' else OUTPUT_PATH.replace('.csv', f'_{args.level}.csv')
+    if args.level == 'sentence':
+        table = load_corpus(STORE_PATH, start=args.start, end=args.end,
+                            columns=['document_id', 'topic', 'year', 'quarter', 'sentence_index', 'text'])
+        with measure('vectorize', items=table.num_rows):
+            df = sentence_metrics(table)
+    else:
+        df = rollup(load_partials(PARTIALS_PATH), args.level, args.start, args.end)
+    df.to_csv(output_path, index=False)
+    print(f"Clarity metrics saved to {os.path.basename(output_path)}")
@@ -0,0 +1,278 @@
+# Columnar corpus store shared by the feature modules
+# Every preprocessed sentence becomes one row of a memory-mapped Arrow IPC file, with its topic,
+# subcategory, document, year, quarter and (once annotation.py ran) lemmas and UPOS tags.
+# Each document is one record batch, so date filters skip whole documents without reading them.
+
+import os
+import re
+import json
+import argparse
+from datetime import date
+from collections import defaultdict
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from preprocessing import CATEGORIES, load_preprocessed, preprocessed_files
+from annotation import annotation_path, extract_document_id, load_annotations
+from metada import extract_date_from_filename
+from instrumentation import measure
+from manifest import (
+    fingerprint, hash_params, load_manifest, save_manifest, record_build, partition_stale, prune_missing,
+    print_build_report
+)
+
+STORE_PATH = 'data/corpus/corpus.arrow'
+STORE_VERSION = 1
+
+TOPIC_CATEGORIES = {
+    'gdp': ['gdp_prioritized', 'gdp_other'],
+    'inflation': ['inflation_prioritized', 'inflation_other']
+}
+TOPIC_OF = {category: topic for topic, categories in TOPIC_CATEGORIES.items() for category in categories}
+
+SCHEMA = pa.schema([
+    ('document_id', pa.string()),
+    ('year', pa.int16()),
+    ('quarter', pa.string()),
+    ('date', pa.date32()),
+    ('topic', pa.string()),
+    ('subcategory', pa.string()),
+    ('sentence_index', pa.int32()),
+    ('text', pa.string()),
+    ('lemmas', pa.list_(pa.string())),
+    ('upos', pa.list_(pa.string()))
+])
+
+
+def document_info(document_id):
+    """Year, quarter and ISO start date of a report, from its filename (None where unknown)."""
+    report_date, quarter = extract_date_from_filename(document_id)
+    match = re.search(r'(\d{4})', document_id)
+    return {
+        'document_id': document_id,
+        'year': int(match.group(1)) if match else None,
+        'quarter': quarter,
+        'date': report_date
+    }
+
+
+def period_of(year, quarter, level='year'):
+    """Label of a report's period: '2016' per year, '2016-Q1' per quarter."""
+    return str(year) if level == 'year' else f"{year}-{quarter or 'NA'}"
+
+
+def document_batch(document_id, text_data, annotations=None):
+    """One record batch holding every sentence of a preprocessed document."""
+    info = document_info(document_id)
+    annotated = {}
+    for record in annotations or []:
+        for category, index in record['refs']:
+            annotated[(category, index)] = record
+
+    columns = defaultdict(list)
+    for category in CATEGORIES:
+        for index, sentence in enumerate(text_data.get(category, [])):
+            record = annotated.get((category, index))
+            columns['topic'].append(TOPIC_OF.get(category))
+            columns['subcategory'].append(category)
+            columns['sentence_index'].append(index)
+            columns['text'].append(sentence)
+            columns['lemmas'].append(record['lemmas'] if record else None)
+            columns['upos'].append(record['upos'] if record else None)
+
+    num_rows = len(columns['text'])
+    report_date = date.fromisoformat(info['date']) if info['date'] else None
+    columns['document_id'] = [document_id] * num_rows
+    columns['year'] = [info['year']] * num_rows
+    columns['quarter'] = [info['quarter']] * num_rows
+    columns['date'] = [report_date] * num_rows
+    return pa.RecordBatch.from_pydict({field.name: columns[field.name] for field in SCHEMA}, schema=SCHEMA)
+
+
+def open_store(store_path=STORE_PATH):
+    """Memory-map the store; record batches are only paged in when accessed."""
+    return pa.ipc.open_file(pa.memory_map(store_path, 'r'))
+
+
+def store_index(reader):
+    """Per-batch document info, kept in the schema metadata so filters never touch the data."""
+    return json.loads(reader.schema.metadata[b'documents'])
+
+
+def write_store(batches, index, store_path=STORE_PATH):
+    """Write one batch per document atomically, with `index` describing the batches in order."""
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    schema = SCHEMA.with_metadata({'documents': json.dumps(index, ensure_ascii=False)})
+    tmp_path = f'{store_path}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    os.replace(tmp_path, store_path)
+
+
+def as_date(value, upper=False):
+    """Accept a date, an ISO date string or a bare year ('2016' spans the whole year)."""
+    if value is None or isinstance(value, date):
+        return value
+    value = str(value)
+    if re.fullmatch(r'\d{4}', value):
+        return date(int(value), 12, 31) if upper else date(int(value), 1, 1)
+    return date.fromisoformat(value)
+
+
+def _selected(info, start, end, years, documents):
+    if years is not None and str(info['year']) not in years:
+        return False
+    if documents is not None and info['document_id'] not in documents:
+        return False
+    if start is None and end is None:
+        return True
+    if info['year'] is None:
+        return False
+    # Reports without a quarter in their name count as the start of their year
+    report_date = date.fromisoformat(info['date']) if info['date'] else date(info['year'], 1, 1)
+    return (start is None or report_date >= start) and (end is None or report_date <= end)
+
+
+def load_corpus(store_path=STORE_PATH, topics=None, start=None, end=None, years=None, columns=None,
+                documents=None):
+    """Rows of the store as a pyarrow Table, filtered by topic, date range, years and/or documents.
+
+    `start`/`end` are inclusive dates, ISO strings or years; documents outside the range
+    are skipped without being read. `columns` limits the returned columns.
+    """
+    reader = open_store(store_path)
+    start, end = as_date(start), as_date(end, upper=True)
+    years = None if years is None else {str(year) for year in years}
+    documents = None if documents is None else set(documents)
+    schema = SCHEMA if columns is None else pa.schema([SCHEMA.field(name) for name in columns])
+
+    batches = []
+    for i, info in enumerate(store_index(reader)):
+        if not _selected(info, start, end, years, documents):
+            continue
+        batch = reader.get_batch(i)
+        if topics is not None:
+            batch = batch.filter(pc.is_in(batch.column('topic'), value_set=pa.array(sorted(topics))))
+        batches.append(batch if columns is None else batch.select(columns))
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def group_by_topic_year(table, column='text'):
+    """Nest rows as {topic: {year: [values]}}, the layout the feature modules aggregate over.
+
+    With a list of columns each value is a {column: value} dict. Years are strings and rows
+    with a missing value (e.g. sentences that were not annotated yet) are skipped.
+    """
+    columns = [column] if isinstance(column, str) else list(column)
+    data = table.select(list(dict.fromkeys(['topic', 'year'] + columns))).to_pydict()
+    grouped = defaultdict(lambda: defaultdict(list))
+    for i, (topic, year) in enumerate(zip(data['topic'], data['year'])):
+        values = {name: data[name][i] for name in columns}
+        if year is None or any(value is None for value in values.values()):
+            continue
+        grouped[topic][str(year)].append(values[column] if isinstance(column, str) else values)
+    return grouped
+
+
+def load_topic_corpus(store_path=STORE_PATH, column='text', topics=None, start=None, end=None, years=None):
+    """{topic: {year: [values of `column`]}} for the selected rows of the store."""
+    columns = [column] if isinstance(column, str) else list(column)
+    table = load_corpus(store_path, topics, start, end, years,
+                        columns=list(dict.fromkeys(['topic', 'year'] + columns)))
+    return group_by_topic_year(table, column)
+
+
+class StoreSentences:
+    """Restartable iterable over the token lists of the dated sentences in the store.
+
+    Each pass re-reads the memory-mapped store one document batch at a time, so memory stays
+    flat however large the corpus grows; gensim iterates once for the vocabulary and once per epoch.
+    """
+
+    def __init__(self, store_path=STORE_PATH, topics=None, start=None, end=None, years=None, documents=None):
+        self.store_path = store_path
+        self.topics = None if topics is None else sorted(topics)
+        self.start, self.end = as_date(start), as_date(end, upper=True)
+        self.years = None if years is None else {str(year) for year in years}
+        self.documents = None if documents is None else set(documents)
+
+    def __iter__(self):
+        reader = open_store(self.store_path)
+        for i, info in enumerate(store_index(reader)):
+            if info['year'] is None or not _selected(info, self.start, self.end, self.years, self.documents):
+                continue
+            batch = reader.get_batch(i)
+            if self.topics is not None:
+                batch = batch.filter(pc.is_in(batch.column('topic'), value_set=pa.array(self.topics)))
+            for text in batch.column('text').to_pylist():
+                if text is not None:
+                    yield text.split()
+
+
+def document_fingerprints(params=None):
+    """Per-document fingerprint of the store contents, for the manifests of the feature stages."""
+    return {
+        document_id: hash_params({'document': entry['fingerprint'], 'params': params})
+        for document_id, entry in load_manifest('corpus').items()
+    }
+
+
+def year_fingerprints(params=None):
+    """Per-year fingerprint of the store contents, for the manifests of the feature stages."""
+    documents = defaultdict(list)
+    for document_id, entry in load_manifest('corpus').items():
+        year = document_info(document_id)['year']
+        if year is not None:
+            documents[str(year)].append([document_id, entry['fingerprint']])
+    return {year: hash_params({'documents': sorted(docs), 'params': params}) for year, docs in documents.items()}
+
+
+def build_corpus_store(preprocessed_dir, annotated_dir, store_path=STORE_PATH, force=False):
+    """(Re)build the store, reusing the batches of documents whose inputs did not change."""
+    input_files = {extract_document_id(path): path for path in preprocessed_files(preprocessed_dir)}
+
+    def inputs_for(document_id):
+        annotated_path = annotation_path(annotated_dir, document_id)
+        return [input_files[document_id]] + ([annotated_path] if os.path.exists(annotated_path) else [])
+
+    params = {'version': STORE_VERSION, 'categories': CATEGORIES, 'topics': TOPIC_CATEGORIES}
+    manifest = load_manifest('corpus')
+    fingerprints = {document_id: fingerprint(inputs_for(document_id), params) for document_id in input_files}
+    stale, reused = partition_stale(manifest, fingerprints, lambda document_id: [store_path], force)
+    removed = prune_missing(manifest, fingerprints, delete_outputs=False)
+
+    previous = {}
+    if reused:
+        reader = open_store(store_path)
+        previous = {info['document_id']: i for i, info in enumerate(store_index(reader))}
+        # A document missing from the old store (e.g. an interrupted build) is rebuilt
+        stale += [document_id for document_id in reused if document_id not in previous]
+        reused = [document_id for document_id in reused if document_id in previous]
+
+    if stale or removed:
+        index, batches = [], []
+        with measure('corpus_store', items=len(stale)):
+            for document_id in sorted(input_files):
+                if document_id in reused:
+                    batches.append(reader.get_batch(previous[document_id]))
+                else:
+                    text_data = load_preprocessed(input_files[document_id])
+                    batches.append(document_batch(document_id, text_data, load_annotations(annotated_dir, document_id)))
+                index.append(document_info(document_id))
+            write_store(batches, index, store_path)
+        for document_id in stale:
+            record_build(manifest, document_id, fingerprints[document_id], [store_path])
+        save_manifest('corpus', manifest)
+    print_build_report('corpus', reused, stale, removed)
+
+
+if __name__ == "__main__":
+    PREPROCESSED_DIR = 'data/preprocessed'
+    ANNOTATED_DIR = 'data/annotated'
+
+    parser = argparse.ArgumentParser(description='Build the columnar corpus store used by the feature modules.')
+    parser.add_argument('--force', action='store_true', help='Rebuild every document, ignoring the manifest')
+    args = parser.parse_args()
+    build_corpus_store(PREPROCESSED_DIR, ANNOTATED_DIR, STORE_PATH, force=args.force)
+    print(f"Corpus store saved to {STORE_PATH}")
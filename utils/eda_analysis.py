@@ -1,32 +1,39 @@
 # Exploratory Data Analysis (EDA) on TF-IDF outputs
+# Figures go through visualizations.render_figures: headless, in parallel, and only redrawn when
+# the TF-IDF outputs or the parameters changed.
 import os
+import argparse
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # set before pyplot is imported; figures are only written to files
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-def term_frequency_analysis(tfidf_csv_path, top_n=30):
-    df = pd.read_csv(tfidf_csv_path, index_col=0)
-    term_totals = df.sum(axis=0).sort_values(ascending=False)
-    top_terms = term_totals.head(top_n)
+from tfidf import load_tfidf, tfidf_paths, top_terms, term_scores
+from visualizations import render_figures
+
+def term_frequency_analysis(tfidf_dir, topic='gdp', top_n=30, output_path="figures/eda/top_terms_tfidf.png"):
+    matrix, vocabulary, _ = load_tfidf(tfidf_dir, topic=topic)
+    term_totals = top_terms(matrix, vocabulary, top_n)
 
     plt.figure(figsize=(10, 5))
-    sns.barplot(x=top_terms.values, y=top_terms.index)
+    sns.barplot(x=term_totals.values, y=term_totals.index)
     plt.title(f"Top {top_n} TF-IDF Terms")
     plt.xlabel("TF-IDF Score (Summed Over Years)")
     plt.ylabel("Term")
     plt.tight_layout()
-    os.makedirs("figures/eda", exist_ok=True)
-    plt.savefig("figures/eda/top_terms_tfidf.png")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    plt.savefig(output_path)
     plt.close()
 
 
-def visualize_topic_evolution(tfidf_csv_path):
-    df = pd.read_csv(tfidf_csv_path, index_col=0)
-    top_terms = df.sum().sort_values(ascending=False).head(15).index
-    df_filtered = df[top_terms]
+def visualize_topic_evolution(tfidf_dir, topic='gdp', top_n=15, output_path="figures/eda/topic_evolution.png"):
+    matrix, vocabulary, rows = load_tfidf(tfidf_dir, topic=topic)
+    top = top_terms(matrix, vocabulary, top_n).index
+    df_filtered = term_scores(matrix, vocabulary, rows, top)
 
     plt.figure(figsize=(12, 6))
-    for term in top_terms:
+    for term in top:
         plt.plot(df_filtered.index, df_filtered[term], label=term, marker='o')
     plt.title("Thematic Term Evolution Over Time")
     plt.xlabel("Year")
@@ -34,11 +41,24 @@ def visualize_topic_evolution(tfidf_csv_path):
     plt.legend()
     plt.grid(True)
     plt.tight_layout()
-    plt.savefig("figures/eda/topic_evolution.png")
+    plt.savefig(output_path)
     plt.close()
 
 
 if __name__ == "__main__":
+    TFIDF_DIR = "data/features/tfidf"
+
+    parser = argparse.ArgumentParser(description='Render the EDA figures into figures/eda/.')
+    parser.add_argument('--topic', default='gdp')
+    parser.add_argument('--processes', type=int, default=None, help='Figures rendered in parallel (default: all CPUs)')
+    parser.add_argument('--force', action='store_true', help='Redraw every figure, ignoring the manifest')
+    args = parser.parse_args()
+
     # Run EDA steps
-    term_frequency_analysis("data/features/tfidf/tfidf_gdp.csv")
-    visualize_topic_evolution("data/features/tfidf/tfidf_gdp.csv")
+    inputs = list(tfidf_paths(TFIDF_DIR).values())
+    render_figures([
+        (term_frequency_analysis, {'tfidf_dir': TFIDF_DIR, 'topic': args.topic,
+                                   'output_path': "figures/eda/top_terms_tfidf.png"}, inputs),
+        (visualize_topic_evolution, {'tfidf_dir': TFIDF_DIR, 'topic': args.topic,
+                                     'output_path': "figures/eda/topic_evolution.png"}, inputs)
+    ], stage='eda_figures', processes=args.processes, force=args.force)
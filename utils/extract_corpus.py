@@ -1,16 +1,20 @@
 # pipeline_mexico.py
 # ETL for NLP-Driven Macroeconomic Discourse Analysis – Mexico-Focused
-# Single-column parsing for 2015–2017; two-column thereafter; enhanced filtering.
+# Single-column parsing for 2015–2017; two-column thereafter, or detected per page (see pdf_backends.py); enhanced filtering.
 
 import os
 import re
 import json
 import glob
-import pdfplumber
-import warnings
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 
-# Suppress CropBox warnings
-warnings.filterwarnings("ignore", message="CropBox missing from /Page.*")
+from manifest import (
+    fingerprint, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
+from instrumentation import measure
+from pdf_backends import BACKENDS, LAYOUTS, LAYOUT, PDF_BACKEND, extract_pages
 
 # Directories
 raw_dir = 'data/raw'
@@ -28,19 +32,19 @@ global_keywords = ['mundo', 'mundial', 'global', 'internacional', 'economía mun
 MIN_SENTENCE_LENGTH = 30
 PRIORITY_SCORE_THRESHOLD = 2
 
+# Everything besides the PDF itself that determines the extracted output
+EXTRACT_PARAMS = {
+    'gdp_keywords': gdp_keywords,
+    'inflation_keywords': inflation_keywords,
+    'mexico_keywords': mexico_keywords,
+    'global_keywords': global_keywords,
+    'min_sentence_length': MIN_SENTENCE_LENGTH,
+    'priority_score_threshold': PRIORITY_SCORE_THRESHOLD
+}
 
-def extract_text_columns(path, two_column=True):
-    texts = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            if two_column:
-                w, h = page.width, page.height
-                left = page.within_bbox((0, 0, w/2, h)).extract_text() or ''
-                right = page.within_bbox((w/2, 0, w, h)).extract_text() or ''
-                texts.append(f"{left}\n{right}")
-            else:
-                texts.append(page.extract_text() or '')
-    return '\n'.join(texts)
+
+def extract_text(path, backend=PDF_BACKEND, layout=LAYOUT):
+    return '\n'.join(extract_pages(path, backend, layout))
 
 
 def tokenize(text):
@@ -59,36 +63,68 @@ def filter_exclude(sentences, exclude_patterns):
     return [s for s in sentences if not exc.search(s)]
 
 
-def process_pdf(path):
-    # Determine year from filename
-    base = os.path.splitext(os.path.basename(path))[0]
-    year_match = re.search(r"(20\d{2})", base)
-    year = int(year_match.group(1)) if year_match else None
-    # Use single column for 2015–2017, two columns from 2018 onward
-    two_col = False if year and 2015 <= year <= 2017 else True
-
-    text = extract_text_columns(path, two_column=two_col)
-    sentences = tokenize(text)
-
-    # Exclude global context, short lines, chart captions
-    filtered = filter_exclude(sentences, global_keywords)
-    filtered = [s for s in filtered if len(s) >= MIN_SENTENCE_LENGTH]
-    filtered = [s for s in filtered if not re.match(r"(?i)^\s*grá?fica", s)]
-
-    # Prepare patterns
-    gdp_pat = re.compile(r"\b(?:" + "|".join(map(re.escape, gdp_keywords)) + r")\b", re.IGNORECASE)
-    inf_pat = re.compile(r"\b(?:" + "|".join(map(re.escape, inflation_keywords)) + r")\b", re.IGNORECASE)
-    mex_pat = re.compile(r"\b(?:" + "|".join(map(re.escape, mexico_keywords)) + r")\b", re.IGNORECASE)
-
+def build_keyword_matcher(groups):
+    """Compile keyword groups into a function that scans a sentence once and returns per-group hit counts.
+
+    Counts equal `score_sentence(sent, keywords)` for every group. A single lookahead
+    alternation (longest keyword first) finds the longest keyword at each position;
+    shorter keywords that are word-bounded prefixes of it (e.g. "inflación" inside
+    "inflación subyacente") are credited too, and each keyword keeps its own
+    non-overlapping cursor like `re.findall`.
+    """
+    keywords = sorted({kw for kws in groups.values() for kw in kws}, key=len, reverse=True)
+    owners = [[name for name, kws in groups.items() for other in kws if other == kw] for kw in keywords]
+    credits = [
+        [j for j, other in enumerate(keywords)
+         if j == i
+         or (len(other) == len(kw) and other.lower() == kw.lower())
+         or (len(other) < len(kw) and re.match(r"\b" + re.escape(other) + r"\b", kw, re.IGNORECASE))]
+        for i, kw in enumerate(keywords)
+    ]
+    scanner = re.compile(
+        "(?=" + "|".join(r"\b(" + re.escape(kw) + r")\b" for kw in keywords) + ")", re.IGNORECASE
+    )
+
+    def score_groups(sent):
+        counts = dict.fromkeys(groups, 0)
+        next_start = [0] * len(keywords)
+        for match in scanner.finditer(sent):
+            pos = match.start()
+            for j in credits[match.lastindex - 1]:
+                if pos >= next_start[j]:
+                    next_start[j] = pos + len(keywords[j])
+                    for name in owners[j]:
+                        counts[name] += 1
+        return counts
+
+    return score_groups
+
+
+score_keyword_groups = build_keyword_matcher({
+    'gdp': gdp_keywords,
+    'inflation': inflation_keywords,
+    'mexico': mexico_keywords,
+    'global': global_keywords
+})
+
+CAPTION_PATTERN = re.compile(r"(?i)^\s*grá?fica")
+
+
+def classify_sentences(sentences):
+    """Drop global, short and caption sentences, then bucket the rest into GDP/inflation categories."""
     # Buckets
     gdp_prioritized, gdp_other = [], []
     inf_prioritized, inf_other = [], []
 
-    # Classify sentences
-    for s in filtered:
-        gdp_score = score_sentence(s, gdp_keywords)
-        inf_score = score_sentence(s, inflation_keywords)
-        mex_score = score_sentence(s, mexico_keywords)
+    for s in sentences:
+        # Exclude short lines, chart captions and global context
+        if len(s) < MIN_SENTENCE_LENGTH or CAPTION_PATTERN.match(s):
+            continue
+        scores = score_keyword_groups(s)
+        if scores['global']:
+            continue
+
+        gdp_score, inf_score, mex_score = scores['gdp'], scores['inflation'], scores['mexico']
         # GDP
         if gdp_score > 0:
             if mex_score + gdp_score >= PRIORITY_SCORE_THRESHOLD:
@@ -110,18 +146,61 @@ def process_pdf(path):
     }
 
 
-def main():
-    for path in glob.glob(os.path.join(raw_dir, '*.pdf')):
-        base = os.path.splitext(os.path.basename(path))[0]
-        year = (re.search(r"20\d{2}", base) or ['unknown'])[0]
-        year_dir = os.path.join(output_dir, year)
-        os.makedirs(year_dir, exist_ok=True)
+def process_pdf(path, backend=PDF_BACKEND, layout=LAYOUT):
+    text = extract_text(path, backend, layout)
+    return classify_sentences(tokenize(text))
+
 
-        data = process_pdf(path)
-        out_path = os.path.join(year_dir, f"{base}.json")
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"Written {out_path}")
+def output_path_for(path):
+    base = os.path.splitext(os.path.basename(path))[0]
+    year = (re.search(r"20\d{2}", base) or ['unknown'])[0]
+    return os.path.join(output_dir, year, f"{base}.json")
+
+
+def process_pdfs(paths, workers=1, backend=PDF_BACKEND, layout=LAYOUT):
+    """Yield (path, data) for each PDF in input order, spreading PDFs over `workers` processes."""
+    process = partial(process_pdf, backend=backend, layout=layout)
+    if workers <= 1:
+        for path in paths:
+            yield path, process(path)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from zip(paths, pool.map(process, paths))
+
+
+def main(workers=1, force=False, backend=PDF_BACKEND, layout=LAYOUT):
+    paths = {os.path.basename(path): path for path in sorted(glob.glob(os.path.join(raw_dir, '*.pdf')))}
+    manifest = load_manifest('extract')
+    # The default backend and layout extract what this stage always did, so their manifests stay valid
+    params = EXTRACT_PARAMS if (backend, layout) == (PDF_BACKEND, LAYOUT) else {
+        **EXTRACT_PARAMS, 'backend': backend, 'layout': layout
+    }
+    fingerprints = {name: fingerprint([path], params) for name, path in paths.items()}
+    stale, reused = partition_stale(manifest, fingerprints, lambda name: [output_path_for(paths[name])], force)
+    removed = prune_missing(manifest, paths)
+
+    # Parsing, sentence splitting and classification of each PDF (possibly in worker processes)
+    with measure('pdf_parse', items=len(stale)):
+        for path, data in process_pdfs([paths[name] for name in stale], workers, backend, layout):
+            out_path = output_path_for(path)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            print(f"Written {out_path}")
+            name = os.path.basename(path)
+            record_build(manifest, name, fingerprints[name], [out_path])
+            save_manifest('extract', manifest)
+
+    save_manifest('extract', manifest)
+    print_build_report('extract', reused, stale, removed)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Extract and filter GDP/inflation sentences from raw PDFs.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes parsing PDFs in parallel (default: serial)')
+    parser.add_argument('--force', action='store_true', help='Rebuild every PDF, ignoring the manifest')
+    parser.add_argument('--backend', choices=list(BACKENDS), default=PDF_BACKEND, help='PDF text extraction library (pymupdf is much faster)')
+    parser.add_argument('--layout', choices=LAYOUTS, default=LAYOUT,
+                        help="Column layout: detected per page ('auto') or by report year ('year')")
+    args = parser.parse_args()
+    main(workers=args.workers, force=args.force, backend=args.backend, layout=args.layout)
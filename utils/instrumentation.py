@@ -0,0 +1,88 @@
+# Per-step instrumentation shared by the pipeline stages
+# Stages wrap their steps (PDF parse, clean, lemmatize, vectorize, train, render, ...) in measure(),
+# which accumulates wall time, items, Stanza calls and peak RSS per step. With PIPELINE_REPORT set
+# to a path, the totals are written there as JSON when the process exits (pipeline.py does this for
+# every stage and merges the files into one run report).
+
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+from contextlib import contextmanager
+from collections import Counter
+
+REPORT_ENV = 'PIPELINE_REPORT'
+
+_steps = {}
+_counters = Counter()
+_started = time.time()
+
+
+def count(name, n=1):
+    """Add to a process-wide counter (e.g. 'stanza_calls'); measure() attributes it to the open steps."""
+    _counters[name] += n
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far (ru_maxrss is in KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+@contextmanager
+def measure(step, items=None):
+    """Time one call of `step`, adding to its totals. The number of items processed can be passed
+    up front or set on the yielded dict (`record['items'] = n`). Steps may nest."""
+    record = {'items': items}
+    counters_before = Counter(_counters)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        totals = _steps.setdefault(step, {'calls': 0, 'wall_seconds': 0.0, 'items': 0, 'counters': Counter()})
+        totals['calls'] += 1
+        totals['wall_seconds'] += time.perf_counter() - start
+        totals['items'] += record['items'] or 0
+        totals['counters'].update(_counters - counters_before)
+        totals['peak_rss_mb'] = peak_rss_mb()
+
+
+def step_report():
+    """{step: {calls, wall_seconds, items, items_per_sec, peak_rss_mb, <counters>}} of this process."""
+    return {
+        step: {
+            'calls': totals['calls'],
+            'wall_seconds': round(totals['wall_seconds'], 6),
+            'items': totals['items'],
+            'items_per_sec': round(totals['items'] / totals['wall_seconds'], 3) if totals['wall_seconds'] else None,
+            'peak_rss_mb': round(totals['peak_rss_mb'], 1),
+            **totals['counters']
+        }
+        for step, totals in _steps.items()
+    }
+
+
+def write_report(path=None):
+    """Write this process's step totals as JSON to `path` (default: $PIPELINE_REPORT)."""
+    path = path or os.environ.get(REPORT_ENV)
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    report = {
+        'script': os.path.basename(sys.argv[0]),
+        'argv': sys.argv[1:],
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(_started)),
+        'wall_seconds': round(time.time() - _started, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'counters': dict(_counters),
+        'steps': step_report()
+    }
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+if os.environ.get(REPORT_ENV):
+    atexit.register(write_report)
@@ -0,0 +1,99 @@
+# Fast, deterministic Spanish / non-Spanish classifier for cleaned sentences
+# Replaces per-sentence langdetect: scores Spanish vs English stopword hits, character
+# n-gram hits and accented letters, counted for a whole batch with a few regex scans.
+
+import re
+import numpy as np
+
+SPANISH_STOPWORDS = {
+    'de', 'la', 'que', 'el', 'en', 'y', 'los', 'del', 'se', 'las', 'por', 'un', 'para', 'con', 'una',
+    'su', 'al', 'lo', 'como', 'más', 'pero', 'sus', 'le', 'ya', 'este', 'sí', 'porque', 'esta', 'entre',
+    'cuando', 'muy', 'sin', 'sobre', 'también', 'hasta', 'hay', 'donde', 'desde', 'todo', 'nos',
+    'durante', 'todos', 'uno', 'les', 'ni', 'contra', 'otros', 'ese', 'eso', 'ante', 'ellos', 'esto',
+    'antes', 'algunos', 'qué', 'unos', 'otro', 'otras', 'otra', 'él', 'tanto', 'esa', 'estos', 'mucho',
+    'nada', 'muchos', 'cual', 'poco', 'ella', 'estas', 'algunas', 'algo', 'es', 'son', 'fue', 'ha',
+    'han', 'sido', 'será', 'está', 'están', 'ser', 'respecto', 'mayor', 'menor', 'dicho', 'dicha'
+}
+
+ENGLISH_STOPWORDS = {
+    'the', 'of', 'and', 'to', 'in', 'is', 'that', 'for', 'it', 'as', 'was', 'with', 'be', 'by', 'on',
+    'this', 'are', 'or', 'his', 'from', 'at', 'which', 'but', 'have', 'an', 'they', 'you', 'were',
+    'her', 'she', 'there', 'been', 'has', 'their', 'one', 'all', 'would', 'will', 'we', 'more', 'if',
+    'can', 'its', 'who', 'so', 'than', 'these', 'them', 'some', 'other', 'into', 'only', 'could',
+    'also', 'may', 'such', 'over', 'after', 'while', 'during', 'should', 'between', 'about', 'because'
+}
+
+# Character n-grams that are frequent in one language and rare in the other
+SPANISH_NGRAMS = [
+    'ción', 'ión', 'que', 'ado', 'ada', 'dad', 'ndo', 'mie', 'cia', 'aci', 'nte', 'los', 'las',
+    'del', 'ien', 'ue', 'ía', 'io', 'za', 'rr', 'll', 'mente'
+]
+ENGLISH_NGRAMS = [
+    'th', 'ing', 'wh', 'sh', 'ght', 'ck', 'ee', 'oo', 'ou', 'ly', 'tion', 'ea', 'ai', 'ow', 'aw',
+    'ew', 'ey', 'w', 'k'
+]
+ACCENTED = 'áéíóúñü'
+
+NGRAM_WEIGHT = 0.25
+ACCENT_WEIGHT = 1.0
+SPANISH_THRESHOLD = 0.0
+CACHE_SIZE = 100_000
+
+
+def _word_pattern(words):
+    return re.compile(r'\b(?:' + '|'.join(map(re.escape, sorted(words, key=len, reverse=True))) + r')\b')
+
+
+def _overlapping_pattern(ngrams):
+    return re.compile('(?=(?:' + '|'.join(map(re.escape, sorted(ngrams, key=len, reverse=True))) + '))')
+
+
+# Words in both lists (e.g. "no", "a") carry no signal
+_ES_WORDS = _word_pattern(SPANISH_STOPWORDS - ENGLISH_STOPWORDS)
+_EN_WORDS = _word_pattern(ENGLISH_STOPWORDS - SPANISH_STOPWORDS)
+_ES_NGRAMS = _overlapping_pattern(SPANISH_NGRAMS)
+_EN_NGRAMS = _overlapping_pattern(ENGLISH_NGRAMS)
+_ACCENTS = re.compile(f'[{ACCENTED}]')
+_TOKENS = re.compile(r'\S+')
+
+_score_cache = {}
+
+
+def _count_per_sentence(pattern, joined, offsets, n):
+    starts = np.fromiter((m.start() for m in pattern.finditer(joined)), dtype=np.int64)
+    return np.bincount(np.searchsorted(offsets, starts, side='right') - 1, minlength=n)
+
+
+def _compute_scores(sentences):
+    """Score a batch in one scan per feature: sentences are joined and hits are binned by offset."""
+    joined = '\n'.join(sentences)
+    offsets = np.cumsum([0] + [len(s) + 1 for s in sentences[:-1]])
+    n = len(sentences)
+
+    tokens = np.maximum(_count_per_sentence(_TOKENS, joined, offsets, n), 1)
+    stopword_diff = (_count_per_sentence(_ES_WORDS, joined, offsets, n)
+                     - _count_per_sentence(_EN_WORDS, joined, offsets, n))
+    ngram_diff = (_count_per_sentence(_ES_NGRAMS, joined, offsets, n)
+                  - _count_per_sentence(_EN_NGRAMS, joined, offsets, n))
+    accents = _count_per_sentence(_ACCENTS, joined, offsets, n)
+    return (stopword_diff + NGRAM_WEIGHT * ngram_diff + ACCENT_WEIGHT * accents) / tokens
+
+
+def spanish_scores(sentences):
+    """Spanish-ness score per sentence (> SPANISH_THRESHOLD means Spanish); repeated sentences are memoized."""
+    missing = list(dict.fromkeys(s for s in sentences if s not in _score_cache))
+    if missing:
+        if len(_score_cache) + len(missing) > CACHE_SIZE:
+            _score_cache.clear()
+        _score_cache.update(zip(missing, _compute_scores(missing).tolist()))
+    return np.array([_score_cache[s] for s in sentences], dtype=float)
+
+
+def is_spanish_batch(sentences):
+    if not sentences:
+        return np.zeros(0, dtype=bool)
+    return spanish_scores(sentences) > SPANISH_THRESHOLD
+
+
+def is_spanish(sentence):
+    return bool(is_spanish_batch([sentence])[0])
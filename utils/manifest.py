@@ -0,0 +1,126 @@
+# Content-hashed build manifests for incremental rebuilds
+# Each stage records, per input key, a fingerprint of its input files and parameters;
+# unchanged inputs whose outputs still exist are reused instead of rebuilt.
+
+import os
+import re
+import json
+import hashlib
+from collections import defaultdict
+
+MANIFEST_DIR = 'data/manifests'
+
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_params(params):
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fingerprint(files, params=None):
+    """Combined hash of the content of `files` (order-independent) and the stage parameters."""
+    digest = hashlib.sha256(hash_params(params or {}).encode('ascii'))
+    for path in sorted(files, key=os.path.basename):
+        digest.update(os.path.basename(path).encode('utf-8'))
+        digest.update(hash_file(path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def group_files_by_year(paths):
+    """Map year (from the filename) to the sorted list of files of that year."""
+    years = defaultdict(list)
+    for path in sorted(paths):
+        match = re.search(r'(\d{4})', os.path.basename(path))
+        if match:
+            years[match.group(1)].append(path)
+    return dict(years)
+
+
+def manifest_path(stage, manifest_dir=MANIFEST_DIR):
+    return os.path.join(manifest_dir, f'{stage}.json')
+
+
+def load_manifest(stage, manifest_dir=MANIFEST_DIR):
+    path = manifest_path(stage, manifest_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(stage, manifest, manifest_dir=MANIFEST_DIR):
+    """Write the manifest atomically so an interrupted run never leaves it half-written."""
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = manifest_path(stage, manifest_dir)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(manifest, key, key_fingerprint, outputs):
+    entry = manifest.get(key)
+    return (
+        entry is not None
+        and entry['fingerprint'] == key_fingerprint
+        and all(os.path.exists(output) for output in outputs)
+    )
+
+
+def record_build(manifest, key, key_fingerprint, outputs):
+    manifest[key] = {'fingerprint': key_fingerprint, 'outputs': list(outputs)}
+
+
+def partition_stale(manifest, fingerprints, outputs_for, force=False):
+    """Split keys into (stale, reused) given {key: fingerprint} and a key -> outputs function."""
+    stale, reused = [], []
+    for key, key_fingerprint in fingerprints.items():
+        if not force and is_up_to_date(manifest, key, key_fingerprint, outputs_for(key)):
+            reused.append(key)
+        else:
+            stale.append(key)
+    return stale, reused
+
+
+def prune_missing(manifest, keys, delete_outputs=True):
+    """Drop entries whose inputs no longer exist, deleting their own outputs; returns the removed keys.
+
+    Stages whose keys share one output file (e.g. per-year rows of a CSV) pass
+    `delete_outputs=False` and drop the rows themselves.
+    """
+    removed = [key for key in manifest if key not in keys]
+    for key in removed:
+        outputs = manifest.pop(key)['outputs']
+        for output in outputs if delete_outputs else []:
+            if os.path.isfile(output):
+                os.remove(output)
+    return removed
+
+
+def load_reused_rows(csv_path, years, year_column='year', index_col=None):
+    """Rows of a previously written per-year CSV whose year is in `years` (empty if none)."""
+    import pandas as pd
+
+    if not years or not os.path.exists(csv_path):
+        return pd.DataFrame()
+    if index_col is not None:
+        df = pd.read_csv(csv_path, index_col=index_col, float_precision='round_trip')
+        df.index = df.index.astype(str)
+        return df[df.index.isin(years)]
+    df = pd.read_csv(csv_path, dtype={year_column: str}, float_precision='round_trip')
+    return df[df[year_column].isin(years)]
+
+
+def print_build_report(stage, reused, rebuilt, removed=()):
+    print(f"[{stage}] reused {len(reused)}, rebuilt {len(rebuilt)}, removed {len(removed)}")
+    for key in sorted(rebuilt):
+        print(f"  rebuilt: {key}")
+    for key in sorted(removed):
+        print(f"  removed: {key}")
@@ -1,22 +1,28 @@
 # Adds structured metadata to preprocessed JSON documents in NLP pipeline
+# Every document's metadata is one row of a shared index (metadata.jsonl, mirrored to
+# metadata.parquet for queries); verbs are counted from annotated sentences batch by batch.
 
 import os
 import json
 import re
 from collections import Counter
-from datetime import datetime
-from glob import glob
+from itertools import chain
 from tqdm import tqdm
-import stanza
 
-# Initialize Stanza pipeline for POS tagging
-stanza.download('es')
-nlp = stanza.Pipeline(lang='es', processors='tokenize,pos,lemma', tokenize_no_ssplit=True)
+from preprocessing import load_preprocessed, preprocessed_files
+from annotation import annotation_path, iter_annotation_batches, load_annotations
+from instrumentation import measure
+from manifest import (
+    fingerprint, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
 
 # Define indicator keywords (lowercase for comparison)
 GDP_KEYWORDS = ["pib", "producto interno bruto", "crecimiento económico"]
 INFLATION_KEYWORDS = ["inflación", "ipc", "precios al consumidor"]
 
+INDEX_JSONL = "metadata.jsonl"
+INDEX_PARQUET = "metadata.parquet"
+
 # Custom mapping from month range in filename to quarters
 date_quarter_map = {
     "enero-marzo": ("Q1", "01"),
@@ -48,21 +54,31 @@ def tag_indicators(text_sections):
     return list(tags)
 
 
-def get_top_verbs(text):
-    """Extract the top 10 most frequent verbs using Stanza POS tagging."""
-    doc = nlp(text)
-    verbs = [word.lemma.lower() for sent in doc.sentences for word in sent.words if word.upos == 'VERB']
-    top_verbs = [verb for verb, _ in Counter(verbs).most_common(10)]
+def count_verbs(annotated_sentences, counts=None):
+    """Add the VERB lemmas of annotated records to `counts`, once per entry referencing each record.
+
+    `annotated_sentences` can be any iterable of records, e.g. batches streamed from Stanza.
+    """
+    counts = Counter() if counts is None else counts
+    for record in annotated_sentences:
+        weight = len(record["refs"])
+        for lemma, upos in zip(record["lemmas"], record["upos"]):
+            if upos == 'VERB' and lemma:
+                counts[lemma] += weight
+    return counts
+
+
+def get_top_verbs(annotated_sentences):
+    """Extract the top 10 most frequent verbs from the annotated sentences (see annotation.py)."""
+    top_verbs = [verb for verb, _ in count_verbs(annotated_sentences).most_common(10)]
     return top_verbs
 
 
-def get_stats(text_data):
+def get_stats(text_data, annotated_sentences):
     """Calculate token/section stats and top frequent verbs"""
     total_tokens = 0
     total_sentences = 0
-    all_tokens = []
     active_sections = []
-    full_text = []
 
     for key, entries in text_data.items():
         if entries:
@@ -71,11 +87,8 @@ def get_stats(text_data):
                 tokens = entry.split()
                 total_tokens += len(tokens)
                 total_sentences += 1
-                all_tokens.extend(tokens)
-                full_text.append(entry)
 
-    joined_text = ' '.join(full_text)
-    top_verbs = get_top_verbs(joined_text)
+    top_verbs = get_top_verbs(annotated_sentences)
 
     return {
         "num_tokens": total_tokens,
@@ -86,18 +99,24 @@ def get_stats(text_data):
     }
 
 
-def enrich_metadata(json_input_path, metadata_output_path, source_name="Banxico"):
+def enrich_metadata(json_input_path, annotated_dir, source_name="Banxico"):
+    """Metadata record of one preprocessed document."""
     filename = os.path.basename(json_input_path)
     document_id = os.path.splitext(filename)[0].replace("preprocessed_", "")
 
-    with open(json_input_path, 'r', encoding='utf-8') as f:
-        text_data = json.load(f)
+    text_data = load_preprocessed(json_input_path)
+
+    # Reuse the shared annotation store; documents that were not annotated yet are parsed
+    # in bounded batches whose verbs are counted as they arrive
+    annotated_sentences = load_annotations(annotated_dir, document_id)
+    if annotated_sentences is None:
+        annotated_sentences = chain.from_iterable(iter_annotation_batches(text_data))
 
     date_str, quarter = extract_date_from_filename(filename)
     indicators = tag_indicators(text_data.values())
-    stats = get_stats(text_data)
+    stats = get_stats(text_data, annotated_sentences)
 
-    metadata = {
+    return {
         "document_id": document_id,
         "filename": filename,
         "date": date_str,
@@ -108,21 +127,71 @@ def enrich_metadata(json_input_path, metadata_output_path, source_name="Banxico"
         **stats
     }
 
-    with open(metadata_output_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
 
+def load_metadata_records(metadata_dir):
+    """{filename: metadata record} of the JSONL index, or {} if it was not built yet."""
+    path = os.path.join(metadata_dir, INDEX_JSONL)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return {record["filename"]: record for record in records}
 
-def run_metadata_enrichment(preprocessed_dir, metadata_dir):
+
+def save_metadata_index(records, metadata_dir):
+    """Write the records, sorted by filename, to the JSONL index and its Parquet mirror atomically."""
     os.makedirs(metadata_dir, exist_ok=True)
-    preprocessed_files = glob(os.path.join(preprocessed_dir, 'preprocessed_*.json'))
+    rows = [records[filename] for filename in sorted(records)]
+    jsonl_path = os.path.join(metadata_dir, INDEX_JSONL)
+    with open(f'{jsonl_path}.tmp', 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+    os.replace(f'{jsonl_path}.tmp', jsonl_path)
+
+    import pandas as pd  # only needed here; corpus_store imports this module for its date helper
+    parquet_path = os.path.join(metadata_dir, INDEX_PARQUET)
+    pd.DataFrame(rows).to_parquet(f'{parquet_path}.tmp', index=False)
+    os.replace(f'{parquet_path}.tmp', parquet_path)
+
 
-    for file in tqdm(preprocessed_files, desc="Enriching Metadata"):
-        filename = os.path.basename(file).replace(".json", "_metadata.json")
-        output_path = os.path.join(metadata_dir, filename)
-        enrich_metadata(file, output_path)
+def load_metadata_index(metadata_dir):
+    """The metadata of every document as a DataFrame (one row per document)."""
+    import pandas as pd
+    return pd.read_parquet(os.path.join(metadata_dir, INDEX_PARQUET))
+
+
+def run_metadata_enrichment(preprocessed_dir, metadata_dir, annotated_dir, force=False):
+    os.makedirs(metadata_dir, exist_ok=True)
+    input_files = {os.path.basename(path): path for path in preprocessed_files(preprocessed_dir)}
+    index_paths = [os.path.join(metadata_dir, INDEX_JSONL), os.path.join(metadata_dir, INDEX_PARQUET)]
+
+    def input_files_for(filename):
+        document_id = os.path.splitext(filename)[0].replace("preprocessed_", "")
+        annotated_path = annotation_path(annotated_dir, document_id)
+        return [input_files[filename]] + ([annotated_path] if os.path.exists(annotated_path) else [])
+
+    params = {'gdp_keywords': GDP_KEYWORDS, 'inflation_keywords': INFLATION_KEYWORDS, 'quarters': date_quarter_map}
+    manifest = load_manifest('metadata')
+    fingerprints = {filename: fingerprint(input_files_for(filename), params) for filename in input_files}
+    stale, reused = partition_stale(manifest, fingerprints, lambda filename: index_paths, force)
+    removed = prune_missing(manifest, input_files, delete_outputs=False)
+
+    if stale or removed:
+        records = {filename: record for filename, record in load_metadata_records(metadata_dir).items()
+                   if filename in reused}
+        for filename in tqdm(stale, desc="Enriching Metadata"):
+            with measure('metadata', items=1):
+                records[filename] = enrich_metadata(input_files[filename], annotated_dir)
+        save_metadata_index(records, metadata_dir)
+        for filename in stale:
+            record_build(manifest, filename, fingerprints[filename], index_paths)
+
+    save_manifest('metadata', manifest)
+    print_build_report('metadata', reused, stale, removed)
 
 
 if __name__ == "__main__":
     PREPROCESSED_DIR = "data/preprocessed"
+    ANNOTATED_DIR = "data/annotated"
     METADATA_DIR = "data/metadata"
-    run_metadata_enrichment(PREPROCESSED_DIR, METADATA_DIR)
\ No newline at end of file
+    run_metadata_enrichment(PREPROCESSED_DIR, METADATA_DIR, ANNOTATED_DIR)
\ No newline at end of file
@@ -0,0 +1,126 @@
+# Nearest-neighbour queries over the aligned per-period embeddings of temporal_word2vec.py
+# Each period's unit-normalized vectors are memory-mapped once; a batch of query terms is answered
+# with one matrix product per block of the vocabulary, keeping a running top-k, and answers are memoized.
+# Usage: python utils/neighbors.py inflación --period 2017 --period 2022 --k 20
+
+import os
+import argparse
+from glob import glob
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+from temporal_word2vec import load_vectors, model_path
+
+OUTPUT_DIR = "data/features/embeddings/temporal"
+# Vocabulary rows scored per matrix product; bounds the similarity block to queries × BLOCK_SIZE
+BLOCK_SIZE = 8192
+# Memoized (term, k) answers kept before the cache is reset
+CACHE_SIZE = 100_000
+
+_neighbor_cache = {}
+
+
+def available_periods(level='year', output_dir=OUTPUT_DIR):
+    suffix = '.aligned.kv'
+    paths = glob(os.path.join(output_dir, level, f'*{suffix}'))
+    return sorted(os.path.basename(path)[:-len(suffix)] for path in paths)
+
+
+@lru_cache(maxsize=None)
+def period_vectors(period, level='year', output_dir=OUTPUT_DIR):
+    """Memory-mapped aligned KeyedVectors of one period (rows are already unit-normalized)."""
+    path = model_path(os.path.join(output_dir, level), period, aligned=True)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No aligned model for {period} in {os.path.dirname(path)}; "
+                                f"run temporal_word2vec.py --level {level} first")
+    return load_vectors(path)
+
+
+def blocked_top_k(queries, vectors, k, exclude=None, block_size=BLOCK_SIZE):
+    """(indices, scores) of the k rows of `vectors` with the largest dot product per query, best first.
+
+    `vectors` is scanned in blocks of rows and only a running top-k is kept, so memory is bounded by
+    len(queries) × (k + block_size). `exclude` gives one row per query to leave out (-1 for none).
+    k is capped at the number of rows that can be returned (len(vectors) - 1 with `exclude`).
+    """
+    if k < 1:
+        raise ValueError(f"k must be a positive number of neighbours, got {k}")
+    k = min(k, len(vectors) - (exclude is not None))
+    num_queries = len(queries)
+    best_indices = np.zeros((num_queries, 0), dtype=np.int64)
+    best_scores = np.zeros((num_queries, 0), dtype=np.float32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size])
+        scores = queries @ block.T
+        indices = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+        if exclude is not None:
+            scores = np.where(indices == np.asarray(exclude)[:, None], -np.inf, scores)
+        best_scores = np.hstack([best_scores, scores])
+        best_indices = np.hstack([best_indices, indices])
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_indices = np.take_along_axis(best_indices, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def nearest_terms(terms, period, level='year', k=20, output_dir=OUTPUT_DIR):
+    """{term: [(neighbour, cosine similarity), ...]} of the k nearest terms in one period.
+
+    Terms missing from the period's vocabulary get an empty list. Terms not answered before are
+    queried together in one blocked matrix product.
+    """
+    keyed_vectors = period_vectors(period, level, output_dir)
+    missing = [term for term in dict.fromkeys(terms)
+               if (output_dir, level, period, term, k) not in _neighbor_cache]
+    known = [term for term in missing if term in keyed_vectors.key_to_index]
+    if missing:
+        if len(_neighbor_cache) + len(missing) > CACHE_SIZE:
+            _neighbor_cache.clear()
+        results = {term: [] for term in missing}
+        if known:
+            rows = np.array([keyed_vectors.key_to_index[term] for term in known])
+            indices, scores = blocked_top_k(np.asarray(keyed_vectors.vectors[rows]), keyed_vectors.vectors,
+                                            k, exclude=rows)
+            for term, term_indices, term_scores in zip(known, indices, scores):
+                results[term] = [(keyed_vectors.index_to_key[i], float(score))
+                                 for i, score in zip(term_indices, term_scores) if np.isfinite(score)]
+        _neighbor_cache.update({(output_dir, level, period, term, k): result for term, result in results.items()})
+    return {term: _neighbor_cache[(output_dir, level, period, term, k)] for term in terms}
+
+
+def compare_neighbors(terms, periods=None, level='year', k=20, output_dir=OUTPUT_DIR):
+    """Long DataFrame (term, period, rank, neighbor, similarity) of each term's neighbours per period."""
+    records = []
+    for period in periods or available_periods(level, output_dir):
+        for term, neighbors in nearest_terms(terms, period, level, k, output_dir).items():
+            for rank, (neighbor, similarity) in enumerate(neighbors, start=1):
+                records.append({'term': term, 'period': period, 'rank': rank,
+                                'neighbor': neighbor, 'similarity': similarity})
+    return pd.DataFrame(records, columns=['term', 'period', 'rank', 'neighbor', 'similarity'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Nearest terms per period in the aligned temporal embeddings.')
+    parser.add_argument('terms', nargs='+', help='Query terms')
+    parser.add_argument('--period', action='append', default=None, help='Period to query (repeatable; default: all)')
+    parser.add_argument('--level', choices=['year', 'quarter'], default='year')
+    parser.add_argument('--k', type=int, default=20, help='Neighbours per term and period')
+    parser.add_argument('--output', default=None, help='Also save the neighbours to this CSV')
+    args = parser.parse_args()
+    if args.k < 1:
+        parser.error('--k must be at least 1')
+
+    df = compare_neighbors(args.terms, args.period, args.level, args.k)
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Neighbours saved to {args.output}")
+    unknown = [term for term in args.terms if term not in set(df['term'])]
+    if unknown:
+        print(f"Not in the vocabulary of any queried period: {', '.join(unknown)}")
+    for term, group in df.groupby('term', sort=False):
+        table = group.assign(neighbor=group['neighbor'] + group['similarity'].map(' ({:.2f})'.format))
+        print(f"\n{term}")
+        print(table.pivot(index='rank', columns='period', values='neighbor').fillna('').to_string())
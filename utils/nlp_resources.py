@@ -0,0 +1,59 @@
+# Lazy, memoized loading of Stanza pipelines and NLTK stopwords
+# Nothing is downloaded or loaded at import time. Set NLP_OFFLINE=1 to only use locally
+# cached resources (STANZA_RESOURCES_DIR / NLTK_DATA), e.g. on air-gapped workers.
+
+import os
+from functools import lru_cache
+
+OFFLINE = os.environ.get('NLP_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+# Canonical Stanza processor order, so 'lemma,tokenize' and 'tokenize,lemma' share one pipeline
+PROCESSOR_ORDER = ['tokenize', 'mwt', 'pos', 'lemma', 'depparse', 'ner', 'sentiment', 'constituency']
+
+
+def is_offline(offline=None):
+    return OFFLINE if offline is None else offline
+
+
+def normalize_processors(processors):
+    names = {name.strip() for name in processors.split(',') if name.strip()}
+    return ','.join(sorted(names, key=lambda name: (PROCESSOR_ORDER + [name]).index(name)))
+
+
+@lru_cache(maxsize=None)
+def _load_pipeline(lang, processors, offline, options):
+    import stanza
+
+    # REUSE_RESOURCES only touches the network for models missing from the local cache
+    download_method = None if offline else stanza.DownloadMethod.REUSE_RESOURCES
+    return stanza.Pipeline(lang=lang, processors=processors, download_method=download_method, **dict(options))
+
+
+def get_pipeline(processors, lang='es', offline=None, **options):
+    """Return the shared Stanza pipeline for this processor set and options, building it on first use."""
+    return _load_pipeline(lang, normalize_processors(processors), is_offline(offline), tuple(sorted(options.items())))
+
+
+@lru_cache(maxsize=None)
+def get_stopwords(language='spanish', offline=None):
+    """Return the NLTK stopword set, downloading the corpus first only when online and missing."""
+    from nltk.corpus import stopwords
+
+    try:
+        return frozenset(stopwords.words(language))
+    except LookupError:
+        if is_offline(offline):
+            raise
+        import nltk
+        nltk.download('stopwords', quiet=True)
+        return frozenset(stopwords.words(language))
+
+
+def available_offline(processors, lang='es', language='spanish', **options):
+    """Whether the Stanza pipeline and NLTK stopwords load from the local caches alone, without any download."""
+    try:
+        get_stopwords(language, offline=True)
+        get_pipeline(processors, lang, offline=True, **options)
+    except Exception:  # package, model or corpus missing from this machine
+        return False
+    return True
@@ -0,0 +1,123 @@
+# PDF text extraction backends used by extract_corpus.py
+# Each backend returns one text per page. Pages are read whole or split into two columns at the
+# gutter found by column_split() from the x positions of their words ('auto' layout), or by the
+# old rule of single column for 2015–2017 reports and a midline split afterwards ('year' layout).
+# pdfplumber with the year rule stays the default so the extracted corpus does not change; PyMuPDF
+# and 'auto' are opt-in (compare them with `benchmarks.py extract-backends`).
+
+import os
+import re
+import warnings
+import numpy as np
+
+PDF_BACKEND = 'pdfplumber'
+LAYOUT = 'year'
+LAYOUTS = ['auto', 'year']
+
+# Column detection: the gutter is searched in the middle of the page, must be wider than the gaps
+# between words, may be crossed by a few full-width lines (titles, footers) and must leave a fair
+# share of the words on each side
+GUTTER_BAND = (0.3, 0.7)
+GUTTER_CANDIDATES = 81
+MIN_GUTTER_WIDTH = 0.015
+MAX_GUTTER_CROSSINGS = 0.05
+MIN_COLUMN_SHARE = 0.2
+MIN_PAGE_WORDS = 20
+
+# Suppress CropBox warnings
+warnings.filterwarnings("ignore", message="CropBox missing from /Page.*")
+
+
+def two_column_by_year(path):
+    """Old layout rule: single column for the 2015–2017 reports, two columns from 2018 onward."""
+    base = os.path.splitext(os.path.basename(path))[0]
+    year_match = re.search(r"(20\d{2})", base)
+    year = int(year_match.group(1)) if year_match else None
+    return False if year and 2015 <= year <= 2017 else True
+
+
+def column_split(spans, width):
+    """x of the gutter between two text columns, or None for a single-column page.
+
+    `spans` are the (x0, x1, top) positions of the page's words. They cluster into a left and a
+    right column when a band in the middle of the page is crossed by (almost) no line of text.
+    """
+    if len(spans) < MIN_PAGE_WORDS:
+        return None
+    spans = np.asarray(spans, dtype=np.float64)
+    x0, x1 = spans[:, :1], spans[:, 1:2]
+    num_lines = len(np.unique(spans[:, 2].round()))
+    candidates = np.linspace(GUTTER_BAND[0] * width, GUTTER_BAND[1] * width, GUTTER_CANDIDATES)
+    # Words of a line never overlap, so the words crossing a candidate are the lines crossing it
+    crossings = ((x0 < candidates) & (x1 > candidates)).sum(axis=0)
+    sides = np.minimum((x1 <= candidates).sum(axis=0), (x0 >= candidates).sum(axis=0))
+    gutter = (crossings <= MAX_GUTTER_CROSSINGS * num_lines) & (sides >= MIN_COLUMN_SHARE * len(spans))
+
+    # Widest run of gutter candidates; narrower runs are gaps between words that happen to line up
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], gutter.astype(np.int8), [0]])))
+    if not len(edges):
+        return None
+    starts, ends = edges[::2], edges[1::2]
+    widest = np.argmax(ends - starts)
+    step = candidates[1] - candidates[0]
+    if (ends[widest] - starts[widest]) * step < MIN_GUTTER_WIDTH * width:
+        return None
+    return float(candidates[(starts[widest] + ends[widest] - 1) // 2])
+
+
+def page_split(width, word_spans, layout=LAYOUT, two_column=True):
+    """Where to split a page into columns (None reads it whole); `word_spans` is only called for 'auto'."""
+    if layout == 'year':
+        return width / 2 if two_column else None
+    return column_split(word_spans(), width)
+
+
+def pymupdf_text(page, clip=None):
+    """Text blocks of `page` (within `clip`) top to bottom; PyMuPDF's own sort=True is far slower."""
+    blocks = page.get_text('blocks', clip=clip)
+    return ''.join(block[4] for block in sorted(blocks, key=lambda block: (block[1], block[0])) if block[6] == 0)
+
+
+def pymupdf_pages(path, layout=LAYOUT, two_column=True):
+    import pymupdf
+
+    texts = []
+    with pymupdf.open(path) as doc:
+        for page in doc:
+            rect = page.rect
+            split = page_split(rect.width, lambda: [(w[0], w[2], w[1]) for w in page.get_text('words')], layout, two_column)
+            if split is None:
+                texts.append(pymupdf_text(page))
+            else:
+                left = pymupdf_text(page, pymupdf.Rect(rect.x0, rect.y0, rect.x0 + split, rect.y1))
+                right = pymupdf_text(page, pymupdf.Rect(rect.x0 + split, rect.y0, rect.x1, rect.y1))
+                texts.append(f"{left}\n{right}")
+    return texts
+
+
+def pdfplumber_pages(path, layout=LAYOUT, two_column=True):
+    import pdfplumber
+
+    texts = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            w, h = page.width, page.height
+            split = page_split(w, lambda: [(word['x0'], word['x1'], word['top']) for word in page.extract_words()], layout, two_column)
+            if split is None:
+                texts.append(page.extract_text() or '')
+            else:
+                left = page.within_bbox((0, 0, split, h)).extract_text() or ''
+                right = page.within_bbox((split, 0, w, h)).extract_text() or ''
+                texts.append(f"{left}\n{right}")
+    return texts
+
+
+BACKENDS = {
+    'pymupdf': pymupdf_pages,
+    'pdfplumber': pdfplumber_pages
+}
+
+
+def extract_pages(path, backend=PDF_BACKEND, layout=LAYOUT):
+    """Text of every page of the PDF at `path`, read with `backend` in `layout`."""
+    return BACKENDS[backend](path, layout, two_column_by_year(path))
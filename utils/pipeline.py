@@ -0,0 +1,266 @@
+# Run the pipeline stages as a DAG
+# Each stage declares the paths it reads and writes; a stage depends on every stage writing one of
+# its inputs. Independent stages run side by side in their own processes. A stage that finished is
+# recorded in the 'pipeline' manifest with a signature of its inputs, so a rerun after a failure
+# resumes from the first stage whose inputs changed or that did not finish. Every run writes a JSON
+# report with the per-step timings of each stage (see instrumentation.py) to data/reports/<run>/.
+# Explicit stages (the scraper, which downloads from Banxico) only run when named with --only or --until.
+# Usage: python utils/pipeline.py [--until tfidf] [--only clarity] [--jobs 4] [--profile tfidf]
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from manifest import hash_params, load_manifest, save_manifest, is_up_to_date, record_build, print_build_report
+from instrumentation import REPORT_ENV
+
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = 'data/reports'
+PROFILERS = {
+    'cprofile': lambda output: ['-m', 'cProfile', '-o', f'{output}.prof'],
+    'pyinstrument': lambda output: ['-m', 'pyinstrument', '--renderer', 'html', '--outfile', f'{output}.html']
+}
+
+STAGES = {
+    'scrape': {'script': 'scrape_banxico.py', 'args': ['--save-dir', 'data/raw'],
+               'inputs': [], 'outputs': ['data/raw'], 'explicit': True},
+    'extract': {'script': 'extract_corpus.py', 'inputs': ['data/raw'], 'outputs': ['data/extracted']},
+    'preprocess': {'script': 'preprocessing.py', 'inputs': ['data/extracted'], 'outputs': ['data/preprocessed']},
+    'annotate': {'script': 'annotation.py', 'inputs': ['data/preprocessed'], 'outputs': ['data/annotated']},
+    'corpus': {'script': 'corpus_store.py', 'inputs': ['data/preprocessed', 'data/annotated'],
+               'outputs': ['data/corpus']},
+    'metadata': {'script': 'metada.py', 'inputs': ['data/preprocessed', 'data/annotated'],
+                 'outputs': ['data/metadata']},
+    'tfidf': {'script': 'tfidf.py', 'inputs': ['data/corpus'], 'outputs': ['data/features/tfidf']},
+    'sentiment': {'script': 'sentiment_heuristics.py', 'inputs': ['data/corpus'],
+                  'outputs': ['data/features/sentiment']},
+    'clarity': {'script': 'clarity_metrics.py', 'inputs': ['data/corpus'], 'outputs': ['data/features/clarity']},
+    'word2vec': {'script': 'word2vec.py', 'inputs': ['data/corpus'],
+                 'outputs': ['data/features/embeddings/word2vec.model',
+                             'data/features/embeddings/embeddings_gdp.csv',
+                             'data/features/embeddings/embeddings_inflation.csv']},
+    'temporal_word2vec': {'script': 'temporal_word2vec.py', 'inputs': ['data/corpus'],
+                          'outputs': ['data/features/embeddings/temporal']},
+    'visualizations': {'script': 'visualizations.py',
+                       'inputs': ['data/features/tfidf', 'data/features/embeddings/embeddings_gdp.csv',
+                                  'data/features/embeddings/embeddings_inflation.csv',
+                                  'data/features/clarity', 'data/features/sentiment'],
+                       'outputs': ['figures']},
+    'eda': {'script': 'eda_analysis.py', 'inputs': ['data/features/tfidf'], 'outputs': ['figures/eda']}
+}
+
+
+def _overlaps(path, other):
+    path, other = os.path.normpath(path), os.path.normpath(other)
+    return path == other or path.startswith(other + os.sep) or other.startswith(path + os.sep)
+
+
+def stage_dependencies(stages=STAGES):
+    """{stage: [stages writing one of its inputs]}; raises ValueError if the graph has a cycle."""
+    dependencies = {
+        name: [other for other, spec in stages.items() if other != name and any(
+            _overlaps(path, output) for path in stages[name]['inputs'] for output in spec['outputs'])]
+        for name in stages
+    }
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in visiting:
+            raise ValueError(f"Pipeline stages form a cycle through '{name}'")
+        if name not in done:
+            visiting.add(name)
+            for dependency in dependencies[name]:
+                visit(dependency)
+            visiting.remove(name)
+            done.add(name)
+
+    for name in stages:
+        visit(name)
+    return dependencies
+
+
+def select_stages(dependencies, only=None, until=None, stages=STAGES):
+    """Stages to run: `only` exactly, or `until` and everything upstream of it, or all.
+
+    Explicit stages are left out unless they are named in `only` or `until` themselves.
+    """
+    if only:
+        return [name for name in dependencies if name in set(only)]
+    named = set(until or [])
+    pending = list(until or dependencies)
+    selected = set()
+    while pending:
+        name = pending.pop()
+        if name not in selected and (name in named or not stages[name].get('explicit')):
+            selected.add(name)
+            pending.extend(dependencies[name])
+    return [name for name in dependencies if name in selected]
+
+
+def input_signature(paths):
+    """Cheap signature of every file under `paths` (relative path, size, mtime); the stages
+    themselves compare file contents through their own manifests."""
+    entries = []
+    for path in paths:
+        files = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, filename) for root, _, filenames in os.walk(path) for filename in filenames
+        )
+        for file_path in files:
+            stat = os.stat(file_path)
+            entries.append([file_path, stat.st_size, stat.st_mtime_ns])
+    return entries
+
+
+def stage_fingerprint(name, stages=STAGES):
+    spec = stages[name]
+    return hash_params({'script': spec['script'], 'args': spec.get('args', []),
+                        'inputs': input_signature(spec['inputs'])})
+
+
+def run_stage(name, stages=STAGES, report_dir=None, profiler=None):
+    """Run one stage script in its own process; returns (returncode, seconds, combined output).
+
+    With `report_dir` the stage writes its step report to <report_dir>/<name>.json; with
+    `profiler` (a PROFILERS key) it runs under that profiler, saving <report_dir>/<name>.prof/.html.
+    """
+    spec = stages[name]
+    env = dict(os.environ)
+    if report_dir:
+        env[REPORT_ENV] = os.path.join(report_dir, f'{name}.json')
+    profile = PROFILERS[profiler](os.path.join(report_dir or '.', name)) if profiler else []
+    command = [sys.executable] + profile + [os.path.join(UTILS_DIR, spec['script'])] + spec.get('args', [])
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True, env=env)
+    return result.returncode, time.perf_counter() - start, result.stdout + result.stderr
+
+
+def run_pipeline(selected, dependencies, jobs=None, force=False, stages=STAGES, report_dir=None,
+                 profile=None, profiler='cprofile'):
+    """Run the `selected` stages, each once all of its selected dependencies succeeded.
+
+    Stages whose inputs did not change since they last succeeded are skipped. After a failure,
+    the stages that do not depend on it still run; returns the failed and blocked stages.
+    With `report_dir`, a run report (run.json) collects each stage's status, wall time and step
+    report; the stage named by `profile` runs under `profiler`.
+    """
+    manifest = load_manifest('pipeline')
+    waiting = {name: [d for d in dependencies[name] if d in selected] for name in selected}
+    reused, rebuilt, failed, blocked = [], [], [], []
+    running = {}
+    timings = {}
+    started = time.time()
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        while waiting or running:
+            # Reused stages release their dependents at once, so keep scheduling until none is ready
+            while ready := [name for name, pending in waiting.items() if not pending]:
+                name = ready[0]
+                del waiting[name]
+                key_fingerprint = stage_fingerprint(name, stages)
+                # Stages without declared inputs (the scraper) always run; they resume on their own
+                if (not force and stages[name]['inputs']
+                        and is_up_to_date(manifest, name, key_fingerprint, stages[name]['outputs'])):
+                    reused.append(name)
+                    _finish(name, waiting)
+                    continue
+                print(f"→ {name}")
+                stage_profiler = profiler if name == profile else None
+                running[pool.submit(run_stage, name, stages, report_dir, stage_profiler)] = (name, key_fingerprint)
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key_fingerprint = running.pop(future)
+                returncode, seconds, output = future.result()
+                timings[name] = {'returncode': returncode, 'wall_seconds': round(seconds, 3)}
+                if returncode == 0:
+                    print(f"✓ {name} ({seconds:.1f}s)")
+                    record_build(manifest, name, key_fingerprint, stages[name]['outputs'])
+                    save_manifest('pipeline', manifest)
+                    rebuilt.append(name)
+                    _finish(name, waiting)
+                else:
+                    print(f"✗ {name} failed with exit code {returncode} ({seconds:.1f}s):\n{output.rstrip()}")
+                    manifest.pop(name, None)
+                    save_manifest('pipeline', manifest)
+                    failed.append(name)
+                    blocked.extend(_block(name, waiting))
+
+    print_build_report('pipeline', reused, rebuilt, [])
+    if report_dir:
+        status = {**{name: 'reused' for name in reused}, **{name: 'rebuilt' for name in rebuilt},
+                  **{name: 'failed' for name in failed}, **{name: 'blocked' for name in blocked}}
+        write_run_report(report_dir, selected, status, timings, started, jobs)
+    return failed, blocked
+
+
+def write_run_report(report_dir, selected, status, timings, started, jobs=None):
+    """Merge the stages' step reports into <report_dir>/run.json."""
+    stages = {}
+    for name in selected:
+        stage_report_path = os.path.join(report_dir, f'{name}.json')
+        stage_report = None
+        if os.path.exists(stage_report_path):
+            with open(stage_report_path, 'r', encoding='utf-8') as f:
+                stage_report = json.load(f)
+        stages[name] = {'status': status.get(name), **timings.get(name, {}), 'report': stage_report}
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        'wall_seconds': round(time.time() - started, 3),
+        'jobs': jobs or os.cpu_count(),
+        'stages': stages
+    }
+    with open(os.path.join(report_dir, 'run.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Run report saved to {os.path.join(report_dir, 'run.json')}")
+
+
+def _finish(name, waiting):
+    for pending in waiting.values():
+        if name in pending:
+            pending.remove(name)
+
+
+def _block(name, waiting):
+    """Drop every waiting stage downstream of `name`; returns them."""
+    blocked = [other for other, pending in waiting.items() if name in pending]
+    for other in blocked:
+        del waiting[other]
+    return blocked + [downstream for other in blocked for downstream in _block(other, waiting)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the pipeline stages, independent ones in parallel.')
+    parser.add_argument('--only', action='append', choices=list(STAGES), default=None,
+                        help='Run only this stage, without its dependencies (repeatable)')
+    parser.add_argument('--until', action='append', choices=list(STAGES), default=None,
+                        help='Run this stage and everything it depends on (repeatable)')
+    parser.add_argument('--jobs', type=int, default=None, help='Stages run at once (default: all CPUs)')
+    parser.add_argument('--force', action='store_true', help='Run every selected stage even if its inputs did not change')
+    parser.add_argument('--profile', choices=list(STAGES), default=None, help='Run this stage under a profiler')
+    parser.add_argument('--profiler', choices=list(PROFILERS), default='cprofile',
+                        help='Profiler for --profile (pyinstrument must be installed)')
+    parser.add_argument('--list', action='store_true', help='Print the stages and their dependencies, then exit')
+    args = parser.parse_args()
+
+    dependencies = stage_dependencies()
+    selected = select_stages(dependencies, args.only, args.until)
+    if args.list:
+        for name in selected:
+            print(f"{name:<18} ← {', '.join(dependencies[name]) or '-'}")
+        sys.exit(0)
+
+    report_dir = os.path.join(REPORT_DIR, time.strftime('%Y%m%d-%H%M%S'))
+    failed, blocked = run_pipeline(selected, dependencies, args.jobs, args.force, report_dir=report_dir,
+                                   profile=args.profile, profiler=args.profiler)
+    if failed:
+        print(f"Failed: {', '.join(failed)}" + (f"; not run: {', '.join(blocked)}" if blocked else ''))
+        print("Rerun the same command to resume from the failed stages.")
+        sys.exit(1)
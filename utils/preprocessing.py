@@ -1,60 +1,78 @@
 import os
 import json
 import re
-import stanza
+import argparse
 import ftfy
-from nltk.corpus import stopwords
-from nltk import download
-from langdetect import detect
+from ftfy.badness import is_bad
 from pathlib import Path
 from glob import glob
+from itertools import islice
+from collections import defaultdict
 from tqdm import tqdm
 
-# Download resources
-download('stopwords')
-stanza.download('es')  # Run only once
+from manifest import (
+    fingerprint, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
+from nlp_resources import get_pipeline, get_stopwords
+from instrumentation import count, measure
+from language_filter import is_spanish, is_spanish_batch
 
-# Load Spanish stopwords and initialize Stanza NLP pipeline
-stop_words = set(stopwords.words('spanish'))
-nlp = stanza.Pipeline(lang='es', processors='tokenize,mwt,lemma', tokenize_no_ssplit=True)
+# Spanish stopwords and the Stanza pipeline are loaded on first use (see nlp_resources.py)
+PREPROCESS_PROCESSORS = 'tokenize,mwt,lemma'
+
+def get_nlp():
+    return get_pipeline(PREPROCESS_PROCESSORS, tokenize_no_ssplit=True)
 
 # Logging rejected sentences (optional)
 REJECTED_SENTENCES = []
 
-def clean_text(text):
-    text = ftfy.fix_text(text)  # Fix broken Unicode
-    text = text.replace('\n', ' ')
-    text = re.sub(r'\s+', ' ', text)
-    text = text.lower()
+# Categories produced by extract_corpus.py
+CATEGORIES = ['gdp_prioritized', 'inflation_prioritized', 'gdp_other', 'inflation_other']
 
-    # Merge sequences of single characters (e.g., "h i p ó t e s i s" → "hipótesis")
-    def merge_split_words(t):
-        return re.sub(r'(?:\b\w\b\s*){3,}', lambda m: m.group(0).replace(' ', ''), t)
+# Number of texts sent to Stanza per call in batched mode
+LEMMA_BATCH_SIZE = 256
 
-    text = merge_split_words(text)
-    text = re.sub(r'[^a-záéíóúñü\s]', '', text)
-    return re.sub(r'\s+', ' ', text).strip()
+# Text made only of these characters is left unchanged by ftfy unless it looks like mojibake
+# (e.g. 'ÁáÉ', MacRoman-decoded UTF-8); '&' is excluded because ftfy unescapes HTML entities
+CLEAN_TEXT_RE = re.compile(r"[\t\n -%'-~áéíóúñüÁÉÍÓÚÑÜ]*")
+# Three or more single characters separated by single spaces, plus the space after them;
+# the same matches as (?:\b\w\b\s*){3,} once whitespace is collapsed, found in one linear scan
+SPLIT_WORD_RE = re.compile(r'(?<!\w)\w(?: \w\b){2,} ?')
+REMOVED_CHARS_RE = re.compile(r'[^a-záéíóúñü ]+')
 
-def is_valid_sentence(sentence):
+
+def fix_unicode(text):
+    """ftfy.fix_text, skipped for plain ASCII or Spanish Latin-1 text that ftfy would not change."""
+    if CLEAN_TEXT_RE.fullmatch(text) and (text.isascii() or not is_bad(text)):
+        return text
+    return ftfy.fix_text(text)
+
+
+def clean_text(text):
+    # Fix broken Unicode, collapse whitespace (newlines included) and lowercase
+    text = ' '.join(fix_unicode(text).split()).lower()
+    # Merge sequences of single characters (e.g., "h i p ó t e s i s" → "hipótesis")
+    text = SPLIT_WORD_RE.sub(lambda m: m.group(0).replace(' ', ''), text)
+    return ' '.join(REMOVED_CHARS_RE.sub('', text).split())
+
+def has_valid_shape(sentence):
     tokens = sentence.split()
     if len(tokens) < 3:
         return False
     short_tokens = [t for t in tokens if len(t) <= 2]
     if len(short_tokens) / len(tokens) > 0.5:
         return False
-    try:
-        if detect(sentence) != 'es':
-            return False
-    except:
-        return False
     return True
 
+def is_valid_sentence(sentence):
+    return has_valid_shape(sentence) and is_spanish(sentence)
+
 def remove_stopwords(tokens):
+    stop_words = get_stopwords()
     return [token for token in tokens if token not in stop_words]
 
-def lemmatize(tokens):
-    text = ' '.join(tokens)
-    doc = nlp(text)
+def filter_lemmas(doc):
+    stop_words = get_stopwords()
     return [
         word.lemma.lower()
         for sent in doc.sentences
@@ -62,20 +80,57 @@ def lemmatize(tokens):
         if word.lemma and word.lemma.lower() not in stop_words and word.lemma != 'PRON'
     ]
 
-def preprocess_text(text):
-    cleaned = clean_text(text)
-    sentences = re.split(r'[.!?]', cleaned)
+def lemmatize(tokens):
+    text = ' '.join(tokens)
+    with measure('lemmatize', items=1):
+        count('stanza_calls')
+        doc = get_nlp()(text)
+    return filter_lemmas(doc)
+
+def lemmatize_batch(texts, batch_size=LEMMA_BATCH_SIZE):
+    """Lemmatize a list of texts with one Stanza call per batch; output order matches input."""
+    results = [[] for _ in texts]
+    pending = [i for i, text in enumerate(texts) if text]
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        with measure('lemmatize', items=len(batch)):
+            count('stanza_calls')
+            docs = get_nlp().bulk_process([texts[i] for i in batch])
+        for i, doc in zip(batch, docs):
+            results[i] = filter_lemmas(doc)
+    return results
+
+def prepare_text(text, rejected=None):
+    """Clean, split and validate `text`; returns the stopword-free tokens to lemmatize.
+
+    Rejected sentences go to `rejected` (default: the global REJECTED_SENTENCES log).
+    """
+    rejected = REJECTED_SENTENCES if rejected is None else rejected
+    with measure('clean', items=1):
+        cleaned = clean_text(text)
+    with measure('sentence_tokenize') as step:
+        sentences = [s.strip() for s in re.split(r'[.!?]', cleaned)]
+        step['items'] = len(sentences)
+    shaped = [has_valid_shape(s) for s in sentences]
+    # Language check for all well-formed sentences at once (see language_filter.py)
+    candidates = [s for s, ok in zip(sentences, shaped) if ok]
+    with measure('langdetect', items=len(candidates)):
+        spanish = iter(is_spanish_batch(candidates))
     valid_sentences = []
-    for s in sentences:
-        s = s.strip()
-        if is_valid_sentence(s):
+    for s, ok in zip(sentences, shaped):
+        if ok and next(spanish):
             valid_sentences.append(s)
         else:
-            REJECTED_SENTENCES.append(s)
+            rejected.append(s)
     if not valid_sentences:
-        return ''
+        return []
     tokens = ' '.join(valid_sentences).split()
-    tokens_nostop = remove_stopwords(tokens)
+    return remove_stopwords(tokens)
+
+def preprocess_text(text):
+    tokens_nostop = prepare_text(text)
+    if not tokens_nostop:
+        return ''
     lemmas = lemmatize(tokens_nostop)
     return ' '.join(lemmas)
 
@@ -84,7 +139,7 @@ def preprocess_json_file(input_path, output_path):
         data = json.load(infile)
 
     processed_data = {}
-    for category in ['gdp_prioritized', 'inflation_prioritized', 'gdp_other', 'inflation_other']:
+    for category in CATEGORIES:
         processed_entries = []
         for entry in data.get(category, []):
             preprocessed_entry = preprocess_text(entry)
@@ -95,14 +150,161 @@ def preprocess_json_file(input_path, output_path):
     with open(output_path, 'w', encoding='utf-8') as outfile:
         json.dump(processed_data, outfile, ensure_ascii=False, indent=2)
 
-def run_pipeline(input_dir, output_dir):
+def preprocess_json_files_batched(file_pairs, batch_size=LEMMA_BATCH_SIZE):
+    """Preprocess several (input_path, output_path) pairs, lemmatizing all their entries in shared batches."""
+    processed = {}
+    keys, texts = [], []
+    for input_path, output_path in file_pairs:
+        with open(input_path, 'r', encoding='utf-8') as infile:
+            data = json.load(infile)
+        processed[output_path] = {category: [] for category in CATEGORIES}
+        for category in CATEGORIES:
+            for entry in data.get(category, []):
+                tokens_nostop = prepare_text(entry)
+                if tokens_nostop:
+                    keys.append((output_path, category))
+                    texts.append(' '.join(tokens_nostop))
+
+    # Results come back in input order, so each one maps to its file and category
+    for (output_path, category), lemmas in zip(keys, lemmatize_batch(texts, batch_size)):
+        if lemmas:
+            processed[output_path][category].append(' '.join(lemmas))
+
+    for output_path, processed_data in processed.items():
+        with open(output_path, 'w', encoding='utf-8') as outfile:
+            json.dump(processed_data, outfile, ensure_ascii=False, indent=2)
+
+def iter_extracted_entries(file_pairs):
+    """Yield (output_path, category, entry) for every extracted entry, reading one report at a time."""
+    for input_path, output_path in file_pairs:
+        with open(input_path, 'r', encoding='utf-8') as infile:
+            data = json.load(infile)
+        for category in CATEGORIES:
+            for entry in data.get(category, []):
+                yield output_path, category, entry
+
+def rejected_path(output_path):
+    """JSONL of the sentences rejected while preprocessing `output_path`, kept beside it in rejected/."""
+    directory, name = os.path.split(output_path)
+    return os.path.join(directory, 'rejected', f"{os.path.splitext(name)[0].removeprefix('preprocessed_')}.jsonl")
+
+def iter_prepared_entries(entries):
+    """Prepare entries lazily, appending their rejected sentences to each document's rejected_path() as JSONL."""
+    current, rejected_file = None, None
+    try:
+        for output_path, category, entry in entries:
+            if output_path != current:
+                if rejected_file:
+                    rejected_file.close()
+                current, rejected_file = output_path, open(rejected_path(output_path), 'a', encoding='utf-8')
+            rejected = []
+            tokens_nostop = prepare_text(entry, rejected)
+            document = os.path.basename(output_path)
+            for sentence in rejected:
+                record = {'document': document, 'category': category, 'sentence': sentence}
+                rejected_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if tokens_nostop:
+                yield output_path, category, ' '.join(tokens_nostop)
+    finally:
+        if rejected_file:
+            rejected_file.close()
+
+def preprocess_json_files_streaming(file_pairs, batch_size=LEMMA_BATCH_SIZE):
+    """Preprocess (input_path, output_path) pairs with bounded memory.
+
+    Entries are read lazily, lemmatized `batch_size` at a time and appended to the
+    JSONL outputs (one {"category", "text"} record per line) as soon as each batch is done.
+    Each document's rejected sentences go to its own rejected_path(), so they are rewritten
+    only when the document is.
+    """
+    file_pairs = list(file_pairs)
+    for _, output_path in file_pairs:
+        os.makedirs(os.path.dirname(rejected_path(output_path)), exist_ok=True)
+        for path in [output_path, rejected_path(output_path)]:
+            open(path, 'w', encoding='utf-8').close()
+
+    prepared = iter_prepared_entries(iter_extracted_entries(tqdm(file_pairs, desc='Preprocessing JSON files')))
+    while batch := list(islice(prepared, batch_size)):
+        lemmatized = lemmatize_batch([text for _, _, text in batch], batch_size)
+        lines = defaultdict(list)
+        for (output_path, category, _), lemmas in zip(batch, lemmatized):
+            if lemmas:
+                record = {'category': category, 'text': ' '.join(lemmas)}
+                lines[output_path].append(json.dumps(record, ensure_ascii=False))
+        for output_path, records in lines.items():
+            with open(output_path, 'a', encoding='utf-8') as outfile:
+                outfile.write('\n'.join(records) + '\n')
+
+def preprocessed_files(preprocessed_dir):
+    """Preprocessed documents in either output format (JSON, or JSONL from streaming mode)."""
+    return sorted(
+        glob(os.path.join(preprocessed_dir, 'preprocessed_*.json'))
+        + glob(os.path.join(preprocessed_dir, 'preprocessed_*.jsonl'))
+    )
+
+def load_preprocessed(path):
+    """Load a preprocessed document as {category: [texts]}, whichever format it was written in."""
+    if not path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    data = {category: [] for category in CATEGORIES}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                data[record['category']].append(record['text'])
+    return data
+
+def run_pipeline(input_dir, output_dir, batch_size=None, force=False, stream=False):
+    """Preprocess extracted JSONs whose content or parameters changed since the last run.
+
+    With `batch_size`, lemmatize across all rebuilt files in shared Stanza batches.
+    With `stream`, do so with bounded memory and write JSONL outputs and rejections.
+    """
     os.makedirs(output_dir, exist_ok=True)
-    input_files = glob(os.path.join(input_dir, '**', '*.json'), recursive=True)
+    output_format = 'jsonl' if stream else 'json'
+    input_files = {
+        os.path.relpath(path, input_dir): path
+        for path in sorted(glob(os.path.join(input_dir, '**', '*.json'), recursive=True))
+    }
+    output_for = {
+        key: os.path.join(output_dir, f'preprocessed_{os.path.splitext(os.path.basename(path))[0]}.{output_format}')
+        for key, path in input_files.items()
+    }
+
+    params = {
+        'processors': PREPROCESS_PROCESSORS,
+        'categories': CATEGORIES,
+        'stopwords': sorted(get_stopwords()),
+        'language_filter': 'builtin-v1',
+        'format': output_format
+    }
+    manifest = load_manifest('preprocess')
+    fingerprints = {key: fingerprint([path], params) for key, path in input_files.items()}
+    stale, reused = partition_stale(
+        manifest, fingerprints, lambda key: [output_for[key]] + ([rejected_path(output_for[key])] if stream else []), force
+    )
+    removed = prune_missing(manifest, input_files)
+    file_pairs = [(input_files[key], output_for[key]) for key in stale]
 
-    for input_file in tqdm(input_files, desc='Preprocessing JSON files'):
-        filename = os.path.basename(input_file)
-        output_file = os.path.join(output_dir, f'preprocessed_{filename}')
-        preprocess_json_file(input_file, output_file)
+    if stream:
+        preprocess_json_files_streaming(file_pairs, batch_size or LEMMA_BATCH_SIZE)
+    elif batch_size:
+        preprocess_json_files_batched(tqdm(file_pairs, desc='Preprocessing JSON files'), batch_size)
+    else:
+        for input_file, output_file in tqdm(file_pairs, desc='Preprocessing JSON files'):
+            preprocess_json_file(input_file, output_file)
+
+    for key in stale:
+        # Drop the copy written in the other format, so readers never see a document twice
+        other_format = os.path.splitext(output_for[key])[0] + ('.json' if stream else '.jsonl')
+        for path in [other_format] + ([] if stream else [rejected_path(other_format)]):
+            if os.path.exists(path):
+                os.remove(path)
+        outputs = [output_for[key], rejected_path(output_for[key])] if stream else [output_for[key]]
+        record_build(manifest, key, fingerprints[key], outputs)
+    save_manifest('preprocess', manifest)
+    print_build_report('preprocess', reused, stale, removed)
 
     # Optional: log rejected sentences
     if REJECTED_SENTENCES:
@@ -113,4 +315,12 @@ def run_pipeline(input_dir, output_dir):
 if __name__ == "__main__":
     INPUT_DIR = 'data/extracted'
     OUTPUT_DIR = 'data/preprocessed'
-    run_pipeline(INPUT_DIR, OUTPUT_DIR)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description='Clean and lemmatize extracted sentences.')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help=f'Lemmatize across all files in Stanza batches of this size (e.g. {LEMMA_BATCH_SIZE})')
+    parser.add_argument('--stream', action='store_true',
+                        help='Bounded-memory mode: stream entries in batches and write JSONL outputs')
+    parser.add_argument('--force', action='store_true', help='Rebuild every file, ignoring the manifest')
+    args = parser.parse_args()
+    run_pipeline(INPUT_DIR, OUTPUT_DIR, batch_size=args.batch_size, force=args.force, stream=args.stream)
@@ -1,15 +1,25 @@
 import os
 import re
+import json
+import hashlib
+import argparse
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 BASE_URL    = "https://www.banxico.org.mx/publicaciones-y-prensa/informes-trimestrales/informes-trimestrales-precios.html"
 SAVE_DIR    = "data/"
 START_YEAR  = 2015
 END_YEAR    = 2024
 
-os.makedirs(SAVE_DIR, exist_ok=True)
+# Download settings
+DOWNLOAD_WORKERS = 4
+REQUEST_TIMEOUT  = (10, 60)  # (connect, read) seconds
+CHUNK_SIZE       = 1 << 16
+MANIFEST_NAME    = "downloads.json"
 
 def slugify(text):
     text = text.lower()
@@ -17,12 +27,20 @@ def slugify(text):
     text = re.sub(r"\s+", "-", text)
     return text
 
-def fetch_html():
-    resp = requests.get(BASE_URL)
+def make_session(pool_size=DOWNLOAD_WORKERS):
+    """Session with a connection pool large enough for every download worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=3)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_html(session=None, url=BASE_URL):
+    resp = (session or requests).get(url, timeout=REQUEST_TIMEOUT)
     resp.raise_for_status()
     return resp.text
 
-def extract_pdf_links_and_names(html):
+def extract_pdf_links_and_names(html, base_url=BASE_URL):
     soup = BeautifulSoup(html, "html.parser")
     anchors = soup.find_all("a", string=lambda s: s and "Texto completo" in s)
     entries = []
@@ -43,28 +61,116 @@ def extract_pdf_links_and_names(html):
         if not href.endswith(".pdf"):
             continue
 
-        full_url = urljoin(BASE_URL, href)
+        full_url = urljoin(base_url, href)
         # build a filename: informe-trimestral_oct-dic-2024.pdf
         filename = f"informe-trimestral_{slugify(quarter_text)}.pdf"
         entries.append((full_url, filename))
     return entries
 
-def download_named_pdfs(entries):
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_download_manifest(save_dir):
+    path = os.path.join(save_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_download_manifest(save_dir, manifest):
+    path = os.path.join(save_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def is_downloaded(path, entry):
+    """A PDF only counts as present if the manifest recorded it with the same size and checksum."""
+    return (entry is not None and os.path.exists(path) and os.path.getsize(path) == entry["size"]
+            and sha256_file(path) == entry["sha256"])
+
+def download_pdf(session, url, path):
+    """Stream `url` into `path`.part, resuming a previous partial download via an HTTP Range
+    request, then atomically rename it to `path`. Returns (sha256, size)."""
+    part_path = f"{path}.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as resp:
+        if resp.status_code == 416:
+            # Nothing left to fetch past our offset: the partial file cannot be trusted, start over
+            os.remove(part_path)
+            return download_pdf(session, url, path)
+        resp.raise_for_status()
+
+        resumed = offset and resp.status_code == 206
+        if resumed and not resp.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+            # Partial content from another offset would corrupt the file: start over without a Range
+            os.remove(part_path)
+            return download_pdf(session, url, path)
+        with open(part_path, "ab" if resumed else "wb") as f:
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+
+    checksum = sha256_file(part_path)
+    os.replace(part_path, path)
+    return checksum, os.path.getsize(path)
+
+def download_named_pdfs(entries, save_dir=SAVE_DIR, workers=DOWNLOAD_WORKERS, session=None):
+    """Download (url, filename) entries with at most `workers` concurrent requests.
+
+    Completed files are recorded with their checksum in `save_dir`/downloads.json;
+    returns the filenames that failed.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    session = session or make_session(workers)
+    manifest = load_download_manifest(save_dir)
+    lock = threading.Lock()
+
+    pending = []
     for url, fname in entries:
-        path = os.path.join(SAVE_DIR, fname)
-        if os.path.exists(path):
+        if is_downloaded(os.path.join(save_dir, fname), manifest.get(fname)):
             print(f"✓ Skipped (exists): {fname}")
-            continue
+        else:
+            pending.append((url, fname))
+
+    def fetch(url, fname):
         print(f"↓ Downloading: {fname}")
-        resp = requests.get(url)
-        resp.raise_for_status()
-        with open(path, "wb") as f:
-            f.write(resp.content)
+        checksum, size = download_pdf(session, url, os.path.join(save_dir, fname))
+        with lock:
+            manifest[fname] = {"url": url, "sha256": checksum, "size": size}
+            save_download_manifest(save_dir, manifest)
+        return fname
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, url, fname): fname for url, fname in pending}
+        for future in as_completed(futures):
+            try:
+                print(f"✓ Downloaded: {future.result()}")
+            # OSError: the .part file or the rename failed (disk full, permissions)
+            except (requests.RequestException, OSError) as e:
+                print(f"✗ Failed: {futures[future]} ({e})")
+                failed.append(futures[future])
+    return failed
 
-def run():
-    html    = fetch_html()
-    entries = extract_pdf_links_and_names(html)
-    download_named_pdfs(entries)
+def run(base_url=BASE_URL, save_dir=SAVE_DIR, workers=DOWNLOAD_WORKERS):
+    with make_session(workers) as session:
+        html    = fetch_html(session, base_url)
+        entries = extract_pdf_links_and_names(html, base_url)
+        return download_named_pdfs(entries, save_dir, workers, session)
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download Banxico quarterly inflation reports.")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS, help="Concurrent downloads")
+    parser.add_argument("--base-url", default=BASE_URL, help="Listing page to scrape (e.g. a local test server)")
+    parser.add_argument("--save-dir", default=SAVE_DIR)
+    args = parser.parse_args()
+    failed = run(args.base_url, args.save_dir, args.workers)
+    if failed:
+        raise SystemExit(f"{len(failed)} download(s) failed: {', '.join(failed)}")
@@ -1,13 +1,21 @@
 # sentiment_heuristics.py
 # Estimate sentiment orientation per year and topic using lexical heuristics
+# The corpus is counted once into a sparse sentence-by-term matrix; every lexicon is then
+# scored with one sparse product and aggregated to sentence, document, quarter or year level.
 
 import os
 import json
-import re
-from glob import glob
-from collections import defaultdict, Counter
-from tqdm import tqdm
+import argparse
+import numpy as np
 import pandas as pd
+import pyarrow.compute as pc
+from scipy import sparse
+
+from corpus_store import STORE_PATH, load_corpus, year_fingerprints
+from instrumentation import measure
+from manifest import (
+    hash_params, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
 
 # Basic Spanish positive/negative wordlists (extendable)
 POSITIVE_WORDS = set([
@@ -20,65 +28,154 @@ NEGATIVE_WORDS = set([
     "contracción", "desaceleración", "presión", "volatilidad", "aumento"
 ])
 
-
-def extract_year_from_filename(filename):
-    match = re.search(r'(\d{4})', filename)
-    return match.group(1) if match else None
-
-
-def load_sentiment_data(preprocessed_dir):
-    data = defaultdict(lambda: defaultdict(list))
-
-    for path in tqdm(glob(os.path.join(preprocessed_dir, 'preprocessed_*.json'))):
-        year = extract_year_from_filename(path)
-        if not year:
-            continue
-
-        with open(path, 'r', encoding='utf-8') as f:
-            doc = json.load(f)
-
-        for topic in ['gdp_prioritized', 'gdp_other']:
-            data['gdp'][year].extend(doc.get(topic, []))
-
-        for topic in ['inflation_prioritized', 'inflation_other']:
-            data['inflation'][year].extend(doc.get(topic, []))
-
-    return data
-
-
-def compute_sentiment_scores(corpus):
-    results = []
-
-    for topic in corpus:
-        for year in sorted(corpus[topic].keys()):
-            tokens = [word for sentence in corpus[topic][year] for word in sentence.split()]
-            total = len(tokens)
-            counter = Counter(tokens)
-            pos = sum(counter[w] for w in POSITIVE_WORDS if w in counter)
-            neg = sum(counter[w] for w in NEGATIVE_WORDS if w in counter)
-            neutral = total - pos - neg
-
-            polarity = (pos - neg) / total if total > 0 else 0
-            sentiment = {
-                "topic": topic,
-                "year": year,
-                "positive": pos,
-                "negative": neg,
-                "neutral": neutral,
-                "total_tokens": total,
-                "sentiment_score": polarity
-            }
-            results.append(sentiment)
-
-    return pd.DataFrame(results)
+DEFAULT_LEXICON = 'basic'
+
+LEVELS = {
+    'sentence': ['document_id', 'subcategory', 'sentence_index'],
+    'document': ['document_id'],
+    'quarter': ['year', 'quarter'],
+    'year': ['year']
+}
+ROW_COLUMNS = ['document_id', 'topic', 'subcategory', 'sentence_index', 'year', 'quarter']
+
+
+def default_lexicon():
+    return {DEFAULT_LEXICON: {**{w: 1.0 for w in POSITIVE_WORDS}, **{w: -1.0 for w in NEGATIVE_WORDS}}}
+
+
+def load_lexicon(path):
+    """Read a weighted lexicon: one `term,weight` (or tab-separated) line per term, `#` comments.
+
+    Positive weights count towards the positive score, negative ones towards the negative score.
+    """
+    df = pd.read_csv(path, sep=None, engine='python', comment='#', header=None, names=['term', 'weight'],
+                     skip_blank_lines=True).dropna()
+    return dict(zip(df['term'].astype(str).str.strip(), df['weight'].astype(float)))
+
+
+def build_term_counts(table):
+    """Sparse sentence-by-term count matrix of a corpus store table, with its vocabulary and row info.
+
+    Sentences without a year cannot be placed in a period and are left out.
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    table = table.filter(pc.is_valid(table['year']))
+    if not table.num_rows:
+        return sparse.csr_matrix((0, 0), dtype=np.int32), [], pd.DataFrame(columns=ROW_COLUMNS)
+    vectorizer = CountVectorizer(analyzer=str.split, dtype=np.int32)
+    counts = vectorizer.fit_transform(table['text'].to_pylist()).tocsr()
+    rows = table.select(ROW_COLUMNS).to_pandas()
+    rows['year'] = rows['year'].astype(str)
+    return counts, vectorizer.get_feature_names_out().tolist(), rows
+
+
+def lexicon_matrix(lexicons, vocabulary):
+    """Term-by-column weights: per lexicon, its positive weights, |negative weights| and a hit indicator."""
+    term_index = {term: i for i, term in enumerate(vocabulary)}
+    data, term_ids, columns = [], [], []
+    for l, lexicon in enumerate(lexicons.values()):
+        for term, weight in lexicon.items():
+            if term not in term_index or not weight:
+                continue
+            part = 0 if weight > 0 else 1
+            data += [abs(weight), 1.0]
+            term_ids += [term_index[term]] * 2
+            columns += [3 * l + part, 3 * l + 2]
+    return sparse.csr_matrix((data, (term_ids, columns)), shape=(len(vocabulary), 3 * len(lexicons)))
+
+
+def group_matrix(rows, level):
+    """(keys, G) where G is a sparse group-by-sentence indicator matrix for `level` per topic."""
+    keys = ['topic'] + LEVELS[level]
+    grouped = rows.groupby(keys, sort=True, dropna=False)
+    codes = grouped.ngroup().to_numpy()
+    index = grouped.size().index.to_frame(index=False)
+    G = sparse.csr_matrix((np.ones(len(codes), dtype=np.int64), (codes, np.arange(len(codes)))), shape=(len(index), len(codes)))
+    return index, G
+
+
+def score_lexicons(counts, vocabulary, rows, lexicons, level='year'):
+    """Score every lexicon at once at `level`; one row per group and lexicon.
+
+    positive/negative are weighted hit sums, neutral the tokens matching no lexicon term.
+    """
+    index, G = group_matrix(rows, level)
+    grouped_counts = G @ counts
+    scores = (grouped_counts @ lexicon_matrix(lexicons, vocabulary)).toarray()
+    totals = np.asarray(grouped_counts.sum(axis=1)).ravel()
+
+    frames = []
+    for l, (name, lexicon) in enumerate(lexicons.items()):
+        pos, neg, hits = scores[:, 3 * l], scores[:, 3 * l + 1], scores[:, 3 * l + 2]
+        if all(float(weight).is_integer() for weight in lexicon.values()):
+            pos, neg = pos.round().astype(np.int64), neg.round().astype(np.int64)
+        frame = index.copy()
+        frame['lexicon'] = name
+        frame['positive'] = pos
+        frame['negative'] = neg
+        frame['neutral'] = totals - hits.round().astype(np.int64)
+        frame['total_tokens'] = totals
+        frame['sentiment_score'] = np.divide(pos - neg, totals, out=np.zeros(len(totals)), where=totals > 0)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def save_term_counts(counts, vocabulary, rows, output_dir):
+    sparse.save_npz(os.path.join(output_dir, 'term_counts.npz'), counts)
+    with open(os.path.join(output_dir, 'term_vocabulary.json'), 'w', encoding='utf-8') as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+    rows.to_parquet(os.path.join(output_dir, 'term_rows.parquet'), index=False)
+
+
+def load_term_counts(output_dir):
+    counts = sparse.load_npz(os.path.join(output_dir, 'term_counts.npz')).tocsr()
+    with open(os.path.join(output_dir, 'term_vocabulary.json'), 'r', encoding='utf-8') as f:
+        vocabulary = json.load(f)
+    return counts, vocabulary, pd.read_parquet(os.path.join(output_dir, 'term_rows.parquet'))
 
 
 if __name__ == "__main__":
-    PREPROCESSED_DIR = "data/preprocessed"
-    OUTPUT_PATH = "data/features/sentiment/sentiment_heuristics.csv"
-
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    corpus = load_sentiment_data(PREPROCESSED_DIR)
-    df = compute_sentiment_scores(corpus)
+    OUTPUT_DIR = "data/features/sentiment"
+    OUTPUT_PATH = os.path.join(OUTPUT_DIR, "sentiment_heuristics.csv")
+
+    parser = argparse.ArgumentParser(description='Compute lexicon-based sentiment scores per topic and year.')
+    parser.add_argument('--force', action='store_true', help='Recount the corpus even if the store did not change')
+    parser.add_argument('--lexicon', action='append', default=[],
+                        help='Extra weighted lexicon file (term,weight per line); repeatable')
+    parser.add_argument('--level', choices=sorted(LEVELS), default='year',
+                        help='Aggregation level of the per-lexicon comparison table')
+    args = parser.parse_args()
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # The term counts only depend on the corpus; scoring lexicons against them is cheap
+    outputs = [os.path.join(OUTPUT_DIR, name) for name in ['term_counts.npz', 'term_vocabulary.json', 'term_rows.parquet']]
+    manifest = load_manifest('sentiment')
+    fingerprints = {'counts': hash_params({'years': year_fingerprints()})}
+    stale, reused = partition_stale(manifest, fingerprints, lambda key: outputs, args.force)
+    removed = prune_missing(manifest, fingerprints, delete_outputs=False)
+
+    if stale:
+        table = load_corpus(STORE_PATH, columns=ROW_COLUMNS + ['text'])
+        with measure('vectorize', items=table.num_rows):
+            term_counts = build_term_counts(table)
+        save_term_counts(*term_counts, OUTPUT_DIR)
+        record_build(manifest, 'counts', fingerprints['counts'], outputs)
+    if stale or removed:
+        save_manifest('sentiment', manifest)
+    print_build_report('sentiment', reused, stale, removed)
+
+    counts, vocabulary, rows = load_term_counts(OUTPUT_DIR)
+    lexicons = default_lexicon()
+    for path in args.lexicon:
+        lexicons[os.path.splitext(os.path.basename(path))[0]] = load_lexicon(path)
+
+    df = score_lexicons(counts, vocabulary, rows, default_lexicon(), level='year').drop(columns='lexicon')
     df.to_csv(OUTPUT_PATH, index=False)
-    print("Sentiment heuristic scores saved to sentiment_heuristics.csv")
\ No newline at end of file
+    print("Sentiment heuristic scores saved to sentiment_heuristics.csv")
+
+    if len(lexicons) > 1 or args.level != 'year':
+        comparison_path = os.path.join(OUTPUT_DIR, f"sentiment_lexicons_{args.level}.csv")
+        score_lexicons(counts, vocabulary, rows, lexicons, level=args.level).to_csv(comparison_path, index=False)
+        print(f"Per-lexicon scores saved to {os.path.basename(comparison_path)}")
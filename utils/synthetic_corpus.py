@@ -0,0 +1,216 @@
+# Synthetic Spanish economic-report corpus for reproducible benchmarks
+# Sentences are drawn from templates over a fixed vocabulary with a seeded RNG, so a given size and
+# seed always yield the same corpus. Reports can be written as PDFs (single-column for 2015–2017,
+# two-column afterwards, like the real reports), extracted JSON, preprocessed JSON with annotations,
+# or built directly into a corpus store table.
+# Usage: python utils/synthetic_corpus.py --output-dir /tmp/synthetic --documents 8 --pdf
+
+import os
+import re
+import json
+import random
+import argparse
+import textwrap
+
+from preprocessing import CATEGORIES
+
+QUARTERS = ['enero-marzo', 'abril-junio', 'julio-septiembre', 'octubre-diciembre']
+START_YEAR = 2015
+NUM_YEARS = 10
+SENTENCES_PER_CATEGORY = 20
+# Page layout of the synthetic PDFs: wrap width in characters for one and two columns
+PDF_LAYOUT = {'lines_per_page': 48, 'wrap_width': {1: 95, 2: 45}, 'font_size': 8, 'line_spacing': 1.6,
+              'font': 'DejaVu Sans', 'fonttype': 42}
+
+# (word, lemma, UPOS); function words are dropped from the preprocessed text like stopwords
+SUBJECTS = {
+    'gdp': [[('el', 'el', 'DET'), ('PIB', 'pib', 'NOUN')],
+            [('el', 'el', 'DET'), ('producto', 'producto', 'NOUN'), ('interno', 'interno', 'ADJ'),
+             ('bruto', 'bruto', 'ADJ')],
+            [('el', 'el', 'DET'), ('crecimiento', 'crecimiento', 'NOUN'), ('económico', 'económico', 'ADJ')]],
+    'inflation': [[('la', 'el', 'DET'), ('inflación', 'inflación', 'NOUN')],
+                  [('la', 'el', 'DET'), ('inflación', 'inflación', 'NOUN'), ('subyacente', 'subyacente', 'ADJ')],
+                  [('los', 'el', 'DET'), ('precios', 'precio', 'NOUN'), ('al', 'al', 'ADP'),
+                   ('consumidor', 'consumidor', 'NOUN')]]
+}
+MEXICO = [[('de', 'de', 'ADP'), ('México', 'méxico', 'PROPN')],
+          [('de', 'de', 'ADP'), ('la', 'el', 'DET'), ('economía', 'economía', 'NOUN'), ('nacional', 'nacional', 'ADJ')],
+          [('según', 'según', 'ADP'), ('el', 'el', 'DET'), ('Banco', 'banco', 'PROPN'), ('de', 'de', 'ADP'),
+           ('México', 'méxico', 'PROPN')]]
+VERBS = [('aumentó', 'aumentar'), ('disminuyó', 'disminuir'), ('registró', 'registrar'), ('mostró', 'mostrar'),
+         ('presentó', 'presentar'), ('moderó', 'moderar'), ('aceleró', 'acelerar'), ('mantuvo', 'mantener')]
+NOUNS = ['expansión', 'contracción', 'recuperación', 'desaceleración', 'presión', 'demanda', 'inversión',
+         'producción', 'exportación', 'consumo', 'estabilidad', 'volatilidad', 'incertidumbre', 'riesgo',
+         'fortaleza', 'debilidad', 'tendencia', 'variación', 'política', 'tasa']
+ADJECTIVES = ['sólido', 'favorable', 'negativo', 'moderado', 'elevado', 'débil', 'positivo', 'reciente',
+              'persistente', 'gradual', 'anual', 'trimestral']
+
+
+def synthetic_sentence(rng, topic, prioritized):
+    """Token triples of one sentence about `topic`; prioritized ones also mention Mexico."""
+    tokens = list(rng.choice(SUBJECTS[topic]))
+    if prioritized:
+        tokens += rng.choice(MEXICO)
+    word, lemma = rng.choice(VERBS)
+    tokens.append((word, lemma, 'VERB'))
+    for _ in range(rng.randint(1, 3)):
+        noun = rng.choice(NOUNS)
+        tokens += [(rng.choice(['por', 'con', 'ante']), 'por', 'ADP'), ('la', 'el', 'DET'), (noun, noun, 'NOUN')]
+        adjective = rng.choice(ADJECTIVES)
+        tokens.append((adjective, adjective, 'ADJ'))
+    return tokens
+
+
+def document_ids(num_documents, start_year=START_YEAR, num_years=NUM_YEARS):
+    """Quarterly report ids in the real naming scheme, one quarter after another from `start_year`.
+
+    Past `num_years` the quarters repeat with a copy suffix, so large corpora keep realistic years.
+    """
+    ids = []
+    for i in range(num_documents):
+        copy, slot = divmod(i, 4 * num_years)
+        ids.append(f'informe-trimestral_{QUARTERS[slot % 4]}-{start_year + slot // 4}' + (f'_{copy}' if copy else ''))
+    return ids
+
+
+def report_year(document_id):
+    return int(re.search(r'(20\d{2})', document_id).group(1))
+
+
+def synthetic_reports(num_documents, seed=0, sentences_per_category=SENTENCES_PER_CATEGORY):
+    """{document_id: {category: [sentence token triples]}}, identical for the same arguments."""
+    rng = random.Random(seed)
+    reports = {}
+    for document_id in document_ids(num_documents):
+        reports[document_id] = {
+            category: [synthetic_sentence(rng, category.split('_')[0], category.endswith('prioritized'))
+                       for _ in range(sentences_per_category)]
+            for category in CATEGORIES
+        }
+    return reports
+
+
+def sentence_text(tokens):
+    text = ' '.join(word for word, _, _ in tokens)
+    return text[0].upper() + text[1:] + '.'
+
+
+def extracted_json(report):
+    """The report as extract_corpus.py writes it: {category: [sentences]}."""
+    return {category: [sentence_text(tokens) for tokens in report[category]] for category in CATEGORIES}
+
+
+def content_tokens(tokens):
+    return [(lemma, upos) for _, lemma, upos in tokens if upos not in ('DET', 'ADP')]
+
+
+def preprocessed_json(report):
+    """The report as preprocessing.py writes it: {category: [stopword-free lemma strings]}."""
+    return {
+        category: [' '.join(lemma for lemma, _ in content_tokens(tokens)) for tokens in report[category]]
+        for category in CATEGORIES
+    }
+
+
+def annotations(report):
+    """Annotated records of the preprocessed report, as annotation.annotate_document returns them."""
+    records, by_text = [], {}
+    for category in CATEGORIES:
+        for index, tokens in enumerate(report[category]):
+            pairs = content_tokens(tokens)
+            text = ' '.join(lemma for lemma, _ in pairs)
+            if text not in by_text:
+                by_text[text] = {'sent_id': len(records), 'refs': [],
+                                 'lemmas': [lemma for lemma, _ in pairs], 'upos': [upos for _, upos in pairs]}
+                records.append(by_text[text])
+            by_text[text]['refs'].append([category, index])
+    return records
+
+
+def corpus_table(reports):
+    """A corpus store table (see corpus_store.SCHEMA) of the preprocessed, annotated reports."""
+    import pyarrow as pa
+    from corpus_store import SCHEMA, document_batch
+
+    batches = [document_batch(document_id, preprocessed_json(report), annotations(report))
+               for document_id, report in reports.items()]
+    return pa.Table.from_batches(batches, schema=SCHEMA)
+
+
+def is_two_column(document_id):
+    """Layout the extractor expects: single column for the 2015–2017 reports, two columns after."""
+    return not 2015 <= report_year(document_id) <= 2017
+
+
+def write_report_pdf(path, sentences, two_column=True, layout=PDF_LAYOUT):
+    """Write `sentences` as a text-only A4 PDF in one or two columns of wrapped lines."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.backends.backend_pdf import PdfPages
+    import matplotlib.pyplot as plt
+
+    columns = 2 if two_column else 1
+    lines = textwrap.wrap(' '.join(sentences), width=layout['wrap_width'][columns])
+    lines_per_page = layout['lines_per_page']
+    per_page = lines_per_page * columns
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # TrueType fonts keep the text extractable; matplotlib's default Type 3 fonts are not
+    with matplotlib.rc_context({'pdf.fonttype': layout['fonttype']}), PdfPages(path) as pdf:
+        for start in range(0, len(lines), per_page):
+            figure = plt.figure(figsize=(8.27, 11.69))
+            page = lines[start:start + per_page]
+            for column in range(columns):
+                column_lines = page[column * lines_per_page:(column + 1) * lines_per_page]
+                figure.text(0.06 + column * 0.48, 0.95, '\n'.join(column_lines), va='top', ha='left',
+                            fontsize=layout['font_size'], linespacing=layout['line_spacing'], family=layout['font'])
+            pdf.savefig(figure)
+            plt.close(figure)
+
+
+def report_pdf_key(sentences, two_column=True, layout=PDF_LAYOUT):
+    """Cache key of a synthetic report PDF: a hash of its text and page layout.
+
+    The text already reflects the seed, sentences per category, vocabulary and templates that
+    generated it, so any change to those or to the layout gives a new key.
+    """
+    from manifest import hash_params
+
+    return hash_params({'sentences': sentences, 'two_column': two_column, 'layout': layout})
+
+
+def write_synthetic_corpus(output_dir, num_documents, seed=0, pdf=False,
+                           sentences_per_category=SENTENCES_PER_CATEGORY):
+    """Write the synthetic reports in the data/ layout: raw PDFs (optional), extracted, preprocessed
+    and annotated JSON. Returns the document ids."""
+    reports = synthetic_reports(num_documents, seed, sentences_per_category)
+    for document_id, report in reports.items():
+        extracted = extracted_json(report)
+        year = str(report_year(document_id))
+        outputs = {
+            os.path.join(output_dir, 'extracted', year, f'{document_id}.json'): extracted,
+            os.path.join(output_dir, 'preprocessed', f'preprocessed_{document_id}.json'): preprocessed_json(report),
+            os.path.join(output_dir, 'annotated', f'annotated_{document_id}.json'):
+                {'document_id': document_id, 'processors': 'synthetic', 'sentences': annotations(report)}
+        }
+        for path, data in outputs.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        if pdf:
+            sentences = [sentence for category in CATEGORIES for sentence in extracted[category]]
+            write_report_pdf(os.path.join(output_dir, 'raw', f'{document_id}.pdf'), sentences,
+                             is_two_column(document_id))
+    return list(reports)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write a synthetic Banxico-style corpus for benchmarks.')
+    parser.add_argument('--output-dir', default='data/synthetic')
+    parser.add_argument('--documents', type=int, default=8, help='Number of quarterly reports')
+    parser.add_argument('--sentences', type=int, default=SENTENCES_PER_CATEGORY, help='Sentences per category')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pdf', action='store_true', help='Also write the reports as PDFs under raw/')
+    args = parser.parse_args()
+
+    ids = write_synthetic_corpus(args.output_dir, args.documents, args.seed, args.pdf, args.sentences)
+    print(f"{len(ids)} synthetic reports written to {args.output_dir}")
@@ -0,0 +1,167 @@
+# Per-period Word2Vec models aligned to a common space, and per-term semantic drift
+# One model is trained per year or quarter on a process pool, its vectors are rotated onto the
+# reference period with orthogonal Procrustes over the shared vocabulary, and drift is the cosine
+# distance of a term between consecutive periods. Vectors are saved as .npy for memory-mapping.
+
+import os
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from gensim.models import Word2Vec, KeyedVectors
+
+from corpus_store import STORE_PATH, StoreSentences, document_fingerprints, open_store, period_of, store_index
+from instrumentation import measure
+from manifest import (
+    hash_params, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
+
+LEVELS = ['year', 'quarter']
+MODEL_PARAMS = {'vector_size': 100, 'window': 5, 'min_count': 2, 'sg': 1, 'seed': 1}
+
+
+def period_documents(store_path=STORE_PATH, level='year'):
+    """{period: [document ids]} of the reports in the corpus store, in period order."""
+    periods = defaultdict(list)
+    for info in store_index(open_store(store_path)):
+        if info['year'] is not None:
+            periods[period_of(info['year'], info['quarter'], level)].append(info['document_id'])
+    return dict(sorted(periods.items()))
+
+
+def model_path(output_dir, period, aligned=False):
+    return os.path.join(output_dir, f"{period}{'.aligned' if aligned else ''}.kv")
+
+
+def save_vectors(keyed_vectors, path):
+    """Save with the vector array in its own .npy file, so it can be loaded with mmap."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    keyed_vectors.save(path, separately=['vectors'])
+
+
+def load_vectors(path, mmap='r'):
+    """Load saved KeyedVectors; the vectors stay memory-mapped instead of being read into RAM."""
+    return KeyedVectors.load(path, mmap=mmap)
+
+
+def train_period_model(store_path, documents, topics, params, path, workers=1):
+    """Train one period's model from its reports in the store; returns `path`, or None if the
+    period has no term frequent enough to train on. Runs in a worker process."""
+    sentences = StoreSentences(store_path, topics=topics, documents=documents)
+    model = Word2Vec(workers=workers, **params)
+    model.build_vocab(sentences)
+    if not model.wv.index_to_key:
+        return None
+    model.train(sentences, total_examples=model.corpus_count, epochs=model.epochs)
+    save_vectors(model.wv, path)
+    return path
+
+
+def train_period_models(jobs, processes=None):
+    """Run train_period_model for each (period, kwargs) job on a process pool; {period: path or None}."""
+    if processes == 1:
+        return {period: train_period_model(**kwargs) for period, kwargs in jobs}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {period: pool.submit(train_period_model, **kwargs) for period, kwargs in jobs}
+        return {period: future.result() for period, future in futures.items()}
+
+
+def unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def procrustes_rotation(source, target):
+    """Orthogonal R minimizing ||source @ R - target|| (rows are the same terms in both spaces)."""
+    u, _, vt = np.linalg.svd(source.T @ target)
+    return u @ vt
+
+
+def align_to_reference(vectors_by_period, reference):
+    """Rotate every period's KeyedVectors onto `reference`'s space over their shared vocabulary.
+
+    Returns {period: KeyedVectors} with unit-normalized, aligned vectors.
+    """
+    target = vectors_by_period[reference]
+    aligned = {}
+    for period, keyed_vectors in vectors_by_period.items():
+        shared = [key for key in keyed_vectors.index_to_key if key in target.key_to_index]
+        rotation = np.eye(keyed_vectors.vector_size)
+        if period != reference and shared:
+            rotation = procrustes_rotation(unit_rows(keyed_vectors[shared]), unit_rows(target[shared]))
+        result = KeyedVectors(keyed_vectors.vector_size, dtype=np.float32)
+        result.add_vectors(keyed_vectors.index_to_key, unit_rows(np.asarray(keyed_vectors.vectors) @ rotation))
+        aligned[period] = result
+    return aligned
+
+
+def drift_scores(aligned):
+    """Term-by-period cosine distance to the same term in the previous period (NaN if absent in either)."""
+    periods = list(aligned)
+    columns = {}
+    for previous, period in zip(periods, periods[1:]):
+        before, after = aligned[previous], aligned[period]
+        shared = [key for key in after.index_to_key if key in before.key_to_index]
+        similarity = np.einsum('ij,ij->i', before[shared], after[shared]) if shared else np.zeros(0)
+        columns[period] = pd.Series(1.0 - similarity, index=shared, dtype=np.float64)
+    drift = pd.DataFrame(columns)
+    drift.index.name = 'term'
+    return drift.dropna(how='all').sort_index()
+
+
+if __name__ == "__main__":
+    OUTPUT_DIR = "data/features/embeddings/temporal"
+
+    parser = argparse.ArgumentParser(description='Train aligned per-period Word2Vec models and per-term drift scores.')
+    parser.add_argument('--level', choices=LEVELS, default='year', help='One model per year or per quarter')
+    parser.add_argument('--topic', action='append', default=None, help='Only train on this topic (repeatable)')
+    parser.add_argument('--processes', type=int, default=None, help='Models trained in parallel (default: all CPUs)')
+    parser.add_argument('--reference', default=None, help='Period whose space the others are aligned to (default: last)')
+    parser.add_argument('--force', action='store_true', help='Retrain every period, ignoring the manifest')
+    args = parser.parse_args()
+
+    output_dir = os.path.join(OUTPUT_DIR, args.level)
+    params = {**MODEL_PARAMS, 'topics': sorted(args.topic) if args.topic else None}
+    documents = period_documents(STORE_PATH, args.level)
+    if args.reference is not None and args.reference not in documents:
+        parser.error(f"--reference {args.reference} is not a {args.level} in the corpus; "
+                     f"available: {', '.join(documents) or 'none'}")
+    by_document = document_fingerprints()
+
+    # Only periods whose reports (or the parameters) changed are retrained
+    stage = f'temporal_word2vec_{args.level}'
+    manifest = load_manifest(stage)
+    fingerprints = {
+        period: hash_params({'documents': sorted((d, by_document.get(d)) for d in docs), 'params': params})
+        for period, docs in documents.items()
+    }
+    # Periods too small to train record no outputs, so they are not retried until they change
+    stale, reused = partition_stale(manifest, fingerprints,
+                                   lambda period: manifest.get(period, {}).get('outputs', []), args.force)
+    removed = prune_missing(manifest, fingerprints)
+
+    jobs = [(period, {'store_path': STORE_PATH, 'documents': documents[period], 'topics': args.topic,
+                      'params': MODEL_PARAMS, 'path': model_path(output_dir, period)}) for period in stale]
+    with measure('train', items=len(jobs)):
+        paths = train_period_models(jobs, args.processes)
+    for period, path in paths.items():
+        record_build(manifest, period, fingerprints[period], [path, f'{path}.vectors.npy'] if path else [])
+        if path is None:
+            print(f"  Skipping {period} — no term occurs at least {MODEL_PARAMS['min_count']} times.")
+    save_manifest(stage, manifest)
+    print_build_report(stage, reused, stale, removed)
+
+    trained = {period: load_vectors(model_path(output_dir, period))
+               for period in documents if manifest[period]['outputs']}
+    if not trained:
+        raise SystemExit("No period has enough text to train a model.")
+    if args.reference is not None and args.reference not in trained:
+        raise SystemExit(f"Reference period {args.reference} has too little text to train a model; "
+                         f"trained: {', '.join(trained)}")
+    reference = args.reference or list(trained)[-1]
+    aligned = align_to_reference(trained, reference)
+    for period, keyed_vectors in aligned.items():
+        save_vectors(keyed_vectors, model_path(output_dir, period, aligned=True))
+    drift_scores(aligned).to_csv(os.path.join(output_dir, 'drift.csv'))
+    print(f"Aligned {len(aligned)} {args.level} models to {reference}; drift scores saved to {output_dir}/drift.csv")
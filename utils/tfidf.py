@@ -1,106 +1,354 @@
-# Compute TF-IDF matrices per year and topic (GDP vs Inflation), filtered by POS (NOUN, VERB)
+# Compute TF-IDF per topic and period (year or quarter), filtered by POS (NOUN, VERB)
+# Every (topic, period) document is fitted with one shared vocabulary and IDF, and saved as a
+# sparse CSR matrix (.npz) with its vocabulary and row labels instead of a dense CSV.
 
 import os
 import json
-import re
-import time
-from glob import glob
-from collections import defaultdict
-from tqdm import tqdm
+import argparse
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-import stanza
-
-# Initialize Stanza pipeline
-stanza.download('es')
-nlp = stanza.Pipeline(lang='es', processors='tokenize,pos,lemma', tokenize_no_ssplit=True)
+from collections import defaultdict
+from scipy import sparse
 
+from annotation import filter_lemmas
+from corpus_store import STORE_PATH, document_fingerprints, load_corpus, period_of, year_fingerprints
+from instrumentation import measure
+from manifest import (
+    hash_params, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
 
-def extract_year_from_filename(filename):
-    match = re.search(r'(\d{4})', filename)
-    return match.group(1) if match else None
+LEVELS = ['year', 'quarter']
+ALLOWED_POS = {'NOUN', 'VERB'}
+TOKEN_PATTERN = r"(?u)\b\w+\b"
+MIN_LEMMA_LENGTH = 2
+# Terms kept in the shared vocabulary; the same cap the per-period TfidfVectorizer used
+MAX_FEATURES = 1000
 
 
-def extract_filtered_lemmas(texts, allowed_pos={'NOUN', 'VERB'}):
-    lemmas = []
-    for sentence in texts:
-        doc = nlp(sentence)
-        for sent in doc.sentences:
-            for word in sent.words:
-                if word.upos in allowed_pos and word.lemma and len(word.lemma) > 2:
-                    lemmas.append(word.lemma.lower())
-    return ' '.join(lemmas)
+def extract_filtered_lemmas(records, allowed_pos=ALLOWED_POS):
+    """Join the POS-filtered lemmas of annotated sentences (see annotation.py) into one document."""
+    return ' '.join(filter_lemmas(records, allowed_pos, min_length=MIN_LEMMA_LENGTH))
 
 
-def load_topic_corpus_by_year(preprocessed_dir):
-    corpora = defaultdict(lambda: defaultdict(list))  # structure: corpora[topic][year] = [texts]
+def period_documents(table, level='year', allowed_pos=ALLOWED_POS, by_document=False):
+    """Join the filtered lemmas of a corpus store table into one document per (topic, period).
 
-    for path in tqdm(glob(os.path.join(preprocessed_dir, 'preprocessed_*.json'))):
-        year = extract_year_from_filename(path)
-        if not year:
+    With `by_document`, keys are (document_id, topic, period) instead, one document per report and topic.
+    """
+    records = defaultdict(list)
+    data = table.select(['document_id', 'topic', 'year', 'quarter', 'lemmas', 'upos']).to_pydict()
+    for document_id, topic, year, quarter, lemmas, upos in zip(*data.values()):
+        # Sentences without a year or not annotated yet cannot be placed or filtered
+        if year is None or lemmas is None:
             continue
+        key = (topic, period_of(year, quarter, level))
+        records[(document_id, *key) if by_document else key].append({'lemmas': lemmas, 'upos': upos})
+    keys = sorted(records)
+    return keys, [extract_filtered_lemmas(records[key], allowed_pos) for key in keys]
+
+
+def count_terms(docs, vocabulary=None):
+    """Sparse document-by-term counts (and the sorted vocabulary, unless one is given)."""
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    vectorizer = CountVectorizer(token_pattern=TOKEN_PATTERN, vocabulary=vocabulary, dtype=np.int64)
+    counts = vectorizer.fit_transform(docs).tocsr()
+    return counts, vectorizer.get_feature_names_out().tolist()
+
+
+def limit_vocabulary(counts, vocabulary, max_features=None):
+    """Keep the `max_features` most frequent terms (ties broken alphabetically), in vocabulary order."""
+    if max_features is None or len(vocabulary) <= max_features:
+        return counts, vocabulary
+    totals = np.asarray(counts.sum(axis=0)).ravel()
+    keep = np.sort(np.lexsort((np.arange(len(vocabulary)), -totals))[:max_features])
+    return counts[:, keep], [vocabulary[i] for i in keep]
+
+
+def tfidf_from_counts(counts):
+    """Smoothed-IDF, L2-normalized TF-IDF of a count matrix (as TfidfVectorizer computes it)."""
+    from sklearn.feature_extraction.text import TfidfTransformer
+
+    return TfidfTransformer().fit_transform(counts).tocsr()
+
+
+def compute_tfidf(keys, docs, max_features=MAX_FEATURES):
+    """Fit one vocabulary and IDF over every (topic, period) document; returns (matrix, vocabulary, rows)."""
+    kept = []
+    for (topic, period), doc in zip(keys, docs):
+        if doc.strip():
+            kept.append(((topic, period), doc))
+        else:
+            print(f"  Skipping {topic} {period} — no valid verbs/nouns found.")
+    rows = pd.DataFrame([key for key, _ in kept], columns=['topic', 'period'])
+    if not kept:
+        return sparse.csr_matrix((0, 0)), [], rows
+
+    counts, vocabulary = count_terms([doc for _, doc in kept])
+    counts, vocabulary = limit_vocabulary(counts, vocabulary, max_features)
+    return tfidf_from_counts(counts), vocabulary, rows
+
+
+def empty_state():
+    """Incremental TF-IDF state: per (document, topic) and per (topic, period) term counts plus
+    document frequencies over the periods, against an append-only vocabulary."""
+    return {
+        'vocabulary': [],
+        'doc_rows': pd.DataFrame(columns=['document_id', 'topic', 'period']),
+        'doc_counts': sparse.csr_matrix((0, 0), dtype=np.int64),
+        'period_rows': pd.DataFrame(columns=['topic', 'period']),
+        'period_counts': sparse.csr_matrix((0, 0), dtype=np.int64),
+        'df': np.zeros(0, dtype=np.int64)
+    }
+
+
+def _resize(matrix, num_columns):
+    matrix = matrix.tocsr()
+    return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], num_columns))
+
+
+def count_terms_growing(docs, vocabulary):
+    """Count `docs` against `vocabulary`, appending unseen terms to it in place."""
+    counts, local_vocabulary = count_terms(docs)
+    term_index = {term: i for i, term in enumerate(vocabulary)}
+    for term in local_vocabulary:
+        if term not in term_index:
+            term_index[term] = len(vocabulary)
+            vocabulary.append(term)
+    remap = np.array([term_index[term] for term in local_vocabulary], dtype=np.int64)
+    counts = counts.tocoo()
+    return sparse.csr_matrix((counts.data, (counts.row, remap[counts.col])), shape=(counts.shape[0], len(vocabulary)))
+
 
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+def update_tfidf_state(state, table, level='year', removed_documents=()):
+    """Replace the counts of the documents in `table` (and drop `removed_documents`) in `state`.
 
-        for topic in ['gdp_prioritized', 'gdp_other']:
-            if topic in data:
-                corpora['gdp'][year].extend(data[topic])
+    Only the touched documents are re-counted; period counts and document frequencies are
+    updated by subtracting the old and adding the new rows. Returns the (topic, period) keys updated.
+    """
+    keys, docs = period_documents(table, level, by_document=True)
+    changed = set(table.column('document_id').to_pylist()) | set(removed_documents)
+    vocabulary = state['vocabulary']
+    new_counts = count_terms_growing(docs, vocabulary) if docs else sparse.csr_matrix((0, len(vocabulary)), dtype=np.int64)
+    num_terms = len(vocabulary)
 
-        for topic in ['inflation_prioritized', 'inflation_other']:
-            if topic in data:
-                corpora['inflation'][year].extend(data[topic])
+    doc_rows, doc_counts = state['doc_rows'], _resize(state['doc_counts'], num_terms)
+    dropped = doc_rows['document_id'].isin(changed).to_numpy()
+    new_rows = pd.DataFrame(keys, columns=['document_id', 'topic', 'period'])
 
-    return corpora
+    # Net change per (topic, period): + new document rows, - replaced or removed ones
+    delta_rows = pd.concat([doc_rows[dropped], new_rows], ignore_index=True)
+    delta_counts = sparse.vstack([-doc_counts[dropped], new_counts]).tocsr()
+    period_keys = sorted(set(zip(delta_rows['topic'], delta_rows['period'])))
 
+    period_rows, period_counts = state['period_rows'], _resize(state['period_counts'], num_terms)
+    period_index = {key: i for i, key in enumerate(zip(period_rows['topic'], period_rows['period']))}
+    added = [key for key in period_keys if key not in period_index]
+    for key in added:
+        period_index[key] = len(period_index)
+    period_rows = pd.concat([period_rows, pd.DataFrame(added, columns=['topic', 'period'])], ignore_index=True)
+    period_counts = sparse.vstack([period_counts, sparse.csr_matrix((len(added), num_terms), dtype=np.int64)]).tocsr()
 
-def compute_tfidf_matrices(corpora, max_features=1000):
-    tfidf_matrices = {}
-    vectorizers = {}
+    touched = np.array([period_index[key] for key in period_keys], dtype=np.int64)
+    codes = np.array([period_index[key] for key in zip(delta_rows['topic'], delta_rows['period'])], dtype=np.int64)
+    G = sparse.csr_matrix((np.ones(len(codes), dtype=np.int64), (codes, np.arange(len(codes)))),
+                          shape=(len(period_index), len(codes)))
+    before = period_counts[touched]
+    period_counts = (period_counts + G @ delta_counts).tocsr()
+    period_counts.eliminate_zeros()
+    after = period_counts[touched]
 
-    for topic in corpora:
-        tfidf_matrices[topic] = {}
-        vectorizers[topic] = {}
-        for year in sorted(corpora[topic].keys()):
-            start_time = time.time()
-            print(f"Processing {topic} {year}...")
+    df = np.zeros(num_terms, dtype=np.int64)
+    df[:len(state['df'])] = state['df']
+    df += np.asarray((after > 0).sum(axis=0)).ravel() - np.asarray((before > 0).sum(axis=0)).ravel()
 
-            doc = extract_filtered_lemmas(corpora[topic][year], allowed_pos={"NOUN", "VERB"})
+    state.update({
+        'doc_rows': pd.concat([doc_rows[~dropped], new_rows], ignore_index=True),
+        'doc_counts': sparse.vstack([doc_counts[~dropped], new_counts]).tocsr(),
+        'period_rows': period_rows,
+        'period_counts': period_counts,
+        'df': df
+    })
+    return period_keys
 
-            if not doc.strip():
-                print(f"  Skipping {topic} {year} — no valid verbs/nouns found.")
-                continue
 
-            try:
-                vectorizer = TfidfVectorizer(max_features=max_features, token_pattern=r"(?u)\b\w+\b")
-                tfidf = vectorizer.fit_transform([doc])
-                if not vectorizer.get_feature_names_out().size:
-                    print(f"  Skipping {topic} {year} — TF-IDF vocabulary is empty after filtering.")
-                    continue
+def tfidf_from_state(state, max_features=MAX_FEATURES):
+    """TF-IDF (matrix, vocabulary, rows) from the persisted counts and document frequencies.
 
-                df = pd.DataFrame(tfidf.toarray(), columns=vectorizer.get_feature_names_out(), index=[year])
-                tfidf_matrices[topic][year] = df
-                vectorizers[topic][year] = vectorizer
-                print(f"  Done in {time.time() - start_time:.2f}s → {len(doc.split())} tokens")
-            except ValueError as e:
-                print(f"  Skipping {topic} {year} due to TF-IDF error: {e}")
+    Matches compute_tfidf on the same documents: empty periods and unused terms are dropped,
+    the vocabulary is sorted and IDF is smoothed as in TfidfTransformer.
+    """
+    from sklearn.preprocessing import normalize
 
-    return tfidf_matrices, vectorizers
+    counts, df = state['period_counts'].tocsr(), state['df']
+    nonempty = np.diff(counts.indptr) > 0
+    used = np.flatnonzero(df > 0)
+    order = used[np.argsort(np.array(state['vocabulary'], dtype=object)[used])]
+    counts, df = counts[nonempty][:, order], df[order]
+    vocabulary = [state['vocabulary'][i] for i in order]
+    keep = np.arange(len(vocabulary))
+    if max_features is not None and len(vocabulary) > max_features:
+        totals = np.asarray(counts.sum(axis=0)).ravel()
+        keep = np.sort(np.lexsort((keep, -totals))[:max_features])
+        counts, df, vocabulary = counts[:, keep], df[keep], [vocabulary[i] for i in keep]
 
+    rows = state['period_rows'][nonempty]
+    order = np.lexsort((rows['period'].to_numpy(), rows['topic'].to_numpy()))
+    matrix = counts[order].astype(np.float64).tocsr()
+    matrix.sort_indices()
+    idf = np.log((matrix.shape[0] + 1) / (df + 1)) + 1
+    matrix.data *= idf[matrix.indices]
+    return normalize(matrix), vocabulary, rows.iloc[order].reset_index(drop=True)
 
-def save_tfidf_matrices(tfidf_matrices, output_dir):
+
+def state_dir(output_dir, level='year'):
+    return os.path.join(output_dir, f'state_{level}')
+
+
+def save_tfidf_state(state, output_dir, level='year'):
+    directory = state_dir(output_dir, level)
+    os.makedirs(directory, exist_ok=True)
+    sparse.save_npz(os.path.join(directory, 'doc_counts.npz'), state['doc_counts'])
+    sparse.save_npz(os.path.join(directory, 'period_counts.npz'), state['period_counts'])
+    state['doc_rows'].to_csv(os.path.join(directory, 'doc_rows.csv'), index=False)
+    state['period_rows'].to_csv(os.path.join(directory, 'period_rows.csv'), index=False)
+    np.save(os.path.join(directory, 'df.npy'), state['df'])
+    with open(os.path.join(directory, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+        json.dump(state['vocabulary'], f, ensure_ascii=False)
+
+
+def load_tfidf_state(output_dir, level='year'):
+    """The persisted incremental state, or an empty one if none was saved yet."""
+    directory = state_dir(output_dir, level)
+    if not os.path.exists(os.path.join(directory, 'vocabulary.json')):
+        return empty_state()
+    with open(os.path.join(directory, 'vocabulary.json'), 'r', encoding='utf-8') as f:
+        vocabulary = json.load(f)
+    return {
+        'vocabulary': vocabulary,
+        'doc_rows': pd.read_csv(os.path.join(directory, 'doc_rows.csv'), dtype=str),
+        'doc_counts': sparse.load_npz(os.path.join(directory, 'doc_counts.npz')).tocsr(),
+        'period_rows': pd.read_csv(os.path.join(directory, 'period_rows.csv'), dtype=str),
+        'period_counts': sparse.load_npz(os.path.join(directory, 'period_counts.npz')).tocsr(),
+        'df': np.load(os.path.join(directory, 'df.npy'))
+    }
+
+
+def tfidf_paths(output_dir, level='year'):
+    return {
+        'matrix': os.path.join(output_dir, f'tfidf_{level}.npz'),
+        'vocabulary': os.path.join(output_dir, f'tfidf_{level}_vocabulary.json'),
+        'rows': os.path.join(output_dir, f'tfidf_{level}_rows.csv')
+    }
+
+
+def save_tfidf(matrix, vocabulary, rows, output_dir, level='year'):
     os.makedirs(output_dir, exist_ok=True)
-    for topic in tfidf_matrices:
-        if tfidf_matrices[topic]:
-            all_years_df = pd.concat(tfidf_matrices[topic].values())
-            all_years_df.to_csv(os.path.join(output_dir, f"tfidf_{topic}.csv"))
+    paths = tfidf_paths(output_dir, level)
+    sparse.save_npz(paths['matrix'], matrix.tocsr())
+    with open(paths['vocabulary'], 'w', encoding='utf-8') as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+    rows.to_csv(paths['rows'], index=False)
+
+
+def load_tfidf(output_dir, level='year', topic=None):
+    """Load (matrix, vocabulary, rows) saved by save_tfidf, optionally only the rows of `topic`."""
+    paths = tfidf_paths(output_dir, level)
+    matrix = sparse.load_npz(paths['matrix']).tocsr()
+    with open(paths['vocabulary'], 'r', encoding='utf-8') as f:
+        vocabulary = json.load(f)
+    rows = pd.read_csv(paths['rows'], dtype=str)
+    if topic is not None:
+        mask = (rows['topic'] == topic).to_numpy()
+        matrix, rows = matrix[mask], rows[mask].reset_index(drop=True)
+    return matrix, vocabulary, rows
+
+
+def top_terms_per_period(matrix, vocabulary, rows, k=10):
+    """Long table of the `k` highest-scoring terms of every row, read straight from the CSR arrays."""
+    records = []
+    for i, (topic, period) in enumerate(zip(rows['topic'], rows['period'])):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        scores, columns = matrix.data[start:end], matrix.indices[start:end]
+        top = np.lexsort((columns, -scores))[:k]
+        for rank, j in enumerate(top, start=1):
+            records.append({'topic': topic, 'period': period, 'rank': rank,
+                            'term': vocabulary[columns[j]], 'score': scores[j]})
+    return pd.DataFrame(records, columns=['topic', 'period', 'rank', 'term', 'score'])
+
+
+def top_terms(matrix, vocabulary, k=30):
+    """The `k` terms with the highest TF-IDF summed over all rows, as a Series."""
+    totals = np.asarray(matrix.sum(axis=0)).ravel()
+    top = np.lexsort((np.arange(len(totals)), -totals))[:k]
+    return pd.Series(totals[top], index=[vocabulary[j] for j in top])
+
+
+def term_scores(matrix, vocabulary, rows, terms):
+    """Period-by-term frame for a few `terms` (unknown ones are dropped); only those columns are densified."""
+    index = {term: j for j, term in enumerate(vocabulary)}
+    terms = [term for term in terms if term in index]
+    columns = [index[term] for term in terms]
+    return pd.DataFrame(matrix[:, columns].toarray(), index=rows['period'].tolist(), columns=terms)
 
 
 if __name__ == "__main__":
-    PREPROCESSED_DIR = "data/preprocessed"
     OUTPUT_DIR = "data/features/tfidf"
 
-    corpora = load_topic_corpus_by_year(PREPROCESSED_DIR)
-    tfidf_matrices, _ = compute_tfidf_matrices(corpora)
-    save_tfidf_matrices(tfidf_matrices, OUTPUT_DIR)
-    print("TF-IDF matrices (NOUN+VERB only) saved per topic.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Compute POS-filtered TF-IDF per topic and year or quarter.')
+    parser.add_argument('--level', choices=LEVELS, default='year', help='One TF-IDF row per topic and this period')
+    parser.add_argument('--max-features', type=int, default=MAX_FEATURES,
+                        help=f'Shared vocabulary size (default: {MAX_FEATURES}; 0 keeps every term)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only count new or changed reports, updating the persisted counts and IDF')
+    parser.add_argument('--force', action='store_true', help='Refit even if the corpus did not change')
+    args = parser.parse_args()
+    args.max_features = args.max_features or None
+
+    # Everything that shapes the vocabulary or the saved matrix, so changing any of it rebuilds
+    params = {'max_features': args.max_features, 'allowed_pos': sorted(ALLOWED_POS), 'level': args.level,
+              'token_pattern': TOKEN_PATTERN, 'min_lemma_length': MIN_LEMMA_LENGTH}
+    outputs = list(tfidf_paths(OUTPUT_DIR, args.level).values())
+
+    if args.incremental:
+        # Keyed per report: only new, changed or deleted reports touch the persisted state
+        stage = f'tfidf_incremental_{args.level}'
+        manifest = load_manifest(stage)
+        fingerprints = document_fingerprints(params)
+        state_outputs = outputs + [os.path.join(state_dir(OUTPUT_DIR, args.level), 'vocabulary.json')]
+        stale, reused = partition_stale(manifest, fingerprints, lambda document_id: state_outputs, args.force)
+        removed = prune_missing(manifest, fingerprints, delete_outputs=False)
+
+        if stale or removed:
+            state = empty_state() if args.force else load_tfidf_state(OUTPUT_DIR, args.level)
+            table = load_corpus(STORE_PATH, documents=stale,
+                                columns=['document_id', 'topic', 'year', 'quarter', 'lemmas', 'upos'])
+            with measure('vectorize', items=table.num_rows):
+                updated = update_tfidf_state(state, table, args.level, removed_documents=removed)
+            save_tfidf_state(state, OUTPUT_DIR, args.level)
+            matrix, vocabulary, rows = tfidf_from_state(state, args.max_features)
+            save_tfidf(matrix, vocabulary, rows, OUTPUT_DIR, args.level)
+            for document_id in stale:
+                record_build(manifest, document_id, fingerprints[document_id], state_outputs)
+            save_manifest(stage, manifest)
+            updated_rows = rows[[key in set(updated) for key in zip(rows['topic'], rows['period'])]]
+            print(top_terms_per_period(matrix[updated_rows.index.to_numpy()], vocabulary,
+                                       updated_rows.reset_index(drop=True), k=5).to_string(index=False))
+        print_build_report(stage, reused, stale, removed)
+    else:
+        # IDF is shared by all periods, so any changed document refits the level
+        manifest = load_manifest('tfidf')
+        fingerprints = {args.level: hash_params({'years': year_fingerprints(), 'params': params})}
+        stale, reused = partition_stale(manifest, fingerprints, lambda level: outputs, args.force)
+        removed = prune_missing(manifest, LEVELS, delete_outputs=False)
+
+        if stale or removed:
+            if stale:
+                table = load_corpus(STORE_PATH, columns=['document_id', 'topic', 'year', 'quarter', 'lemmas', 'upos'])
+                with measure('vectorize', items=table.num_rows):
+                    matrix, vocabulary, rows = compute_tfidf(*period_documents(table, args.level), args.max_features)
+                save_tfidf(matrix, vocabulary, rows, OUTPUT_DIR, args.level)
+                record_build(manifest, args.level, fingerprints[args.level], outputs)
+                print(f"TF-IDF (NOUN+VERB only): {matrix.shape[0]} periods × {len(vocabulary)} terms saved.")
+            save_manifest('tfidf', manifest)
+        print_build_report('tfidf', reused, stale, removed)
@@ -1,14 +1,30 @@
 # Generate visualizations for TF-IDF, embeddings, clarity, and sentiment
+# Figures are drawn headless (Agg) on a process pool; each one is keyed in the 'figures' manifest
+# by a hash of its input files, parameters and plot function source, so unchanged figures are not redrawn.
 
 import os
+import hashlib
+import inspect
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # figures are only written to files, also from worker processes
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.decomposition import PCA
 
+from tfidf import load_tfidf, tfidf_paths, top_terms, term_scores
+from instrumentation import measure
+from manifest import (
+    fingerprint, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
 
-def plot_tfidf_heatmap(csv_path, title, output_path):
-    df = pd.read_csv(csv_path, index_col=0)
+
+def plot_tfidf_heatmap(tfidf_dir, topic, title, output_path, top_n=30):
+    # Only the top_n columns are densified and drawn; the rest of the vocabulary is unreadable anyway
+    matrix, vocabulary, rows = load_tfidf(tfidf_dir, topic=topic)
+    df = term_scores(matrix, vocabulary, rows, top_terms(matrix, vocabulary, top_n).index)
     plt.figure(figsize=(14, 6))
     sns.heatmap(df.T, cmap="viridis", annot=False)
     plt.title(title)
@@ -50,40 +66,113 @@ def plot_metric_line(csv_path, metric, title, output_path):
     plt.close()
 
 
+def function_source(function):
+    """Source of `function` (its bytecode when the source is unavailable)."""
+    try:
+        return inspect.getsource(function).encode('utf-8')
+    except (OSError, TypeError):
+        return function.__code__.co_code
+
+
+def called_names(code):
+    """Global names used by a code object and the lambdas and comprehensions nested in it."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= called_names(const)
+    return names
+
+
+def plot_hash(plot):
+    """Hash of a plot function's source and of every function of this project it calls, recursively,
+    so editing a helper such as tfidf.term_scores also redraws the figures that use it."""
+    utils_dir = os.path.dirname(os.path.abspath(__file__))
+    sources, pending = {}, [plot]
+    while pending:
+        function = pending.pop()
+        key = f'{function.__module__}.{function.__qualname__}'
+        if key in sources:
+            continue
+        sources[key] = function_source(function)
+        for name in called_names(function.__code__):
+            value = function.__globals__.get(name)
+            if inspect.isfunction(value) and os.path.dirname(os.path.abspath(inspect.getfile(value))) == utils_dir:
+                pending.append(value)
+    digest = hashlib.sha256()
+    for key in sorted(sources):
+        digest.update(key.encode('utf-8') + b'\0' + sources[key] + b'\0')
+    return digest.hexdigest()
+
+
+def render_figure(plot, kwargs):
+    plot(**kwargs)
+    return kwargs['output_path']
+
+
+def render_figures(figures, stage='figures', processes=None, force=False):
+    """Draw the stale figures of `figures` ([(plot function, kwargs, input files)], each kwargs
+    with an `output_path`) on a process pool; figures with missing inputs are skipped."""
+    ready = {}
+    for plot, kwargs, inputs in figures:
+        missing = [path for path in inputs if not os.path.exists(path)]
+        if missing:
+            print(f"  Skipping {kwargs['output_path']} — missing {', '.join(missing)}")
+        else:
+            ready[kwargs['output_path']] = (plot, kwargs, inputs)
+
+    manifest = load_manifest(stage)
+    fingerprints = {
+        output_path: fingerprint(inputs, {'plot': plot.__name__, 'code': plot_hash(plot), **kwargs})
+        for output_path, (plot, kwargs, inputs) in ready.items()
+    }
+    stale, reused = partition_stale(manifest, fingerprints, lambda output_path: [output_path], force)
+    removed = prune_missing(manifest, fingerprints, delete_outputs=False)
+
+    for output_path in stale:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with measure('render', items=len(stale)):
+        if processes == 1 or len(stale) <= 1:
+            rendered = [render_figure(*ready[path][:2]) for path in stale]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = [pool.submit(render_figure, *ready[path][:2]) for path in stale]
+                rendered = [future.result() for future in futures]
+    for output_path in rendered:
+        record_build(manifest, output_path, fingerprints[output_path], [output_path])
+
+    save_manifest(stage, manifest)
+    print_build_report(stage, reused, stale, removed)
+
+
 if __name__ == "__main__":
-    os.makedirs("figures", exist_ok=True)
-
-    plot_tfidf_heatmap(
-        "data/features/tfidf/tfidf_gdp.csv",
-        "TF-IDF of Key Terms by Year (GDP)",
-        "figures/tfidf_gdp_heatmap.png"
-    )
-    plot_tfidf_heatmap(
-        "data/features/tfidf/tfidf_inflation.csv",
-        "TF-IDF of Key Terms by Year (Inflation)",
-        "figures/tfidf_inflation_heatmap.png"
-    )
-    plot_embeddings_pca(
-        "data/features/embeddings/embeddings_gdp.csv",
-        "gdp",
-        "figures/pca_gdp_embeddings.png"
-    )
-    plot_embeddings_pca(
-        "data/features/embeddings/embeddings_inflation.csv",
-        "inflation",
-        "figures/pca_inflation_embeddings.png"
-    )
-    plot_metric_line(
-        "data/features/clarity/clarity_metrics.csv",
-        "avg_tokens_per_sentence",
-        "Clarity Over Time (Average Tokens per Sentence)",
-        "figures/clarity_avg_tokens.png"
-    )
-    plot_metric_line(
-        "data/features/sentiment/sentiment_heuristics.csv",
-        "sentiment_score",
-        "Sentiment Score Over Time",
-        "figures/sentiment_score.png"
-    )
+    TFIDF_DIR = "data/features/tfidf"
+
+    parser = argparse.ArgumentParser(description='Render the feature figures into figures/.')
+    parser.add_argument('--processes', type=int, default=None, help='Figures rendered in parallel (default: all CPUs)')
+    parser.add_argument('--top-n', type=int, default=30, help='Terms shown in the TF-IDF heatmaps')
+    parser.add_argument('--force', action='store_true', help='Redraw every figure, ignoring the manifest')
+    args = parser.parse_args()
+
+    tfidf_inputs = list(tfidf_paths(TFIDF_DIR).values())
+    figures = [
+        (plot_tfidf_heatmap, {'tfidf_dir': TFIDF_DIR, 'topic': 'gdp', 'title': "TF-IDF of Key Terms by Year (GDP)",
+                              'output_path': "figures/tfidf_gdp_heatmap.png", 'top_n': args.top_n}, tfidf_inputs),
+        (plot_tfidf_heatmap, {'tfidf_dir': TFIDF_DIR, 'topic': 'inflation',
+                              'title': "TF-IDF of Key Terms by Year (Inflation)",
+                              'output_path': "figures/tfidf_inflation_heatmap.png", 'top_n': args.top_n}, tfidf_inputs),
+    ]
+    for topic in ['gdp', 'inflation']:
+        csv_path = f"data/features/embeddings/embeddings_{topic}.csv"
+        figures.append((plot_embeddings_pca, {'csv_path': csv_path, 'topic': topic,
+                                              'output_path': f"figures/pca_{topic}_embeddings.png"}, [csv_path]))
+    for csv_path, metric, title, output_path in [
+        ("data/features/clarity/clarity_metrics.csv", "avg_tokens_per_sentence",
+         "Clarity Over Time (Average Tokens per Sentence)", "figures/clarity_avg_tokens.png"),
+        ("data/features/sentiment/sentiment_heuristics.csv", "sentiment_score",
+         "Sentiment Score Over Time", "figures/sentiment_score.png")
+    ]:
+        figures.append((plot_metric_line, {'csv_path': csv_path, 'metric': metric, 'title': title,
+                                           'output_path': output_path}, [csv_path]))
 
+    render_figures(figures, processes=args.processes, force=args.force)
     print("Visualizations saved in 'figures/' folder.")
@@ -1,96 +1,232 @@
 #  Train Word2Vec model and compute average embeddings per year and topic
+# Training streams sentences from the corpus store (or a corpus_file for multi-core training)
+# instead of holding every tokenized sentence in memory.
+# Averaging is vectorized: tokens are mapped to vocabulary ids once into a sparse sentence-by-term
+# matrix, sentence vectors are one sparse-dense product with model.wv.vectors, and periods are
+# segment sums over those, optionally TF-IDF or SIF weighted.
 
 import os
-import json
-import re
-from glob import glob
+import argparse
 from collections import defaultdict
-from tqdm import tqdm
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from gensim.models import Word2Vec
 
-
-def extract_year_from_filename(filename):
-    match = re.search(r'(\d{4})', filename)
-    return match.group(1) if match else None
-
-
-def load_tokenized_corpus_by_year(preprocessed_dir):
-    corpora = defaultdict(lambda: defaultdict(list))  # corpora[topic][year] = list of token lists
-
-    for path in tqdm(glob(os.path.join(preprocessed_dir, 'preprocessed_*.json'))):
-        year = extract_year_from_filename(path)
-        if not year:
-            continue
-
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        for topic in ['gdp_prioritized', 'gdp_other']:
-            for sentence in data.get(topic, []):
-                corpora['gdp'][year].append(sentence.split())
-
-        for topic in ['inflation_prioritized', 'inflation_other']:
-            for sentence in data.get(topic, []):
-                corpora['inflation'][year].append(sentence.split())
-
-    return corpora
-
-
-def train_word2vec_model(corpus, vector_size=100, window=5, min_count=2, sg=1):
-    all_sentences = []
-    for yearly_data in corpus.values():
-        for sentences in yearly_data.values():
-            all_sentences.extend(sentences)
-
+from corpus_store import STORE_PATH, StoreSentences, load_corpus, period_of, year_fingerprints
+from instrumentation import measure
+from manifest import (
+    hash_params, load_manifest, save_manifest, record_build, partition_stale, prune_missing, print_build_report
+)
+
+WEIGHTINGS = ['none', 'tfidf', 'sif']
+LEVELS = ['year', 'quarter', 'document']
+# SIF smoothing constant a in a / (a + p(w)), from Arora et al. (2017)
+SIF_A = 1e-3
+WORKERS = 4
+
+
+def tokenize_corpus(corpora):
+    """Split the sentences of a {topic: {year: [sentences]}} corpus into token lists."""
+    return {
+        topic: {year: [sentence.split() for sentence in sentences] for year, sentences in years.items()}
+        for topic, years in corpora.items()
+    }
+
+
+def write_corpus_file(sentences, path):
+    """Stream token lists to gensim's corpus_file format: one space-separated sentence per line."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for tokens in sentences:
+            f.write(' '.join(tokens) + '\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def train_word2vec_model(sentences=None, corpus_file=None, vector_size=100, window=5, min_count=2, sg=1,
+                         workers=WORKERS):
+    """Train on a restartable iterable of token lists (e.g. StoreSentences) or on a corpus_file.
+
+    The iterable is read once per epoch and never copied; with a corpus_file each worker reads
+    its own slice of the file, so training scales with `workers`.
+    """
     model = Word2Vec(
-        sentences=all_sentences,
+        sentences=sentences,
+        corpus_file=corpus_file,
         vector_size=vector_size,
         window=window,
         min_count=min_count,
-        workers=4,
+        workers=workers,
         sg=sg
     )
     return model
 
 
-def compute_average_embeddings(corpora, model):
-    embeddings = defaultdict(dict)
+def sentence_term_matrix(sentences, model):
+    """Sparse sentence-by-vocabulary counts of the tokens `model` knows; each token is looked up once.
 
+    `sentences` may be any iterable of token lists, so they need not be held in memory.
+    """
+    key_to_index = model.wv.key_to_index
+    indices, indptr = [], [0]
+    for tokens in sentences:
+        indices.extend(index for index in map(key_to_index.get, tokens) if index is not None)
+        indptr.append(len(indices))
+    counts = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, len(key_to_index))
+    )
+    counts.sum_duplicates()
+    return counts
+
+
+def term_weights(counts, model, weighting='none'):
+    """Per-vocabulary-term weights: 1, smoothed IDF over the sentences, or SIF a / (a + p(w))."""
+    if weighting == 'tfidf':
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        return np.log((counts.shape[0] + 1) / (df + 1)) + 1
+    if weighting == 'sif':
+        frequencies = np.array([model.wv.get_vecattr(key, 'count') for key in model.wv.index_to_key], dtype=np.float64)
+        return SIF_A / (SIF_A + frequencies / frequencies.sum())
+    return np.ones(counts.shape[1])
+
+
+def sentence_embeddings(counts, model, weighting='none'):
+    """(vectors, valid): one weighted mean vector per sentence row of `counts`.
+
+    Sentences without known tokens are not valid and get a zero vector. SIF divides by the
+    sentence length and removes the first principal component of the valid sentences.
+    """
+    weighted = counts @ sparse.diags(term_weights(counts, model, weighting))
+    sums = np.asarray(weighted @ model.wv.vectors.astype(np.float64))
+    denominators = np.asarray((counts if weighting == 'sif' else weighted).sum(axis=1)).ravel()
+    valid = np.diff(counts.indptr) > 0
+
+    vectors = np.zeros_like(sums)
+    vectors[valid] = sums[valid] / denominators[valid, None]
+    if weighting == 'sif' and valid.sum() > 1:
+        component = np.linalg.svd(vectors[valid], full_matrices=False)[2][0]
+        vectors[valid] -= np.outer(vectors[valid] @ component, component)
+    return vectors, valid
+
+
+def average_by(vectors, valid, keys):
+    """{key: mean of the valid sentence vectors with that key} via one sparse segment sum; keys
+    without a valid sentence get a zero vector."""
+    codes, uniques = pd.factorize(pd.Series(keys, dtype=object))
+    segments = sparse.csr_matrix((valid.astype(np.float64), (codes, np.arange(len(codes)))),
+                                 shape=(len(uniques), len(codes)))
+    sums, sizes = segments @ vectors, np.asarray(segments.sum(axis=1)).ravel()
+    means = np.zeros_like(sums)
+    means[sizes > 0] = sums[sizes > 0] / sizes[sizes > 0, None]
+    return dict(zip(uniques, means))
+
+
+def compute_average_embeddings(corpora, model, weighting='none'):
+    """{topic: {year: mean sentence embedding}} for a {topic: {year: [token lists]}} corpus."""
+    sentences, keys = [], []
     for topic in corpora:
-        for year, sentences in corpora[topic].items():
-            vectors = []
-            for tokens in sentences:
-                word_vecs = [model.wv[token] for token in tokens if token in model.wv]
-                if word_vecs:
-                    vectors.append(np.mean(word_vecs, axis=0))
-            if vectors:
-                embeddings[topic][year] = np.mean(vectors, axis=0)
-            else:
-                embeddings[topic][year] = np.zeros(model.vector_size)
+        for year, token_lists in corpora[topic].items():
+            sentences.extend(token_lists)
+            keys.extend([(topic, year)] * len(token_lists))
 
+    vectors, valid = sentence_embeddings(sentence_term_matrix(sentences, model), model, weighting)
+    embeddings = defaultdict(dict)
+    for (topic, year), vector in average_by(vectors, valid, keys).items():
+        embeddings[topic][year] = vector.astype(model.wv.vectors.dtype)
     return embeddings
 
 
-def save_embeddings(embeddings, output_dir):
+def period_keys(rows, level='year'):
+    """(topic, period) of every row of a corpus store table for an aggregation level."""
+    data = rows.select(['document_id', 'topic', 'year', 'quarter']).to_pydict()
+    if level == 'document':
+        periods = data['document_id']
+    else:
+        periods = [period_of(year, quarter, level) for year, quarter in zip(data['year'], data['quarter'])]
+    return list(zip(data['topic'], periods))
+
+
+def save_embeddings(embeddings, output_dir, level='year'):
     os.makedirs(output_dir, exist_ok=True)
+    suffix = '' if level == 'year' else f'_{level}'
     for topic, yearly_vecs in embeddings.items():
         df = pd.DataFrame.from_dict(yearly_vecs, orient='index')
-        df.index.name = 'year'
-        df.to_csv(os.path.join(output_dir, f'embeddings_{topic}.csv'))
+        df.index.name = level
+        df.to_csv(os.path.join(output_dir, f'embeddings_{topic}{suffix}.csv'))
 
 
 if __name__ == "__main__":
-    PREPROCESSED_DIR = "data/preprocessed"
     OUTPUT_DIR = "data/features/embeddings"
-
-    corpora = load_tokenized_corpus_by_year(PREPROCESSED_DIR)
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    model = train_word2vec_model(corpora)
-    model.save(os.path.join(OUTPUT_DIR, 'word2vec.model'))
-
-    embeddings = compute_average_embeddings(corpora, model)
-    save_embeddings(embeddings, OUTPUT_DIR)
-    print("Word2Vec yearly embeddings saved.")
+    MODEL_PATH = os.path.join(OUTPUT_DIR, 'word2vec.model')
+    CORPUS_FILE_PATH = os.path.join(OUTPUT_DIR, 'corpus.txt')
+
+    parser = argparse.ArgumentParser(description='Train Word2Vec and save average embeddings per topic and year.')
+    parser.add_argument('--weighting', choices=WEIGHTINGS, default='none', help='Token weights when averaging')
+    parser.add_argument('--level', choices=LEVELS, action='append', default=None,
+                        help='Also save embeddings per quarter or document (repeatable; year is always saved)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help=f'Training threads (default: {WORKERS})')
+    parser.add_argument('--corpus-file', action='store_true',
+                        help='Train from a temporary corpus_file, which scales better with --workers')
+    parser.add_argument('--force', action='store_true', help='Retrain even if the inputs did not change')
+    args = parser.parse_args()
+    levels = ['year'] + [level for level in dict.fromkeys(args.level or []) if level != 'year']
+
+    # The model is trained on all years pooled, so any changed document retrains it; averaging
+    # with another weighting or level only reuses the saved model
+    params = {'vector_size': 100, 'window': 5, 'min_count': 2, 'sg': 1}
+    embedding_params = {'weighting': args.weighting, 'levels': levels}
+    outputs = {
+        'model': [MODEL_PATH],
+        'embeddings': [os.path.join(OUTPUT_DIR, f"embeddings_{topic}{'' if level == 'year' else '_' + level}.csv")
+                       for topic in ['gdp', 'inflation'] for level in levels]
+    }
+    manifest = load_manifest('word2vec')
+    corpus_fingerprint = hash_params({'years': year_fingerprints(), 'params': params})
+    fingerprints = {
+        'model': corpus_fingerprint,
+        'embeddings': hash_params({'model': corpus_fingerprint, 'params': embedding_params})
+    }
+    stale, reused = partition_stale(manifest, fingerprints, outputs.get, args.force)
+    removed = prune_missing(manifest, fingerprints, delete_outputs=False)
+
+    if stale:
+        table = load_corpus(STORE_PATH, columns=['document_id', 'topic', 'year', 'quarter', 'text'])
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+        if 'model' in stale:
+            sentences = StoreSentences(STORE_PATH)
+            with measure('train') as step:
+                if args.corpus_file:
+                    write_corpus_file(sentences, CORPUS_FILE_PATH)
+                    model = train_word2vec_model(corpus_file=CORPUS_FILE_PATH, workers=args.workers, **params)
+                    os.remove(CORPUS_FILE_PATH)
+                else:
+                    model = train_word2vec_model(sentences, workers=args.workers, **params)
+                step['items'] = model.corpus_count
+            model.save(MODEL_PATH)
+        else:
+            model = Word2Vec.load(MODEL_PATH)
+
+        # One pass over the tokens serves every level
+        rows = table.filter(table['year'].is_valid())
+        with measure('vectorize', items=rows.num_rows):
+            counts = sentence_term_matrix(
+                (text.split() for chunk in rows['text'].iterchunks() for text in chunk.to_pylist()), model
+            )
+            vectors, valid = sentence_embeddings(counts, model, args.weighting)
+        for level in levels:
+            embeddings = defaultdict(dict)
+            for (topic, period), vector in average_by(vectors, valid, period_keys(rows, level)).items():
+                embeddings[topic][period] = vector.astype(model.wv.vectors.dtype)
+            save_embeddings({topic: dict(sorted(periods.items())) for topic, periods in embeddings.items()},
+                            OUTPUT_DIR, level)
+
+        for key in stale:
+            record_build(manifest, key, fingerprints[key], outputs[key])
+        print(f"Word2Vec embeddings ({args.weighting} weighting) saved per {', '.join(levels)}.")
+    if stale or removed:
+        save_manifest('word2vec', manifest)
+    print_build_report('word2vec', reused, stale, removed)